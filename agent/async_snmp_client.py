@@ -0,0 +1,537 @@
+import asyncio
+
+# pysnmp 4.4's asyncio API is built on asyncio.coroutine, which Python 3.11 removed
+if not hasattr(asyncio, "coroutine"):
+    raise RuntimeError("The agent needs Python 3.8 to 3.10: pysnmp 4.4 (requirements.txt) does not run on Python 3.11 or newer")
+
+from pysnmp.hlapi.asyncio import *
+from pysnmp.proto import errind
+import copy
+import time
+from typing import Dict, Any, Optional, Tuple, List
+import config
+from snmp_client import BaseSNMPClient
+from snmp_session import value_or_none
+from oid_table import VarBindCache
+from snmp_auth import V3User, EngineDiscovery, auth_data, context_data
+from resilience import AdaptiveTimeout, CircuitBreaker, DeviceUnreachable, RetryBudget
+from topology import Topology, INLET_COUNT, OUTLET_COUNT, TOPOLOGY_COLUMNS, SENSOR_COLUMNS
+from poll_schedule import VOLTAGE, CURRENT
+import metrics
+
+
+class AsyncSNMPSession:
+    """asyncio counterpart of SNMPSession.
+
+    Requests are issued through pysnmp's asyncio API on the running event loop,
+    so many GET/SET operations (also against different PDUs) can be in flight
+    at once without blocking other handlers.
+
+    Retransmissions are handled here rather than by pysnmp: every attempt uses
+    the device's adaptive timeout, retries can be drawn from a shared
+    RetryBudget, and a per-device CircuitBreaker rejects requests while the PDU
+    is not answering (DeviceUnreachable).
+    """
+
+    def __init__(self, host: str, port: int = 161, community: str = "public",
+                 version: str = "2c", timeout: float = 1.0, retries: int = 3,
+                 engine: Optional[SnmpEngine] = None, name: Optional[str] = None,
+                 min_timeout: Optional[float] = None, max_timeout: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None, v3_user: Optional[V3User] = None):
+        self.host = host
+        # Device label used for metrics
+        self.name = name or host
+        self.port = port
+        self.community = community
+        self.version = version
+        self.timeout = timeout
+        self.retries = retries
+        self.rto = AdaptiveTimeout(
+            initial=timeout,
+            minimum=min_timeout if min_timeout is not None else timeout,
+            maximum=max_timeout if max_timeout is not None else timeout
+        )
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+        # An engine may be shared by many sessions (fleet mode); only close our own
+        self._owns_engine = engine is None
+        self.engine = engine if engine is not None else SnmpEngine()
+        self.v3_user = v3_user if str(version) == "3" else None
+        self.auth_data = auth_data(version, community, self.v3_user)
+        self.transport_target = UdpTransportTarget((host, port), timeout=timeout, retries=0)
+        # Copies of the resolved target, one per timeout step
+        self._targets: Dict[float, UdpTransportTarget] = {}
+        self.context_data = context_data(self.v3_user)
+        # Resolved var-binds per OID, reused by every request
+        self.var_binds = VarBindCache(self.engine)
+        # SNMPv3 engine ID and time discovery is cached by the engine; watch it per PDU
+        self.discovery = EngineDiscovery.of(self.engine) if self.v3_user is not None else None
+        self._closed = False
+
+    def _target(self, timeout: float) -> UdpTransportTarget:
+        target = self._targets.get(timeout)
+        if target is None:
+            target = copy.copy(self.transport_target)
+            target.timeout = timeout
+            target.retries = 0
+            self._targets[timeout] = target
+        return target
+
+    async def _request(self, command, operation: str, oids: List[str], var_binds: List[Any], *args,
+                       budget: Optional[RetryBudget] = None):
+        """Send one request, retrying timeouts of reads within self.retries and the budget"""
+        if self._closed:
+            raise RuntimeError(f"SNMP session for {self.host} is closed")
+        if not self.breaker.allow():
+            raise DeviceUnreachable(self.host, "circuit breaker open")
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                error_indication, error_status, error_index, result = await command(
+                    self.engine,
+                    self.auth_data,
+                    self._target(self.rto.timeout),
+                    self.context_data,
+                    *args,
+                    *var_binds,
+                    lookupMib=False
+                )
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Cancelled (e.g. by the poll timeout): no verdict on the PDU, but a
+                # half-open probe must not stay in flight forever
+                self.breaker.release_probe()
+                raise
+            elapsed = time.perf_counter() - started
+            metrics.record_snmp(self.name, operation, oids, elapsed, error_indication, error_status)
+
+            if isinstance(error_indication, errind.RequestTimedOut):
+                self.rto.backoff()
+                # A SET is never resent: the PDU may have applied it and only the
+                # response was lost, and a repeated cycle would cycle twice
+                if operation != "set" and attempt < self.retries and (budget is None or budget.take()):
+                    attempt += 1
+                    metrics.snmp_retries.labels(self.name).inc()
+                    continue
+                self.breaker.record_failure()
+                raise DeviceUnreachable(self.host, f"no response after {attempt + 1} attempt(s)")
+
+            if error_indication:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                if attempt == 0:
+                    # Only unambiguous samples (no retransmission) feed the estimator
+                    self.rto.observe(elapsed)
+            return error_indication, error_status, error_index, result
+
+    async def get(self, oid: str) -> Optional[Any]:
+        """Perform an SNMP GET for a single OID and return its value"""
+        var_binds = await self.get_many([oid])
+        if not var_binds:
+            return None
+        return value_or_none(var_binds[0][1])
+
+    async def get_many(self, oids: List[str], budget: Optional[RetryBudget] = None) -> List[Tuple[Any, Any]]:
+        """Perform an SNMP GET for several OIDs and return the var-binds"""
+        error_indication, error_status, error_index, var_binds = await self._request(
+            getCmd, "get", oids, self.var_binds.get(oids), budget=budget
+        )
+
+        if error_indication:
+            print(f"SNMP GET Error: {error_indication}")
+            return []
+        elif error_status:
+            print(f"SNMP GET Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
+            return []
+        return list(var_binds)
+
+    async def get_chunked(self, oids: List[str], max_varbinds: int,
+                          budget: Optional[RetryBudget] = None) -> List[Optional[Any]]:
+        """GET many OIDs in multi-varbind PDUs; chunks are sent concurrently"""
+        chunks = [oids[start:start + max_varbinds] for start in range(0, len(oids), max_varbinds)]
+        responses = await asyncio.gather(*[self.get_many(chunk, budget) for chunk in chunks])
+
+        values: List[Optional[Any]] = []
+        for chunk, var_binds in zip(chunks, responses):
+            if not var_binds:
+                values.extend([None] * len(chunk))
+                continue
+            values.extend(value_or_none(value) for _, value in var_binds)
+        return values
+
+    async def bulk_walk(self, columns: List[str], max_repetitions: int = 25,
+                        budget: Optional[RetryBudget] = None) -> Dict[str, Dict[Tuple[int, ...], Any]]:
+        """Walk one or more table columns with GETBULK.
+
+        The result maps each column OID to {index suffix: value}. Columns that
+        run out early are dropped from the following requests.
+        """
+        prefixes = [tuple(int(part) for part in column.strip(".").split(".")) for column in columns]
+        results: Dict[str, Dict[Tuple[int, ...], Any]] = {column: {} for column in columns}
+        next_oids: List[Any] = [self.var_binds.identity(column) for column in columns]
+        active = list(range(len(columns)))
+
+        while active:
+            error_indication, error_status, error_index, var_bind_table = await self._request(
+                bulkCmd, "getbulk", [columns[col] for col in active],
+                [ObjectType(next_oids[col]) for col in active],
+                0, max_repetitions,
+                budget=budget
+            )
+
+            if error_indication:
+                print(f"SNMP GETBULK Error: {error_indication}")
+                break
+            elif error_status:
+                print(f"SNMP GETBULK Error: {error_status.prettyPrint()}")
+                break
+            if not var_bind_table:
+                break
+
+            finished = set()
+            last_names: Dict[int, Any] = {}
+            for row in var_bind_table:
+                for col, (name, value) in zip(active, row):
+                    if col in finished:
+                        continue
+                    oid = tuple(name)
+                    prefix = prefixes[col]
+                    if oid[:len(prefix)] != prefix or value_or_none(value) is None:
+                        finished.add(col)
+                        continue
+                    results[columns[col]][oid[len(prefix):]] = value
+                    last_names[col] = name
+            # Only the last row of each column is needed to continue the walk
+            for col, name in last_names.items():
+                next_oids[col] = ObjectIdentity(name)
+            active = [col for col in active if col not in finished]
+
+        return results
+
+    async def set(self, oid: str, value: Any) -> bool:
+        """Perform an SNMP SET for a single OID with an already typed value"""
+        return await self.set_many([(oid, value)])
+
+    async def set_many(self, var_binds: List[Tuple[str, Any]]) -> bool:
+        """Perform one SNMP SET carrying several (OID, typed value) var-binds.
+
+        The agent applies a multi-varbind SET atomically: either every var-bind
+        is written or none is.
+        """
+        error_indication, error_status, error_index, var_binds = await self._request(
+            setCmd, "set", [oid for oid, _ in var_binds],
+            [ObjectType(self.var_binds.identity(oid), value) for oid, value in var_binds]
+        )
+
+        if error_indication:
+            print(f"SNMP SET Error: {error_indication}")
+            return False
+        elif error_status:
+            print(f"SNMP SET Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
+            return False
+        return True
+
+    def usm_stats(self) -> Optional[Dict[str, Any]]:
+        """SNMPv3 user and the engine discovered for this PDU (None for v1/v2c)"""
+        if self.discovery is None:
+            return None
+        stats = self.v3_user.to_dict()
+        stats.update(self.discovery.stats(self.transport_target.transportAddr))
+        return stats
+
+    def close(self) -> None:
+        """Release the transport sockets held by the engine"""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._owns_engine:
+            return
+        try:
+            self.engine.transportDispatcher.closeDispatcher()
+        except Exception:
+            # The dispatcher is only created on first use
+            pass
+
+
+class AsyncSNMPClient(BaseSNMPClient):
+    """Non-blocking PDU client used by the FastAPI handlers"""
+
+    def __init__(self, device=None, engine: Optional[SnmpEngine] = None):
+        super().__init__(device)
+
+        self.session = AsyncSNMPSession(
+            host=self.pdu_ip,
+            port=self.port,
+            community=self.community,
+            version=self.snmp_version,
+            timeout=config.SNMP_TIMEOUT,
+            retries=config.SNMP_RETRIES,
+            engine=engine,
+            name=self.device_id,
+            min_timeout=config.SNMP_MIN_TIMEOUT,
+            max_timeout=config.SNMP_MAX_TIMEOUT,
+            breaker=CircuitBreaker(
+                failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=config.BREAKER_RESET_TIMEOUT,
+                max_reset_timeout=config.BREAKER_MAX_RESET_TIMEOUT
+            ),
+            v3_user=self.v3_user
+        )
+        self.session.var_binds.precompile(self.oid_table.read_oids())
+
+    async def get_outlet_state(self, outlet_id: str) -> Dict[str, Any]:
+        """Get the state of an outlet (raises if it cannot be read)"""
+        try:
+            outlet_num = int(outlet_id)
+            await self.refresh_sensor_metadata([outlet_num])
+
+            # State, inlet voltage and the outlet readings in a single multi-varbind GET
+            fields = self._outlet_fields()
+            state_value, voltage_value, *values = await self.session.get_chunked([
+                self._state_oid(outlet_num),
+                self._inlet_voltage_oid()
+            ] + self.oid_table.reading_oids(outlet_num, fields), config.SNMP_MAX_VARBINDS)
+
+            return self._build_outlet(outlet_id, state_value, voltage_value, dict(zip(fields, values)))
+        except DeviceUnreachable:
+            # Callers report the last known state instead of placeholder values
+            raise
+        except Exception as e:
+            # Never answer with made-up readings
+            print(f"Error getting outlet state: {e}")
+            raise
+
+    async def get_all_outlets(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get all outlets of the discovered topology in multi-varbind reads (raises if they cannot be read)"""
+        # All requests of one poll share a retry budget
+        budget = RetryBudget(config.SNMP_POLL_RETRY_BUDGET)
+        try:
+            outlets = None
+            for attempt in range(2):
+                if self.topology is None:
+                    await self.discover(budget)
+                if not self.topology.outlets:
+                    # No configuration tables: find the outlets by walking their states
+                    outlets = await self._walk_outlets(budget)
+                    break
+                outlets = await self._poll_outlets(budget)
+                if outlets is not None:
+                    break
+                print(f"Outlet count of {self.pdu_ip} changed, rediscovering")
+                self.topology = None
+            return {"outlets": outlets or []}
+        except DeviceUnreachable:
+            raise
+        except Exception as e:
+            # Never answer with made-up readings; the poller keeps the last good snapshot
+            print(f"Error getting all outlets: {e}")
+            raise
+
+    async def discover(self, budget: Optional[RetryBudget] = None) -> Topology:
+        """Walk the PDU's configuration tables once and cache its topology"""
+        counts, tables, sensors = await asyncio.gather(
+            self.session.get_chunked([INLET_COUNT, OUTLET_COUNT], config.SNMP_MAX_VARBINDS, budget),
+            self.session.bulk_walk(TOPOLOGY_COLUMNS, config.SNMP_MAX_REPETITIONS, budget),
+            self.session.bulk_walk(SENSOR_COLUMNS, config.SNMP_MAX_REPETITIONS, budget)
+        )
+        topology = Topology.from_snmp(counts, tables, sensors)
+        self._set_topology(topology)
+        return topology
+
+    async def _poll_outlets(self, budget: RetryBudget) -> Optional[List[Dict[str, Any]]]:
+        """Read every known outlet (and the outlet count) in as few PDUs as possible"""
+        outlet_nums = self.topology.outlet_nums()
+        fields = self._outlet_fields()
+        await self.refresh_sensor_metadata(outlet_nums, budget=budget)
+        values = await self.session.get_chunked(
+            self.oid_table.poll_oids(outlet_nums, fields), config.SNMP_MAX_VARBINDS, budget
+        )
+        return self._outlets_from_poll(outlet_nums, values, fields)
+
+    async def poll_groups(self, groups: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Read only the due metric groups of every known outlet, merged into shared multi-varbind GETs.
+
+        Returns partial outlets (see _outlets_from_groups), or None when a full
+        poll is needed instead: the topology is not known yet, the PDU has no
+        configuration tables, or its outlet count changed.
+        """
+        if self.topology is None or not self.topology.outlets:
+            return None
+        budget = RetryBudget(config.SNMP_POLL_RETRY_BUDGET)
+        outlet_nums = self.topology.outlet_nums()
+        groups = self._poll_groups(groups)
+        if VOLTAGE in groups or CURRENT in groups:
+            await self.refresh_sensor_metadata(outlet_nums, budget=budget)
+        values = await self.session.get_chunked(
+            self.oid_table.group_oids(groups, outlet_nums, self._outlet_fields()), config.SNMP_MAX_VARBINDS, budget
+        )
+        outlets = self._outlets_from_groups(groups, outlet_nums, values)
+        if outlets is None:
+            print(f"Outlet count of {self.pdu_ip} changed, rediscovering")
+            self.topology = None
+        return outlets
+
+    async def _walk_outlets(self, budget: RetryBudget) -> List[Dict[str, Any]]:
+        """Walk the outletSwitchingState column, then read voltage and the outlet readings"""
+        state_column = self.oid_table.state_column
+        states = (await self.session.bulk_walk([state_column], config.SNMP_MAX_REPETITIONS, budget))[state_column]
+        outlet_nums = sorted(index[0] for index in states) or list(range(1, self.num_outlets + 1))
+        await self.refresh_sensor_metadata(outlet_nums, budget=budget)
+
+        # Inlet voltage once per poll, then every outlet's readings
+        fields = self._outlet_fields()
+        values = await self.session.get_chunked(
+            self.oid_table.readings_oids(outlet_nums, fields), config.SNMP_MAX_VARBINDS, budget
+        )
+        return self._outlets_from_readings(outlet_nums, states, values, fields)
+
+    async def refresh_sensor_metadata(self, outlet_nums: List[int], force: bool = False,
+                                      budget: Optional[RetryBudget] = None) -> None:
+        """Load sensor digits/units/availability when the cache is empty, expired or incomplete"""
+        if not force and not self.sensors.needs_refresh(outlet_nums):
+            return
+        outlet_nums = self._metadata_outlets(outlet_nums)
+        values = await self.session.get_chunked(
+            self.sensors.request_oids(outlet_nums), config.SNMP_MAX_VARBINDS, budget
+        )
+        self.sensors.update(outlet_nums, values)
+
+    async def toggle_outlet(self, outlet_id: str) -> Dict[str, Any]:
+        """Toggle an outlet (on->off or off->on)"""
+        try:
+            # Get current state
+            outlet_info = await self.get_outlet_state(outlet_id)
+            current_state = outlet_info["state"]
+            if current_state not in ("on", "off"):
+                # Without a known state there is no opposite to switch to
+                return dict(outlet_info, message="Failed to toggle outlet",
+                            error=outlet_info.get("error", "Could not read current outlet state"))
+
+            # Determine new state (opposite of current)
+            new_state = "off" if current_state == "on" else "on"
+
+            outlet_num = int(outlet_id)
+            success = await self._snmp_set(self._control_oid(outlet_num), Integer, self.states[new_state])
+
+            if success:
+                # Wait briefly for the change to take effect without blocking the loop
+                await asyncio.sleep(1)
+                updated_outlet = await self.get_outlet_state(outlet_id)
+                updated_outlet["message"] = f"Outlet toggled to {new_state} successfully"
+                return updated_outlet
+            else:
+                return {
+                    "id": outlet_id,
+                    "name": f"Outlet {outlet_id}",
+                    "state": current_state,
+                    "message": "Failed to toggle outlet",
+                    "error": "SNMP SET operation failed"
+                }
+        except Exception as e:
+            print(f"Error toggling outlet: {e}")
+            return {
+                "id": outlet_id,
+                "name": f"Outlet {outlet_id}",
+                "state": "unknown",
+                "message": "Failed to toggle outlet",
+                "error": str(e)
+            }
+
+    async def cycle_outlet(self, outlet_id: str) -> Dict[str, Any]:
+        """Cycle an outlet (turn off then on)"""
+        try:
+            outlet_num = int(outlet_id)
+
+            control_oid = self._control_oid(outlet_num)
+            print(f"Cycling outlet {outlet_id} using OID: {control_oid}")
+            success = await self._snmp_set(control_oid, Integer, self.states["cycle"])
+
+            if success:
+                # Wait for the cycle to complete without blocking the loop
+                await asyncio.sleep(5)
+                updated_outlet = await self.get_outlet_state(outlet_id)
+                updated_outlet["message"] = "Outlet cycled successfully"
+                return updated_outlet
+            else:
+                return {
+                    "id": outlet_id,
+                    "name": f"Outlet {outlet_id}",
+                    "state": "unknown",
+                    "message": "Failed to cycle outlet",
+                    "error": "SNMP SET operation failed"
+                }
+        except Exception as e:
+            print(f"Error cycling outlet: {e}")
+            return {
+                "id": outlet_id,
+                "name": f"Outlet {outlet_id}",
+                "state": "unknown",
+                "message": "Failed to cycle outlet",
+                "error": str(e)
+            }
+
+    async def get_switching_state(self, outlet_id: str) -> Optional[str]:
+        """Read only outletSwitchingState ("on"/"off"); None if it could not be read or decoded"""
+        value = await self.session.get(self._state_oid(int(outlet_id)))
+        if value is None:
+            return None
+        return self._decode_state(value)
+
+    async def set_outlet(self, outlet_id: str, action: str) -> bool:
+        """Send a single outlet control SET ("on", "off" or "cycle")"""
+        return await self._snmp_set(self._control_oid(int(outlet_id)), Integer, self.states[action])
+
+    async def get_switching_states(self, outlet_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Read outletSwitchingState of several outlets in multi-varbind GETs"""
+        values = await self.session.get_chunked(
+            [self._state_oid(int(outlet_id)) for outlet_id in outlet_ids], config.SNMP_MAX_VARBINDS
+        )
+        return {
+            outlet_id: None if value is None else self._decode_state(value)
+            for outlet_id, value in zip(outlet_ids, values)
+        }
+
+    async def set_outlets(self, outlet_ids: List[str], action: str) -> Dict[str, bool]:
+        """Send the same control SET ("on", "off" or "cycle") to several outlets.
+
+        Outlets are written in multi-varbind SETs of up to SNMP_MAX_VARBINDS.
+        If the PDU rejects a multi-varbind SET (e.g. tooBig or genErr), the
+        outlets of that chunk are retried one SET at a time.
+        """
+        results: Dict[str, bool] = {}
+        for start in range(0, len(outlet_ids), config.SNMP_MAX_VARBINDS):
+            chunk = outlet_ids[start:start + config.SNMP_MAX_VARBINDS]
+            var_binds = [(self._control_oid(int(outlet_id)), Integer(self.states[action])) for outlet_id in chunk]
+            try:
+                success = await self.session.set_many(var_binds)
+            except DeviceUnreachable:
+                raise
+            except Exception as e:
+                print(f"Error in SNMP SET: {e}")
+                success = False
+            if success or len(chunk) == 1:
+                results.update((outlet_id, success) for outlet_id in chunk)
+                continue
+            for outlet_id in chunk:
+                results[outlet_id] = await self.set_outlet(outlet_id, action)
+        return results
+
+    async def _snmp_set(self, oid: str, value_type, value) -> bool:
+        """Perform an SNMP SET operation"""
+        try:
+            return await self.session.set(oid, value_type(value))
+        except DeviceUnreachable:
+            raise
+        except Exception as e:
+            print(f"Error in SNMP SET: {e}")
+            return False
+
+    def close(self) -> None:
+        """Close the underlying SNMP session"""
+        self.session.close()
+
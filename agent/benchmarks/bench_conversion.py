@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: agent CPU per outlet for building requests and converting responses.
+
+Usage:
+    python benchmarks/bench_conversion.py [--outlets 48] [--iterations 200]
+
+Needs no PDU. Measures, per outlet of a full poll:
+
+  * request building: formatting OIDs and resolving ObjectType var-binds for
+    every request (the old code path) vs the pre-compiled OutletOidTable and
+    VarBindCache
+  * response conversion: building outlet dicts from raw pysnmp values and
+    walking them with the old str(__class__) converter vs to_native() and the
+    type-dispatch convert_snmp_types()
+
+CPU time is process time, so the numbers are not affected by other load.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysnmp.hlapi import ObjectIdentity, ObjectType, SnmpEngine
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from pysnmp.proto import rfc1902
+from fleet import DeviceConfig
+from snmp_client import BaseSNMPClient
+from oid_table import VarBindCache
+from snmp_types import convert_snmp_types
+
+
+def legacy_convert(data):
+    """The converter this benchmark replaced, kept for comparison"""
+    if isinstance(data, dict):
+        return {k: legacy_convert(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [legacy_convert(item) for item in data]
+    elif hasattr(data, '__class__') and 'pysnmp.proto.rfc1902' in str(data.__class__):
+        return int(data) if 'Integer' in str(data.__class__) or 'Gauge' in str(data.__class__) else str(data)
+    else:
+        return data
+
+
+def legacy_build_outlet(client: BaseSNMPClient, outlet_id: str, state_value, voltage_value, current_value):
+    """_build_outlet before values were converted at build time"""
+    return {
+        "id": outlet_id,
+        "name": f"Outlet {outlet_id}",
+        "state": "on" if state_value == client.states["on"] else "off",
+        "voltage": voltage_value or 120,
+        "current": current_value or 0,
+        "lastUpdated": datetime.now().isoformat()
+    }
+
+
+def legacy_var_binds(client: BaseSNMPClient, mib_view, outlet_nums):
+    """Format every OID and resolve a fresh var-bind for it, per request"""
+    oids = [f"{client.oids['inlet_voltage']}.1.1.{client.sensor_types['voltage']}"]
+    oids += [f"{client.oids['outlet_current']}.1.{num}.{client.sensor_types['current']}" for num in outlet_nums]
+    return [ObjectType(ObjectIdentity(oid)).resolveWithMib(mib_view) for oid in oids]
+
+
+def cpu_per_outlet(func, iterations: int, outlets: int) -> float:
+    """Process time per outlet in microseconds"""
+    # Warm up once so import-time and first-use costs are not counted
+    func()
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / (iterations * outlets) * 1e6
+
+
+def report(label: str, before: float, after: float) -> None:
+    speedup = before / after if after else float("inf")
+    print(f"{label:<22} before={before:8.2f} us/outlet  after={after:8.2f} us/outlet  ({speedup:.1f}x)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--outlets", type=int, default=48)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    client = BaseSNMPClient(DeviceConfig(id="bench", host="127.0.0.1", outlets=args.outlets))
+    outlet_nums = list(range(1, args.outlets + 1))
+    engine = SnmpEngine()
+    mib_view = CommandGeneratorVarBinds.getMibViewController(engine)
+    cache = VarBindCache(engine)
+    cache.precompile(client.oid_table.read_oids())
+
+    def compiled_var_binds():
+        return cache.get(client.oid_table.poll_oids(outlet_nums))
+
+    # Raw values as pysnmp returns them for one poll
+    states = [rfc1902.Integer32(7 if num % 2 else 8) for num in outlet_nums]
+    currents = [rfc1902.Gauge32(num * 37) for num in outlet_nums]
+    voltage = rfc1902.Gauge32(2301)
+
+    def legacy_poll():
+        return legacy_convert({"outlets": [
+            legacy_build_outlet(client, str(num), state, voltage, current)
+            for num, state, current in zip(outlet_nums, states, currents)
+        ]})
+
+    def dispatch_poll():
+        return convert_snmp_types({"outlets": [
+            client._build_outlet(str(num), state, voltage, {"current": current})
+            for num, state, current in zip(outlet_nums, states, currents)
+        ]})
+
+    assert [(o["state"], o["current"]) for o in legacy_poll()["outlets"]] == \
+        [(o["state"], o["current"]) for o in dispatch_poll()["outlets"]]
+
+    print(f"{args.outlets} outlets, {args.iterations} iterations")
+    report("request var-binds",
+           cpu_per_outlet(lambda: legacy_var_binds(client, mib_view, outlet_nums), args.iterations, args.outlets),
+           cpu_per_outlet(compiled_var_binds, args.iterations, args.outlets))
+    report("response conversion",
+           cpu_per_outlet(legacy_poll, args.iterations, args.outlets),
+           cpu_per_outlet(dispatch_poll, args.iterations, args.outlets))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
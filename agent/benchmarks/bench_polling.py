@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Benchmark suite: polling and control paths against simulated PX3 PDUs.
+
+Usage:
+    python benchmarks/bench_polling.py [--outlets 8,24,48] [--pdus 1,10,100,500] [--rounds 5]
+        [--latency 2] [--jitter 1] [--loss 0] [--client async|sync] [--baseline FILE]
+
+For every outlets x PDUs combination a simulator process (simulator.py) is
+started and the agent's client polls all simulated PDUs concurrently, the way
+the fleet poller does. The suite reports per-poll latency, polls/sec and
+agent CPU time per poll, plus single-outlet and bulk SET latency on the first
+PDU. Results are written to benchmarks/results/ as JSON; pass an earlier file
+as --baseline to flag regressions.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from pysnmp.hlapi import Integer
+import config
+from fleet import DeviceConfig
+from snmp_client import SNMPClient
+
+RESULTS_DIR = os.path.join(AGENT_DIR, "benchmarks", "results")
+
+
+def summarize(samples: List[float]) -> Optional[Dict[str, float]]:
+    """mean/p50/p95/max of latency samples in milliseconds"""
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return {
+        "mean": round(statistics.mean(samples), 3),
+        "p50": round(statistics.median(samples), 3),
+        "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max": round(samples[-1], 3)
+    }
+
+
+@contextlib.contextmanager
+def simulator(pdus: int, outlets: int, args):
+    """Run simulator.py in a subprocess for the duration of a scenario"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(AGENT_DIR, "simulator.py"),
+         "--pdus", str(pdus), "--outlets", str(outlets), "--host", "127.0.0.1", "--port", str(args.port),
+         "--latency", str(args.latency), "--jitter", str(args.jitter), "--loss", str(args.loss),
+         "--cycle-delay", "0"],
+        stdout=subprocess.PIPE, universal_newlines=True
+    )
+    try:
+        # The simulator prints one line once every PDU is bound
+        if not process.stdout.readline():
+            raise RuntimeError("Simulator exited before it was ready")
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def device_configs(pdus: int, outlets: int, port: int) -> List[DeviceConfig]:
+    return [
+        DeviceConfig(id=f"sim-{index + 1}", host="127.0.0.1", port=port + index, outlets=outlets)
+        for index in range(pdus)
+    ]
+
+
+def poll_ok(result: Dict[str, Any], outlets: int) -> bool:
+    # A poll that returns fewer outlets than the PDU has counts as failed
+    return len(result.get("outlets", [])) == outlets
+
+
+async def run_async(configs: List[DeviceConfig], outlets: int, args) -> Dict[str, Any]:
+    from pysnmp.hlapi.asyncio import SnmpEngine
+    from async_snmp_client import AsyncSNMPClient
+
+    engine = SnmpEngine()
+    clients = [AsyncSNMPClient(device_config, engine=engine) for device_config in configs]
+    semaphore = asyncio.Semaphore(args.max_in_flight)
+    latencies: List[float] = []
+    errors = 0
+
+    async def poll(client) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await client.get_all_outlets()
+            except Exception:
+                result = {}
+            latencies.append((time.perf_counter() - start) * 1000)
+        if not poll_ok(result, outlets):
+            errors += 1
+
+    # Warm-up round: resolve transports and import costs outside the measurement
+    await asyncio.gather(*[client.get_all_outlets() for client in clients], return_exceptions=True)
+
+    rounds = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        await asyncio.gather(*[poll(client) for client in clients])
+        rounds.append((time.perf_counter() - start) * 1000)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # Control paths on the first PDU
+    client = clients[0]
+    outlet_ids = [str(num) for num in range(1, outlets + 1)]
+    set_latencies = []
+    for outlet_id in outlet_ids[:min(outlets, 8)]:
+        for action in ("off", "on"):
+            start = time.perf_counter()
+            await client.set_outlet(outlet_id, action)
+            set_latencies.append((time.perf_counter() - start) * 1000)
+    bulk_latencies = []
+    for action in ("off", "on") * 2:
+        start = time.perf_counter()
+        await client.set_outlets(outlet_ids, action)
+        bulk_latencies.append((time.perf_counter() - start) * 1000)
+
+    for client in clients:
+        client.close()
+    try:
+        engine.transportDispatcher.closeDispatcher()
+    except Exception:
+        # The dispatcher is only created on first use
+        pass
+    return {
+        "latencies": latencies, "rounds": rounds, "wall": wall, "cpu": cpu, "errors": errors,
+        "set": set_latencies, "bulk_set": bulk_latencies
+    }
+
+
+def run_sync(configs: List[DeviceConfig], outlets: int, args) -> Dict[str, Any]:
+    clients = [SNMPClient(device_config) for device_config in configs]
+    executor = ThreadPoolExecutor(max_workers=min(len(clients), args.max_in_flight))
+    latencies: List[float] = []
+    errors = 0
+
+    def poll(client) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            result = client.get_all_outlets()
+        except Exception:
+            result = {}
+        latencies.append((time.perf_counter() - start) * 1000)
+        if not poll_ok(result, outlets):
+            errors += 1
+
+    list(executor.map(poll, clients))
+    latencies.clear()
+    errors = 0
+
+    rounds = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        list(executor.map(poll, clients))
+        rounds.append((time.perf_counter() - start) * 1000)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    client = clients[0]
+    set_latencies = []
+    for outlet_num in range(1, min(outlets, 8) + 1):
+        for action in ("off", "on"):
+            start = time.perf_counter()
+            client._snmp_set(client._control_oid(outlet_num), Integer, client.states[action])
+            set_latencies.append((time.perf_counter() - start) * 1000)
+
+    executor.shutdown()
+    for client in clients:
+        client.close()
+    # The sync client has no multi-outlet SET
+    return {
+        "latencies": latencies, "rounds": rounds, "wall": wall, "cpu": cpu, "errors": errors,
+        "set": set_latencies, "bulk_set": []
+    }
+
+
+def run_scenario(pdus: int, outlets: int, args) -> Dict[str, Any]:
+    configs = device_configs(pdus, outlets, args.port)
+    with simulator(pdus, outlets, args):
+        # The clients print per-request diagnostics; keep them out of the report
+        output = sys.stdout if args.verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            if args.client == "async":
+                loop = asyncio.new_event_loop()
+                try:
+                    raw = loop.run_until_complete(run_async(configs, outlets, args))
+                finally:
+                    loop.close()
+            else:
+                raw = run_sync(configs, outlets, args)
+
+    polls = len(raw["latencies"])
+    return {
+        "client": args.client,
+        "pdus": pdus,
+        "outlets": outlets,
+        "polls": polls,
+        "errors": raw["errors"],
+        "pollMs": summarize(raw["latencies"]),
+        "roundMs": summarize(raw["rounds"]),
+        "pollsPerSec": round(polls / raw["wall"], 2) if raw["wall"] else None,
+        "outletsPerSec": round(polls * outlets / raw["wall"], 2) if raw["wall"] else None,
+        "cpuMsPerPoll": round(raw["cpu"] * 1000 / polls, 3) if polls else None,
+        "setMs": summarize(raw["set"]),
+        "bulkSetMs": summarize(raw["bulk_set"])
+    }
+
+
+def print_scenario(result: Dict[str, Any]) -> None:
+    def p50(summary: Optional[Dict[str, float]]) -> str:
+        return f"{summary['p50']:8.2f} ms" if summary else "     n/a   "
+
+    poll = result["pollMs"] or {}
+    print(f"{result['client']:<6} pdus={result['pdus']:<4} outlets={result['outlets']:<3} "
+          f"poll p50={p50(result['pollMs'])} p95={poll.get('p95', 0):8.2f} ms  "
+          f"{result['pollsPerSec']:9.1f} polls/s  cpu={result['cpuMsPerPoll']:7.3f} ms/poll  "
+          f"set p50={p50(result['setMs'])}  bulk set p50={p50(result['bulkSetMs'])}  errors={result['errors']}")
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> int:
+    """Print regressions against a saved run; returns how many metrics regressed"""
+    with open(baseline_path) as f:
+        baseline = {
+            (entry["client"], entry["pdus"], entry["outlets"]): entry for entry in json.load(f)["scenarios"]
+        }
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (threshold {threshold:.0%}):")
+    for result in results:
+        previous = baseline.get((result["client"], result["pdus"], result["outlets"]))
+        if previous is None:
+            continue
+        metrics = [
+            ("poll p50", (previous["pollMs"] or {}).get("p50"), (result["pollMs"] or {}).get("p50")),
+            ("poll p95", (previous["pollMs"] or {}).get("p95"), (result["pollMs"] or {}).get("p95")),
+            ("cpu/poll", previous["cpuMsPerPoll"], result["cpuMsPerPoll"]),
+        ]
+        for name, old, new in metrics:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions += 1
+                print(f"  REGRESSION pdus={result['pdus']} outlets={result['outlets']} {name}: "
+                      f"{old:.3f} -> {new:.3f} ({change:+.0%})")
+    if not regressions:
+        print("  no regressions")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=AGENT_DIR, stderr=subprocess.DEVNULL,
+            universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--outlets", type=parse_list, default=[8, 24, 48])
+    parser.add_argument("--pdus", type=parse_list, default=[1, 10, 100, 500])
+    parser.add_argument("--rounds", type=int, default=5, help="Measured polls of every PDU")
+    parser.add_argument("--client", choices=["async", "sync"], default="async")
+    parser.add_argument("--max-in-flight", type=int, default=config.FLEET_MAX_IN_FLIGHT)
+    parser.add_argument("--port", type=int, default=16100, help="First simulator port")
+    parser.add_argument("--latency", type=float, default=2.0, help="Simulated latency in ms")
+    parser.add_argument("--jitter", type=float, default=1.0, help="Simulated jitter in ms")
+    parser.add_argument("--loss", type=float, default=0.0, help="Simulated packet loss (0-1)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging")
+    parser.add_argument("--verbose", action="store_true", help="Show client output while measuring")
+    args = parser.parse_args()
+
+    results = []
+    for pdus in args.pdus:
+        for outlets in args.outlets:
+            result = run_scenario(pdus, outlets, args)
+            print_scenario(result)
+            results.append(result)
+
+    started = datetime.now()
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_polling-{started.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": started.isoformat(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "client": args.client,
+                "rounds": args.rounds,
+                "maxInFlight": args.max_in_flight,
+                "latencyMs": args.latency,
+                "jitterMs": args.jitter,
+                "loss": args.loss,
+                "snmpTimeout": config.SNMP_TIMEOUT,
+                "snmpRetries": config.SNMP_RETRIES
+            },
+            "scenarios": results
+        }, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
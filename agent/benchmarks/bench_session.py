@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-request overhead of a fresh SnmpEngine vs a persistent session.
+
+Usage:
+    python benchmarks/bench_session.py [--host HOST] [--port PORT] [--iterations N]
+
+Runs the same GET (outletSwitchingState.1.1) N times with a new engine,
+credentials and transport per request (the old code path) and with one
+SNMPSession reused across requests, then prints the mean/p50/p95 latency.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysnmp.hlapi import *
+import config
+from snmp_session import SNMPSession
+
+OID = ".1.3.6.1.4.1.13742.6.4.1.2.1.3.1.1"
+
+
+def per_call_get(host: str, port: int, community: str, timeout: float, retries: int):
+    """The pre-session code path: build everything for every request"""
+    return next(
+        getCmd(
+            SnmpEngine(),
+            CommunityData(community),
+            UdpTransportTarget((host, port), timeout=timeout, retries=retries),
+            ContextData(),
+            ObjectType(ObjectIdentity(OID))
+        )
+    )
+
+
+def measure(label: str, func, iterations: int) -> None:
+    """Run func iterations times and print latency statistics in milliseconds"""
+    # Warm up once so import-time and first-use costs are not counted
+    func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<20} mean={statistics.mean(samples):8.3f} ms  "
+          f"p50={statistics.median(samples):8.3f} ms  p95={p95:8.3f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=config.SNMP_HOST)
+    parser.add_argument("--port", type=int, default=config.SNMP_PORT)
+    parser.add_argument("--community", default=config.SNMP_COMMUNITY)
+    parser.add_argument("--timeout", type=float, default=config.SNMP_TIMEOUT)
+    parser.add_argument("--retries", type=int, default=config.SNMP_RETRIES)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Benchmarking {args.iterations} GETs against {args.host}:{args.port}")
+    measure("engine per request", lambda: per_call_get(args.host, args.port, args.community,
+                                                        args.timeout, args.retries),
+            args.iterations)
+
+    session = SNMPSession(args.host, args.port, args.community,
+                          timeout=args.timeout, retries=args.retries)
+    try:
+        measure("persistent session", lambda: session.get(OID), args.iterations)
+    finally:
+        session.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Benchmark: SNMPv3 (authPriv) polling cost compared with v2c, against the simulator.
+
+Usage:
+    python benchmarks/bench_snmpv3.py [--outlets 24] [--iterations 200] [--latency 0]
+        [--auth-protocol sha] [--priv-protocol aes]
+
+Starts simulator.py with a USM user and polls one simulated PDU (inlet
+voltage, outlet count and every outlet's state and current, in multi-varbind
+GETs) with:
+
+  * a persistent v2c session
+  * a new v3 engine per poll, keys given as pass phrases (what v3 costs
+    without caching: engine ID and time discovery and key derivation every time)
+  * a persistent v3 session (discovery once, cached master and localized keys)
+
+and prints the mean/p50/p95 poll latency, the Report PDUs (discovery round
+trips) the persistent session needed, and the cost of deriving a master key.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from pysnmp.hlapi import UsmUserData
+from oid_table import OutletOidTable
+from snmp_auth import AUTH_PROTOCOLS, PRIV_PROTOCOLS, V3User, master_key
+from snmp_session import SNMPSession
+
+# Same columns as BaseSNMPClient.oids / sensor_types
+OIDS = {
+    "outlet_state": ".1.3.6.1.4.1.13742.6.4.1.2.1.3",
+    "outlet_control": ".1.3.6.1.4.1.13742.6.4.1.2.1.2",
+    "inlet_voltage": ".1.3.6.1.4.1.13742.6.5.2.3.1.4",
+    "outlet_current": ".1.3.6.1.4.1.13742.6.5.4.3.1.4"
+}
+SENSOR_TYPES = {"voltage": 4, "current": 1}
+
+
+def measure(label: str, func, iterations: int) -> float:
+    """Run func iterations times, print latency statistics in milliseconds and return the mean"""
+    # Warm up once so import-time and first-use costs are not counted
+    func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    mean = statistics.mean(samples)
+    print(f"{label:<24} mean={mean:8.3f} ms  p50={statistics.median(samples):8.3f} ms  p95={p95:8.3f} ms")
+    return mean
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--outlets", type=int, default=24)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated response latency in ms")
+    parser.add_argument("--port", type=int, default=16300)
+    parser.add_argument("--max-varbinds", type=int, default=24)
+    parser.add_argument("--auth-protocol", default="sha", choices=sorted(AUTH_PROTOCOLS))
+    parser.add_argument("--priv-protocol", default="aes", choices=sorted(PRIV_PROTOCOLS))
+    args = parser.parse_args()
+
+    user = V3User("bench", args.auth_protocol, "bench-auth-key", args.priv_protocol, "bench-priv-key")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(AGENT_DIR, "simulator.py"),
+         "--outlets", str(args.outlets), "--host", "127.0.0.1", "--port", str(args.port),
+         "--latency", str(args.latency), "--v3-user", user.user,
+         "--v3-auth-protocol", user.auth_protocol, "--v3-auth-key", user.auth_key,
+         "--v3-priv-protocol", user.priv_protocol, "--v3-priv-key", user.priv_key],
+        stdout=subprocess.PIPE, universal_newlines=True
+    )
+    try:
+        # The simulator prints one line once it is bound
+        if not process.stdout.readline():
+            raise RuntimeError("Simulator exited before it was ready")
+
+        oids = OutletOidTable(OIDS, SENSOR_TYPES, args.outlets).poll_oids(range(1, args.outlets + 1))
+
+        def poll(session: SNMPSession) -> None:
+            values = session.get_chunked(oids, args.max_varbinds)
+            if values[0] is None:
+                raise RuntimeError(f"Poll with {session.version} failed")
+
+        def v3_engine_per_poll() -> None:
+            session = SNMPSession("127.0.0.1", args.port, version="3", v3_user=user, timeout=2, retries=0)
+            # Pass phrases, as UsmUserData is usually built: pysnmp derives the keys again
+            session.auth_data = UsmUserData(
+                user.user, user.auth_key, user.priv_key,
+                authProtocol=AUTH_PROTOCOLS[user.auth_protocol], privProtocol=PRIV_PROTOCOLS[user.priv_protocol]
+            )
+            try:
+                poll(session)
+            finally:
+                session.close()
+
+        print(f"Polling {args.outlets} outlets ({len(oids)} OIDs), {args.iterations} iterations, "
+              f"v3 {user.security_level} {user.auth_protocol}/{user.priv_protocol}")
+
+        v2c = SNMPSession("127.0.0.1", args.port, timeout=2, retries=0)
+        v3 = SNMPSession("127.0.0.1", args.port, version="3", v3_user=user, timeout=2, retries=0)
+        try:
+            v2c_mean = measure("v2c session", lambda: poll(v2c), args.iterations)
+            measure("v3 engine per poll", v3_engine_per_poll, max(1, args.iterations // 10))
+            v3_mean = measure("v3 session", lambda: poll(v3), args.iterations)
+            stats = v3.usm_stats()
+        finally:
+            v2c.close()
+            v3.close()
+
+        print(f"v3 session overhead vs v2c: {(v3_mean / v2c_mean - 1) * 100:+.1f}%")
+        print(f"Report PDUs (discovery round trips) for {args.iterations + 1} v3 session polls: "
+              f"{stats['reports']} (engine {stats['engineId']})")
+
+        started = time.perf_counter()
+        master_key(AUTH_PROTOCOLS[user.auth_protocol], "a-fresh-pass-phrase")
+        derived = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        master_key(AUTH_PROTOCOLS[user.auth_protocol], "a-fresh-pass-phrase")
+        cached = (time.perf_counter() - started) * 1000
+        print(f"Master key from pass phrase: {derived:.3f} ms, cached: {cached:.4f} ms")
+    finally:
+        process.terminate()
+        process.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Model: steady-state SNMP requests per PDU with full polls vs tiered polling.
+
+Usage:
+    python benchmarks/bench_tiered.py [--outlets 8,24,48] [--hours 1] [--max-varbinds 24]
+
+Needs no PDU. Replays the background poll loop over simulated time with the
+intervals and jitter from config.py (POLL_INTERVAL, POLL_*_INTERVAL,
+POLL_*_JITTER) and counts the GET requests and OIDs each mode sends:
+
+  * full: inlet voltage, outlet count and every outlet's state and current
+    every POLL_INTERVAL
+  * tiered: the due metric groups of each tick (poll_schedule.PollSchedule)
+    merged into shared multi-varbind GETs
+
+It also reports the longest gap between two switching state reads, which must
+stay at the poll interval (plus jitter) for state freshness to be kept.
+Sensor metadata and topology refreshes are the same in both modes and left out.
+"""
+import argparse
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from fleet import DeviceConfig
+from snmp_client import BaseSNMPClient
+from poll_schedule import STATE
+from poller import create_schedule
+
+
+def requests_for(oid_count: int, max_varbinds: int) -> int:
+    return int(math.ceil(oid_count / max_varbinds)) if oid_count else 0
+
+
+def replay_full(client: BaseSNMPClient, outlet_nums, seconds: float, max_varbinds: int):
+    oids = len(client.oid_table.poll_oids(outlet_nums))
+    polls = int(seconds // config.POLL_INTERVAL)
+    return polls * requests_for(oids, max_varbinds), polls * oids, config.POLL_INTERVAL
+
+
+def replay_tiered(client: BaseSNMPClient, outlet_nums, seconds: float, max_varbinds: int):
+    schedule = create_schedule(config.POLL_INTERVAL)
+    now = 0.0
+    requests = oids = 0
+    last_state, max_gap = 0.0, 0.0
+    # The first tick is a full poll
+    schedule.done(schedule.groups, now)
+    while True:
+        now += schedule.wait(now)
+        if now >= seconds:
+            break
+        groups = schedule.due(now)
+        count = len(client.oid_table.group_oids(groups, outlet_nums))
+        requests += requests_for(count, max_varbinds)
+        oids += count
+        if STATE in groups:
+            max_gap = max(max_gap, now - last_state)
+            last_state = now
+        schedule.done(groups, now)
+    return requests, oids, max_gap
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--outlets", default="8,24,48")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--max-varbinds", type=int, default=config.SNMP_MAX_VARBINDS)
+    args = parser.parse_args()
+
+    seconds = args.hours * 3600
+    minutes = seconds / 60
+    print(f"POLL_INTERVAL={config.POLL_INTERVAL}s, current {config.POLL_CURRENT_INTERVAL}s, "
+          f"voltage {config.POLL_VOLTAGE_INTERVAL}s, config {config.POLL_CONFIG_INTERVAL}s, "
+          f"{args.max_varbinds} var-binds per GET, {args.hours:g} h simulated")
+    print(f"{'outlets':>7} {'mode':<7} {'GETs/min':>9} {'OIDs/min':>9} {'max state gap':>14}")
+    for outlets in (int(value) for value in args.outlets.split(",")):
+        client = BaseSNMPClient(DeviceConfig(id="bench", host="127.0.0.1", outlets=outlets))
+        outlet_nums = list(range(1, outlets + 1))
+        full = replay_full(client, outlet_nums, seconds, args.max_varbinds)
+        tiered = replay_tiered(client, outlet_nums, seconds, args.max_varbinds)
+        for mode, (requests, oids, gap) in (("full", full), ("tiered", tiered)):
+            print(f"{outlets:>7} {mode:<7} {requests / minutes:>9.1f} {oids / minutes:>9.1f} {gap:>13.1f}s")
+        print(f"{'':>7} tiered/full: {tiered[0] / full[0]:.2f} x GETs, {tiered[1] / full[1]:.2f} x OIDs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
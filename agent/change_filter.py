@@ -0,0 +1,86 @@
+"""Change detection before readings are persisted.
+
+Polling produces one reading per outlet per poll, almost all identical to the
+previous one. ReadingFilter keeps the last written reading of every outlet and
+lets a new one through only when
+
+  * the switching state changed,
+  * voltage or current moved beyond its deadband (compared with the last
+    written value, so slow drift is still written once it adds up), or
+  * nothing was written for the heartbeat interval (a keyframe, so readers
+    can tell a quiet outlet from a silent agent).
+
+Stored readings are a step function: each value holds until the next row.
+The filter also tracks the last known switching state per outlet (including
+states reported with events) so a transition becomes exactly one event.
+"""
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+# Reading fields compared against a deadband
+DEADBAND_FIELDS = ("voltage", "current")
+# States that make a transition ("unknown" from a failed read does not)
+SWITCHING_STATES = ("on", "off")
+
+
+class ReadingFilter:
+    """Per-outlet last-value cache with deadbands and a heartbeat"""
+
+    def __init__(self, deadbands: Dict[str, float], heartbeat: float):
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+        # (device key, outlet id) -> (written at (monotonic), state, voltage, current)
+        self._written: Dict[Tuple[str, str], Tuple[float, Any, Any, Any]] = {}
+        # (device key, outlet id) -> last known switching state
+        self._states: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self.counts = {"written": 0, "keyframes": 0, "suppressed": 0, "transitions": 0}
+
+    def check(self, device_key: str, outlet: Dict[str, Any],
+              now: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """Whether to write a reading, and the new state if it is a state transition"""
+        now = now if now is not None else time.monotonic()
+        key = (device_key, str(outlet["id"]))
+        state = outlet.get("state")
+        with self._lock:
+            transition = None
+            if state in SWITCHING_STATES:
+                previous_state = self._states.get(key, state)
+                self._states[key] = state
+                if state != previous_state:
+                    transition = state
+                    self.counts["transitions"] += 1
+
+            last = self._written.get(key)
+            if last is not None and transition is None and state == last[1] and not self._moved(outlet, last):
+                if now - last[0] < self.heartbeat:
+                    self.counts["suppressed"] += 1
+                    return False, transition
+                self.counts["keyframes"] += 1
+
+            self._written[key] = (now, state, outlet.get("voltage"), outlet.get("current"))
+            self.counts["written"] += 1
+            return True, transition
+
+    def _moved(self, outlet: Dict[str, Any], last: Tuple[float, Any, Any, Any]) -> bool:
+        for field, written in zip(DEADBAND_FIELDS, last[2:]):
+            value = outlet.get(field)
+            if value is None or written is None:
+                if value is not written:
+                    return True
+                continue
+            if abs(float(value) - float(written)) > self.deadbands.get(field, 0.0):
+                return True
+        return False
+
+    def note_state(self, device_key: str, outlet_id: str, state: Optional[str]) -> None:
+        """A state reported with an event (trap, control operation); later readings in that state are no transition"""
+        if state not in SWITCHING_STATES:
+            return
+        with self._lock:
+            self._states[(device_key, str(outlet_id))] = state
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counts, outlets=len(self._written))
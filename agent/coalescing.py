@@ -0,0 +1,130 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Hashable, Iterable, Callable, Awaitable
+
+
+class QueueFullError(Exception):
+    """Raised when too many operations are already queued for a key"""
+
+
+class SingleFlight:
+    """Coalesces concurrent identical reads.
+
+    While a read for a key is in flight, further callers for the same key
+    await the same task and share its result (or exception) instead of
+    issuing their own SNMP request.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executed = 0
+        self.deduplicated = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        task = self._in_flight.get(key)
+        return task is not None and not task.done()
+
+    def start(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Start the read for key unless one is already running; return its task"""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is not None and not task.done():
+            self.deduplicated += 1
+            return task
+
+        self.executed += 1
+        task = asyncio.ensure_future(factory())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return task
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run factory() for key, or join the identical read already in flight"""
+        # Shielded so one cancelled caller does not cancel the read for the others
+        return await asyncio.shield(self.start(key, factory))
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark a failure as retrieved even if every caller has gone away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+            "inFlight": len(self._in_flight)
+        }
+
+
+class KeyedSerializer:
+    """Runs work for the same key (e.g. one outlet) strictly one at a time.
+
+    Every key has a bounded queue: reserve() fails with QueueFullError once
+    max_queue operations (running or waiting) are registered for a key, so a
+    burst of clicks cannot pile up unbounded work for one outlet.
+    """
+
+    def __init__(self, max_queue: int = 4):
+        self.max_queue = max_queue
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._depth: Dict[Hashable, int] = {}
+        self.serialized = 0
+        self.rejected = 0
+
+    def depth(self, key: Hashable) -> int:
+        return self._depth.get(key, 0)
+
+    def reserve(self, keys: Iterable[Hashable]) -> None:
+        """Claim a queue slot on every key, or none of them"""
+        keys = set(keys)
+        full = [key for key in keys if self._depth.get(key, 0) >= self.max_queue]
+        if full:
+            self.rejected += 1
+            raise QueueFullError(f"{len(full)} key(s) already have {self.max_queue} queued operation(s)")
+        for key in keys:
+            self._depth[key] = self._depth.get(key, 0) + 1
+
+    def release(self, keys: Iterable[Hashable]) -> None:
+        """Give back the slots claimed by reserve()"""
+        for key in set(keys):
+            depth = self._depth.get(key, 0) - 1
+            if depth > 0:
+                self._depth[key] = depth
+            else:
+                self._depth.pop(key, None)
+                self._locks.pop(key, None)
+
+    @asynccontextmanager
+    async def hold(self, keys: Iterable[Hashable]):
+        """Hold the locks of all keys; the caller must have reserved them"""
+        # A fixed acquisition order keeps multi-key holders from deadlocking
+        ordered = sorted(set(keys))
+        acquired = []
+        try:
+            waited = False
+            for key in ordered:
+                lock = self._locks.setdefault(key, asyncio.Lock())
+                if lock.locked():
+                    waited = True
+                await lock.acquire()
+                acquired.append(lock)
+            if waited:
+                self.serialized += 1
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+            self.release(ordered)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "maxQueue": self.max_queue,
+            "busyKeys": len(self._depth),
+            "queued": sum(self._depth.values()),
+            "serialized": self.serialized,
+            "rejected": self.rejected
+        }
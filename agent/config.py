@@ -9,10 +9,56 @@ SNMP_HOST = os.getenv("SNMP_HOST", "192.168.1.100")
 SNMP_PORT = int(os.getenv("SNMP_PORT", "161"))
 SNMP_COMMUNITY = os.getenv("SNMP_COMMUNITY", "public")
 SNMP_VERSION = os.getenv("SNMP_VERSION", "2c")
+# SNMPv3 (SNMP_VERSION=3): USM user, auth (none/md5/sha/sha224/sha256/sha384/sha512) and
+# privacy (none/des/3des/aes/aes192/aes256) protocols and pass phrases, optional context
+SNMP_V3_USER = os.getenv("SNMP_V3_USER", "")
+SNMP_V3_AUTH_PROTOCOL = os.getenv("SNMP_V3_AUTH_PROTOCOL", "sha")
+SNMP_V3_AUTH_KEY = os.getenv("SNMP_V3_AUTH_KEY", "")
+SNMP_V3_PRIV_PROTOCOL = os.getenv("SNMP_V3_PRIV_PROTOCOL", "aes")
+SNMP_V3_PRIV_KEY = os.getenv("SNMP_V3_PRIV_KEY", "")
+SNMP_V3_CONTEXT = os.getenv("SNMP_V3_CONTEXT", "")
+SNMP_TIMEOUT = float(os.getenv("SNMP_TIMEOUT", "1.0"))
+SNMP_RETRIES = int(os.getenv("SNMP_RETRIES", "3"))
+# The per-PDU timeout adapts to the measured round trip time within these bounds
+# (SNMP_TIMEOUT is the starting value)
+SNMP_MIN_TIMEOUT = float(os.getenv("SNMP_MIN_TIMEOUT", "0.2"))
+SNMP_MAX_TIMEOUT = float(os.getenv("SNMP_MAX_TIMEOUT", "5.0"))
+# Retransmissions all requests of one full poll may use together
+SNMP_POLL_RETRY_BUDGET = int(os.getenv("SNMP_POLL_RETRY_BUDGET", "3"))
+# Circuit breaker: open after this many unanswered requests, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "10"))
+BREAKER_MAX_RESET_TIMEOUT = float(os.getenv("BREAKER_MAX_RESET_TIMEOUT", "300"))
+SNMP_MAX_REPETITIONS = int(os.getenv("SNMP_MAX_REPETITIONS", "25"))
+SNMP_MAX_VARBINDS = int(os.getenv("SNMP_MAX_VARBINDS", "24"))
+# Seconds sensor decimal digits/units/availability are cached per PDU
+SENSOR_METADATA_TTL = float(os.getenv("SENSOR_METADATA_TTL", "3600"))
 
 # Supabase Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "4"))
+# Outlet readings are queued and written in bulk by size or time threshold
+SUPABASE_BATCH_SIZE = int(os.getenv("SUPABASE_BATCH_SIZE", "500"))
+SUPABASE_FLUSH_INTERVAL = float(os.getenv("SUPABASE_FLUSH_INTERVAL", "2"))
+SUPABASE_MAX_BACKOFF = float(os.getenv("SUPABASE_MAX_BACKOFF", "300"))
+# Local write-ahead spool: readings survive Supabase outages and agent restarts
+SPOOL_PATH = os.getenv("SPOOL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool.db"))
+SPOOL_MAX_ROWS = int(os.getenv("SPOOL_MAX_ROWS", "1000000"))
+# Also log every background poll, not only reads/changes made through the API
+SUPABASE_LOG_POLLS = os.getenv("SUPABASE_LOG_POLLS", "False").lower() == "true"
+# Retention of raw readings and 1-minute rollups in Supabase (days), as pruned by prune_outlet_readings()
+SUPABASE_RAW_RETENTION_DAYS = float(os.getenv("SUPABASE_RAW_RETENTION_DAYS", "7"))
+SUPABASE_ROLLUP_1M_RETENTION_DAYS = float(os.getenv("SUPABASE_ROLLUP_1M_RETENTION_DAYS", "90"))
+# Change detection: a reading is written when the state changed, voltage (V) or current (A) moved by more
+# than its deadband since the last written reading, or nothing was written for READING_HEARTBEAT seconds
+READING_DEADBAND_VOLTAGE = float(os.getenv("READING_DEADBAND_VOLTAGE", "0.5"))
+READING_DEADBAND_CURRENT = float(os.getenv("READING_DEADBAND_CURRENT", "0.05"))
+READING_HEARTBEAT = float(os.getenv("READING_HEARTBEAT", "300"))
+# Longest a stored reading counts for in time-weighted history averages (seconds); keep it above
+# READING_HEARTBEAT and in sync with the argument of the outlet_readings_rollup trigger
+READING_MAX_HOLD = float(os.getenv("READING_MAX_HOLD", "600"))
 
 # API Configuration
 API_PORT = int(os.getenv("PORT", "5000"))
@@ -23,6 +69,58 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 PDU_MODEL = os.getenv("PDU_MODEL", "PX3")
 PDU_OUTLETS = int(os.getenv("PDU_OUTLETS", "8"))
 
+# Polling / Cache Configuration (seconds)
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "5"))
+CACHE_MAX_AGE = float(os.getenv("CACHE_MAX_AGE", "10"))
+CACHE_STALE_WHILE_REVALIDATE = float(os.getenv("CACHE_STALE_WHILE_REVALIDATE", "30"))
+# Tiered polling: switching states are read every POLL_INTERVAL, outlet currents, inlet voltage and
+# configuration (outlet count and names) at their own intervals; jitter is a fraction of each interval
+POLL_TIERED = os.getenv("POLL_TIERED", "True").lower() == "true"
+POLL_CURRENT_INTERVAL = float(os.getenv("POLL_CURRENT_INTERVAL", "30"))
+POLL_VOLTAGE_INTERVAL = float(os.getenv("POLL_VOLTAGE_INTERVAL", "60"))
+POLL_CONFIG_INTERVAL = float(os.getenv("POLL_CONFIG_INTERVAL", "300"))
+POLL_STATE_JITTER = float(os.getenv("POLL_STATE_JITTER", "0.1"))
+POLL_CURRENT_JITTER = float(os.getenv("POLL_CURRENT_JITTER", "0.1"))
+POLL_VOLTAGE_JITTER = float(os.getenv("POLL_VOLTAGE_JITTER", "0.1"))
+POLL_CONFIG_JITTER = float(os.getenv("POLL_CONFIG_JITTER", "0.1"))
+# In-memory history: samples kept per outlet (17 bytes each; 17280 = 24h at a 5s poll, 0 disables)
+HISTORY_SAMPLES = int(os.getenv("HISTORY_SAMPLES", "17280"))
+# Energy accounting: power is the outlet's activePower sensor, or inlet voltage x outlet current x
+# ENERGY_POWER_FACTOR on outlets without one; gaps between samples
+# longer than ENERGY_MAX_GAP seconds are not integrated; totals are checkpointed every ENERGY_CHECKPOINT_INTERVAL
+ENERGY_POWER_FACTOR = float(os.getenv("ENERGY_POWER_FACTOR", "1.0"))
+ENERGY_MAX_GAP = float(os.getenv("ENERGY_MAX_GAP", "300"))
+ENERGY_CHECKPOINT_PATH = os.getenv("ENERGY_CHECKPOINT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "energy.json"))
+ENERGY_CHECKPOINT_INTERVAL = float(os.getenv("ENERGY_CHECKPOINT_INTERVAL", "60"))
+
+# Control Operation Configuration (seconds)
+# After a SET, outletSwitchingState is polled until it converges or times out
+CONTROL_POLL_INTERVAL = float(os.getenv("CONTROL_POLL_INTERVAL", "0.25"))
+CONTROL_TIMEOUT = float(os.getenv("CONTROL_TIMEOUT", "10"))
+CONTROL_CYCLE_TIMEOUT = float(os.getenv("CONTROL_CYCLE_TIMEOUT", "30"))
+# Operations on one outlet run one at a time; at most this many may be queued per outlet
+CONTROL_MAX_QUEUE = int(os.getenv("CONTROL_MAX_QUEUE", "4"))
+
+# Outlet Stream (Server-Sent Events) Configuration
+STREAM_MAX_QUEUE = int(os.getenv("STREAM_MAX_QUEUE", "100"))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+
+# SNMP Trap Receiver Configuration
+# With traps enabled, polling becomes a slow reconciliation loop (TRAP_RECONCILE_INTERVAL)
+TRAP_ENABLED = os.getenv("TRAP_ENABLED", "False").lower() == "true"
+TRAP_HOST = os.getenv("TRAP_HOST", "0.0.0.0")
+TRAP_PORT = int(os.getenv("TRAP_PORT", "162"))
+# Comma-separated communities accepted in traps; empty accepts any
+TRAP_COMMUNITIES = [c for c in os.getenv("TRAP_COMMUNITIES", "").split(",") if c]
+TRAP_RECONCILE_INTERVAL = float(os.getenv("TRAP_RECONCILE_INTERVAL", "60"))
+
+# Fleet Configuration
+# JSON file listing several PDUs; when unset the single PDU above is used
+FLEET_CONFIG_FILE = os.getenv("FLEET_CONFIG_FILE", "")
+DEVICE_ID = os.getenv("DEVICE_ID", "default")
+FLEET_MAX_IN_FLIGHT = int(os.getenv("FLEET_MAX_IN_FLIGHT", "64"))
+FLEET_DEVICE_TIMEOUT = float(os.getenv("FLEET_DEVICE_TIMEOUT", "8"))
+
 # SSL Configuration
 SSL_CERT_FILE = os.getenv("SSL_CERT_FILE")
 SSL_KEY_FILE = os.getenv("SSL_KEY_FILE")
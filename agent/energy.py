@@ -0,0 +1,270 @@
+"""Incremental power and energy accounting per outlet and per inlet.
+
+Every polled sample gives an outlet's power: the PDU's own activePower (W)
+and apparentPower (VA) sensors where the outlet reports them, otherwise
+inlet voltage x outlet current (VA), times a configured power factor for the
+active power. Energy is integrated as each sample
+arrives: the previous power holds until the next sample (the same step
+function the stored readings follow), so a sample costs O(1) no matter how
+long the agent runs. A gap longer than max_gap (agent down, PDU unreachable)
+is not integrated, since nothing is known about it.
+
+The inlet meter follows the sum of the outlet powers, kept up to date by
+difference, so its energy matches the sum of the outlet energies (as long as
+no single outlet drops out for longer than max_gap). On PDUs with several
+inlets it is the total of all of them.
+
+Rolling averages and peaks use a ring of fixed-width slots per window, each
+holding the energy, covered seconds and peak power of its slot. Slots are
+cleared as time moves past them, so a window covers between its length minus
+one slot and its length. Energy totals are checkpointed to a JSON file and
+restored on start.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+# Rolling windows: name -> (length, slots), both in seconds / count
+WINDOWS = {"1m": (60, 12), "1h": (3600, 60)}
+# States that come with readings ("unknown" from a failed read does not)
+MEASURED_STATES = ("on", "off")
+
+
+def outlet_power(outlet: Dict[str, Any], power_factor: float = 1.0) -> Optional[Tuple[float, Optional[float]]]:
+    """(active W, apparent VA) of an outlet reading, None without an active power.
+
+    Measured power and apparentPower are used as they are; a missing one is
+    estimated from voltage x current (active: times power_factor).
+    """
+    voltage, current = outlet.get("voltage"), outlet.get("current")
+    estimate = float(voltage) * float(current) if voltage is not None and current is not None else None
+    active, apparent = outlet.get("power"), outlet.get("apparentPower")
+    if active is None:
+        if estimate is None:
+            return None
+        active = estimate * power_factor
+    if apparent is None:
+        apparent = estimate
+    return float(active), float(apparent) if apparent is not None else None
+
+
+class RollingWindow:
+    """Energy, covered time and peak power over the last length seconds"""
+    __slots__ = ("width", "slots", "joules", "seconds", "peaks", "index")
+
+    def __init__(self, length: float, slots: int):
+        self.width = length / slots
+        self.slots = slots
+        self.joules = [0.0] * slots
+        self.seconds = [0.0] * slots
+        self.peaks: List[Optional[float]] = [None] * slots
+        # Absolute number of the newest slot (timestamp // width)
+        self.index: Optional[int] = None
+
+    def _advance(self, timestamp: float) -> int:
+        """Clear the slots time has moved past; the slot of timestamp"""
+        index = int(timestamp // self.width)
+        if self.index is None:
+            self.index = index
+        elif index > self.index:
+            for number in range(self.index + 1, min(index, self.index + self.slots) + 1):
+                slot = number % self.slots
+                self.joules[slot] = self.seconds[slot] = 0.0
+                self.peaks[slot] = None
+            self.index = index
+        return self.index % self.slots
+
+    def add(self, timestamp: float, joules: float, seconds: float, power: float) -> None:
+        slot = self._advance(timestamp)
+        self.joules[slot] += joules
+        self.seconds[slot] += seconds
+        if self.peaks[slot] is None or power > self.peaks[slot]:
+            self.peaks[slot] = power
+
+    def summary(self, timestamp: float) -> Dict[str, Any]:
+        self._advance(timestamp)
+        seconds = sum(self.seconds)
+        peaks = [peak for peak in self.peaks if peak is not None]
+        return {
+            "avg": round(sum(self.joules) / seconds, 1) if seconds else None,
+            "peak": round(max(peaks), 1) if peaks else None,
+            "seconds": round(seconds, 1)
+        }
+
+
+class PowerMeter:
+    """Current power, energy total and rolling windows of one outlet or inlet"""
+    __slots__ = ("energy", "since", "power", "last", "windows")
+
+    def __init__(self, since: Optional[float] = None):
+        self.energy = 0.0  # Wh
+        self.since = since if since is not None else time.time()
+        self.power: Optional[float] = None
+        self.last: Optional[float] = None
+        self.windows = {name: RollingWindow(length, slots) for name, (length, slots) in WINDOWS.items()}
+
+    def update(self, timestamp: float, power: float, max_gap: float) -> None:
+        """A new power sample: integrate the previous one up to timestamp"""
+        joules = seconds = 0.0
+        if self.last is not None:
+            elapsed = timestamp - self.last
+            if elapsed < 0:
+                # Clock went backwards: keep the sample, integrate nothing
+                elapsed = 0.0
+            if elapsed <= max_gap:
+                joules, seconds = self.power * elapsed, elapsed
+                self.energy += joules / 3600
+        for window in self.windows.values():
+            window.add(timestamp, joules, seconds, power)
+        self.power = power
+        self.last = timestamp
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "power": round(self.power, 1) if self.power is not None else None,
+            "energyKwh": round(self.energy / 1000, 6),
+            "since": _isoformat(self.since),
+            "windows": {name: window.summary(now) for name, window in self.windows.items()}
+        }
+
+    def checkpoint(self) -> Dict[str, float]:
+        return {"energyWh": self.energy, "since": self.since}
+
+    @classmethod
+    def restore(cls, data: Dict[str, Any]) -> "PowerMeter":
+        meter = cls(since=float(data["since"]))
+        meter.energy = float(data["energyWh"])
+        return meter
+
+
+class EnergyMeter:
+    """Power and energy of every outlet of one PDU and of its inlet, fed from the poller"""
+
+    def __init__(self, power_factor: float = 1.0, max_gap: float = 300.0):
+        self.power_factor = power_factor
+        self.max_gap = max_gap
+        self.outlets: Dict[str, PowerMeter] = {}
+        self.inlet = PowerMeter()
+        # Last active power of every outlet and their sum (the inlet's power)
+        self._power: Dict[str, float] = {}
+        self._total = 0.0
+        # Last apparent power of every outlet
+        self._apparent: Dict[str, float] = {}
+
+    def record(self, outlets: List[Dict[str, Any]], timestamp: Optional[float] = None) -> None:
+        """One sample per outlet (outlets without readings are skipped), then one for the inlet"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        recorded = False
+        for outlet in outlets:
+            if outlet.get("state") not in MEASURED_STATES:
+                continue
+            power = outlet_power(outlet, self.power_factor)
+            if power is None:
+                continue
+            outlet_id = str(outlet["id"])
+            meter = self.outlets.get(outlet_id)
+            if meter is None:
+                meter = self.outlets[outlet_id] = PowerMeter()
+            meter.update(timestamp, power[0], self.max_gap)
+            self._total += power[0] - self._power.get(outlet_id, 0.0)
+            self._power[outlet_id] = power[0]
+            if power[1] is not None:
+                self._apparent[outlet_id] = power[1]
+            else:
+                self._apparent.pop(outlet_id, None)
+            recorded = True
+        if recorded:
+            self.inlet.update(timestamp, max(0.0, self._total), self.max_gap)
+
+    def energy_kwh(self, outlet_id: str) -> Optional[float]:
+        """Energy counter of one outlet (kWh), None before its first sample"""
+        meter = self.outlets.get(str(outlet_id))
+        return round(meter.energy / 1000, 6) if meter is not None else None
+
+    def to_dict(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now if now is not None else time.time()
+        outlets = {}
+        for outlet_id, meter in self.outlets.items():
+            entry = meter.to_dict(now)
+            apparent = self._apparent.get(outlet_id)
+            entry["apparentPower"] = round(apparent, 1) if apparent is not None else None
+            outlets[outlet_id] = entry
+        inlet = self.inlet.to_dict(now)
+        inlet["apparentPower"] = round(sum(self._apparent.values()), 1) if self._apparent else None
+        return {"powerFactor": self.power_factor, "inlet": inlet, "outlets": outlets}
+
+    def checkpoint(self) -> Dict[str, Any]:
+        return {
+            "inlet": self.inlet.checkpoint(),
+            "outlets": {outlet_id: meter.checkpoint() for outlet_id, meter in self.outlets.items()}
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Continue the energy totals of a checkpoint (the power before it is unknown)"""
+        if "inlet" in data:
+            self.inlet = PowerMeter.restore(data["inlet"])
+        for outlet_id, entry in data.get("outlets", {}).items():
+            self.outlets[outlet_id] = PowerMeter.restore(entry)
+
+
+class EnergyCheckpoints:
+    """Periodic JSON checkpoints of the energy totals of every PDU"""
+
+    def __init__(self, path: str, interval: float = 60.0):
+        self.path = path
+        self.interval = interval
+        self.meters: Dict[str, EnergyMeter] = {}
+        self.saved_at: Optional[float] = None
+        self._next_save = time.monotonic() + interval
+
+    def load(self) -> None:
+        """Restore the totals of the meters from the last checkpoint, if any"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            for device_id, entry in data.get("devices", {}).items():
+                meter = self.meters.get(device_id)
+                if meter is not None:
+                    meter.restore(entry)
+            self.saved_at = data.get("savedAt")
+        except Exception as e:
+            print(f"Error loading energy checkpoint {self.path}: {e}")
+
+    def save(self) -> None:
+        """Write every meter's totals (atomically: a crash leaves the previous checkpoint)"""
+        if not self.path:
+            return
+        self.saved_at = time.time()
+        data = {
+            "savedAt": self.saved_at,
+            "devices": {device_id: meter.checkpoint() for device_id, meter in self.meters.items()}
+        }
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump(data, f)
+            os.replace(temporary, self.path)
+        except Exception as e:
+            print(f"Error saving energy checkpoint {self.path}: {e}")
+
+    def maybe_save(self) -> None:
+        """Save when the checkpoint interval has passed"""
+        now = time.monotonic()
+        if now >= self._next_save:
+            self._next_save = now + self.interval
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "interval": self.interval,
+            "savedAt": _isoformat(self.saved_at) if self.saved_at is not None else None
+        }
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
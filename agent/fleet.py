@@ -0,0 +1,211 @@
+import asyncio
+import json
+from typing import Dict, Any, Optional, List, Tuple
+from pysnmp.hlapi.asyncio import SnmpEngine
+import config
+from async_snmp_client import AsyncSNMPClient
+from snmp_auth import V3User
+from snmp_client import v3_user_from_config
+from poller import OutletPoller, create_poller
+from timeseries import OutletHistory
+from energy import EnergyMeter, EnergyCheckpoints
+
+
+class DeviceConfig:
+    """Connection settings for one PDU in the fleet"""
+
+    def __init__(self, id: str, host: str, port: int = 161, community: str = "public",
+                 version: str = "2c", model: str = "PX3", outlets: int = 8, name: Optional[str] = None,
+                 v3: Optional[V3User] = None):
+        self.id = id
+        self.host = host
+        self.port = port
+        self.community = community
+        self.version = version
+        self.v3 = v3
+        self.model = model
+        self.outlets = outlets
+        self.name = name or f"{model} PDU ({host})"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None) -> "DeviceConfig":
+        """Build a device from a fleet file entry, falling back to the file's defaults"""
+        merged = dict(defaults or {})
+        merged.update(data)
+        if "id" not in merged or "host" not in merged:
+            raise ValueError(f"Fleet device entry needs an 'id' and a 'host': {data}")
+        version = str(merged.get("version", "2c"))
+        if version == "3" and not merged.get("v3"):
+            raise ValueError(f"Fleet device {merged['id']} uses SNMPv3 but has no 'v3' user")
+        return cls(
+            id=str(merged["id"]),
+            host=merged["host"],
+            port=int(merged.get("port", 161)),
+            community=merged.get("community", "public"),
+            version=version,
+            model=merged.get("model", "PX3"),
+            outlets=int(merged.get("outlets", 8)),
+            name=merged.get("name"),
+            v3=V3User.from_dict(merged["v3"]) if version == "3" else None
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public description of the device (without credentials)"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "host": self.host,
+            "port": self.port,
+            "version": self.version,
+            "model": self.model,
+            "outlets": self.outlets
+        }
+
+
+def load_device_configs(path: Optional[str] = None) -> List[DeviceConfig]:
+    """Load the fleet file, or describe the single PDU from config.py when there is none.
+
+    The fleet file is JSON: {"defaults": {...}, "devices": [{"id": ..., "host": ...}, ...]}
+    where each device may override community, version, port, model and outlets. SNMPv3
+    devices take a "v3" object: {"user", "authProtocol", "authKey", "privProtocol", "privKey", "context"}.
+    """
+    path = path or config.FLEET_CONFIG_FILE
+    if not path:
+        return [DeviceConfig(
+            id=config.DEVICE_ID,
+            host=config.SNMP_HOST,
+            port=config.SNMP_PORT,
+            community=config.SNMP_COMMUNITY,
+            version=config.SNMP_VERSION,
+            model=config.PDU_MODEL,
+            outlets=config.PDU_OUTLETS,
+            v3=v3_user_from_config()
+        )]
+
+    with open(path) as f:
+        data = json.load(f)
+    defaults = data.get("defaults", {})
+    devices = [DeviceConfig.from_dict(entry, defaults) for entry in data.get("devices", [])]
+    if not devices:
+        raise ValueError(f"Fleet file {path} does not list any devices")
+
+    seen = set()
+    for device in devices:
+        if device.id in seen:
+            raise ValueError(f"Duplicate device id in fleet file: {device.id}")
+        seen.add(device.id)
+    return devices
+
+
+class Device:
+    """A PDU at runtime: its configuration, SNMP client, poller, recent history and energy meter"""
+
+    def __init__(self, device_config: DeviceConfig, client: AsyncSNMPClient, poller: OutletPoller,
+                 history: Optional[OutletHistory] = None, energy: Optional[EnergyMeter] = None,
+                 checkpoints: Optional[EnergyCheckpoints] = None):
+        self.config = device_config
+        self.id = device_config.id
+        self.client = client
+        self.poller = poller
+        self.history = history
+        self.energy = energy
+        if history is not None:
+            # Every full poll and every change in between (traps, control operations), once each
+            poller.sample_listeners.append(lambda snapshot, outlets: history.record(outlets))
+        if energy is not None:
+            poller.sample_listeners.append(lambda snapshot, outlets: self._record_energy(outlets, checkpoints))
+
+    def _record_energy(self, outlets: List[Dict[str, Any]], checkpoints: Optional[EnergyCheckpoints]) -> None:
+        self.energy.record(outlets)
+        if checkpoints is not None:
+            checkpoints.maybe_save()
+
+    def reading(self, outlet: Dict[str, Any]) -> Dict[str, Any]:
+        """An outlet reading with the outlet's energy counter, as written to Supabase"""
+        if self.energy is None:
+            return outlet
+        return dict(outlet, energyKwh=self.energy.energy_kwh(outlet["id"]))
+
+
+class Fleet:
+    """All PDUs served by this agent, polled concurrently.
+
+    Every device has its own poller, but they share one SNMP engine, a bounded
+    number of in-flight polls and a per-device poll timeout. Start times are
+    spread across the poll interval so hundreds of PDUs do not fire at once.
+    """
+
+    def __init__(self, device_configs: List[DeviceConfig], max_in_flight: int = 64,
+                 device_timeout: Optional[float] = None):
+        self.engine = SnmpEngine()
+        # pysnmp keys its SNMPv3 user table by user name, so a user whose
+        # protocols or keys differ between PDUs gets an engine of its own
+        self._v3_users: Dict[str, Tuple[Any, ...]] = {}
+        self._extra_engines: List[SnmpEngine] = []
+        self.max_in_flight = max_in_flight
+        # Created in start() so it binds to the server's event loop
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.devices: Dict[str, Device] = {}
+        # Energy totals survive restarts through periodic checkpoints
+        self.checkpoints = EnergyCheckpoints(config.ENERGY_CHECKPOINT_PATH, config.ENERGY_CHECKPOINT_INTERVAL)
+
+        count = len(device_configs)
+        for index, device_config in enumerate(device_configs):
+            client = AsyncSNMPClient(device_config, engine=self._engine_for(device_config))
+            poller = create_poller(
+                client,
+                timeout=device_timeout,
+                start_delay=(config.TRAP_RECONCILE_INTERVAL if config.TRAP_ENABLED else config.POLL_INTERVAL) * index / count
+            )
+            history = OutletHistory(config.HISTORY_SAMPLES) if config.HISTORY_SAMPLES > 0 else None
+            energy = self.checkpoints.meters[device_config.id] = EnergyMeter(
+                config.ENERGY_POWER_FACTOR, config.ENERGY_MAX_GAP
+            )
+            self.devices[device_config.id] = Device(device_config, client, poller, history, energy, self.checkpoints)
+        self.checkpoints.load()
+
+        # The first device answers the legacy single-PDU routes (/outlets...)
+        self.default = next(iter(self.devices.values()))
+
+    def _engine_for(self, device_config: DeviceConfig) -> SnmpEngine:
+        v3 = device_config.v3 if str(device_config.version) == "3" else None
+        if v3 is None:
+            return self.engine
+        credentials = self._v3_users.setdefault(v3.user, v3.credentials())
+        if credentials == v3.credentials():
+            return self.engine
+        engine = SnmpEngine()
+        self._extra_engines.append(engine)
+        return engine
+
+    def get(self, device_id: str) -> Optional[Device]:
+        return self.devices.get(device_id)
+
+    def start(self) -> None:
+        """Start polling every device"""
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        for device in self.devices.values():
+            device.poller.semaphore = self.semaphore
+            device.poller.start()
+
+    async def stop(self) -> None:
+        """Stop all pollers and release the shared SNMP engine"""
+        await asyncio.gather(*[device.poller.stop() for device in self.devices.values()])
+        self.checkpoints.save()
+        for device in self.devices.values():
+            device.client.close()
+        for engine in [self.engine] + self._extra_engines:
+            try:
+                engine.transportDispatcher.closeDispatcher()
+            except Exception:
+                # The dispatcher is only created on first use
+                pass
+
+
+def create_fleet() -> Fleet:
+    """Create the fleet described by config.py / the fleet file"""
+    return Fleet(
+        load_device_configs(),
+        max_in_flight=config.FLEET_MAX_IN_FLIGHT,
+        device_timeout=config.FLEET_DEVICE_TIMEOUT
+    )
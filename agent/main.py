@@ -1,17 +1,119 @@
 from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-import os
-from typing import Dict, Any
-from snmp_client import SNMPClient
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel
+from snmp_types import convert_snmp_types
 from supabase_client import supabase_client
+from fleet import Device, create_fleet
+from traps import OutletTrapHandler, start_trap_receiver
+from streaming import OutletStream
+from operations import BulkOperation, create_operation_manager
+from coalescing import QueueFullError
+from resilience import DeviceUnreachable
+from timeseries import check_range
+import rollups
+import metrics
 import config
-import json
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
 
 app = FastAPI(title="SNMP Agent API", description="API for controlling PDU outlets via SNMP")
 
-# Initialize SNMP client
-snmp_client = SNMPClient()
+# Initialize the PDU fleet: one asyncio SNMP client and background poller per device.
+# Without FLEET_CONFIG_FILE this is just the single PDU configured in .env
+fleet = create_fleet()
+
+# Server-Sent Events stream of outlet diffs, one per device
+outlet_streams = {
+    device_id: OutletStream(device.poller, max_queue=config.STREAM_MAX_QUEUE, heartbeat=config.STREAM_HEARTBEAT)
+    for device_id, device in fleet.devices.items()
+}
+
+# Control operations (toggle/cycle) run in the background and are confirmed by polling
+operation_manager = create_operation_manager()
+
+def _on_operation_update(operation) -> None:
+    """Publish operation progress on the device streams and log completed operations"""
+    if isinstance(operation, BulkOperation):
+        devices = operation.devices
+        readings = [
+            (device, outlet) for device in devices for outlet in operation.results.get(device.id, [])
+        ]
+    else:
+        devices = [operation.device]
+        readings = [(operation.device, operation.result)] if operation.result is not None else []
+
+    data = operation.to_dict()
+    for device in devices:
+        outlet_streams[device.id].publish("operation", data)
+
+    if operation.done and supabase_client.is_configured():
+        for device, outlet in readings:
+            # The event first: the reading then is no (second) state transition
+            supabase_client.queue_outlet_event(
+                outlet["id"], operation.action, outlet.get("state"), device.config, user_initiated=True
+            )
+            supabase_client.queue_outlet_state(device.reading(outlet), device.config)
+
+operation_manager.listeners.append(_on_operation_update)
+
+# Gauges computed when /metrics is scraped
+metrics.registry.register(metrics.Gauge(
+    "pdu_supabase_queue_depth", "Readings waiting in the local spool for Supabase",
+    callback=supabase_client.queue_depth
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_supabase_queue_lag_seconds", "Age of the oldest reading waiting in the spool",
+    callback=lambda: supabase_client.spool.oldest_age()
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_snapshot_age_seconds", "Age of the last full outlet poll", ("device",),
+    callback=lambda: {
+        (device_id,): device.poller.snapshot.age()
+        for device_id, device in fleet.devices.items() if device.poller.snapshot is not None
+    }
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_circuit_open", "1 while the PDU's circuit breaker is open or half-open", ("device",),
+    callback=lambda: {
+        (device_id,): int(device.client.session.breaker.state != "closed")
+        for device_id, device in fleet.devices.items()
+    }
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_snmp_timeout_seconds", "Current adaptive SNMP timeout", ("device",),
+    callback=lambda: {(device_id,): device.client.session.rto.timeout for device_id, device in fleet.devices.items()}
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_stream_subscribers", "Connected outlet stream clients", ("device",),
+    callback=lambda: {(device_id,): len(stream.subscribers) for device_id, stream in outlet_streams.items()}
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_inlet_power_watts", "Sum of the outlet powers of the PDU", ("device",),
+    callback=lambda: {
+        (device_id,): device.energy.inlet.power
+        for device_id, device in fleet.devices.items() if device.energy is not None and device.energy.inlet.power is not None
+    }
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_inlet_energy_kwh", "Energy through the PDU since its counter started", ("device",),
+    callback=lambda: {
+        (device_id,): device.energy.inlet.energy / 1000
+        for device_id, device in fleet.devices.items() if device.energy is not None
+    }
+))
+metrics.registry.register(metrics.Gauge(
+    "pdu_operations_active", "Control operations queued or running",
+    callback=lambda: operation_manager.stats()["active"]
+))
+
+# SNMP trap listener (started on startup when TRAP_ENABLED)
+trap_handler = None
+trap_transport = None
 
 # Configure CORS - Updated to be more permissive for troubleshooting
 app.add_middleware(
@@ -24,18 +126,42 @@ app.add_middleware(
     max_age=86400  # Cache preflight requests for 24 hours
 )
 
-# Helper function to convert SNMP types to standard Python types
-def convert_snmp_types(data):
-    """Convert SNMP-specific types to standard Python types for JSON serialization"""
-    if isinstance(data, dict):
-        return {k: convert_snmp_types(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [convert_snmp_types(item) for item in data]
-    elif hasattr(data, '__class__') and 'pysnmp.proto.rfc1902' in str(data.__class__):
-        # Convert pysnmp types to standard Python types
-        return int(data) if 'Integer' in str(data.__class__) or 'Gauge' in str(data.__class__) else str(data)
-    else:
-        return data
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background polling of every PDU"""
+    global trap_handler, trap_transport
+    
+    # Replay readings spooled by a previous run and start draining new ones
+    supabase_client.start()
+    if config.SUPABASE_LOG_POLLS and supabase_client.is_configured():
+        for device in fleet.devices.values():
+            device.poller.poll_listeners.append(
+                lambda snapshot, device=device: [supabase_client.queue_outlet_state(device.reading(outlet), device.config)
+                                                 for outlet in snapshot.outlets]
+            )
+    fleet.start()
+    
+    if config.TRAP_ENABLED:
+        trap_handler = OutletTrapHandler(
+            fleet,
+            event_sink=lambda device, outlet_id, event_type, new_state: supabase_client.queue_outlet_event(
+                outlet_id, event_type, new_state, device.config
+            ),
+            communities=config.TRAP_COMMUNITIES
+        )
+        trap_transport = await start_trap_receiver(trap_handler, config.TRAP_HOST, config.TRAP_PORT)
+        print(f"Listening for SNMP traps on {config.TRAP_HOST}:{config.TRAP_PORT}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop polling, release SNMP sockets and flush queued readings on shutdown"""
+    if trap_transport is not None:
+        trap_transport.close()
+    await fleet.stop()
+    await asyncio.get_running_loop().run_in_executor(None, supabase_client.close)
 
 
 @app.get("/healthz")
@@ -43,98 +169,373 @@ async def health_check() -> Dict[str, str]:
     """Health check endpoint"""
     return {"status": "ok"}
 
-@app.get("/outlets")
-async def get_outlets() -> Dict[str, Any]:
-    """Get all outlets"""
+def _get_device(device_id: str) -> Device:
+    """Look up a fleet device or fail with 404"""
+    device = fleet.get(device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail=f"Unknown device {device_id}")
+    return device
+
+async def _log_outlet_state(device: Device, result: Dict[str, Any]) -> None:
+    """Spool an outlet state for the bulk Supabase writer if Supabase is configured"""
+    if supabase_client.is_configured():
+        supabase_client.queue_outlet_state(device.reading(result), device.config)
+
+async def _get_outlets(device: Device, request: Request, fresh: bool, since: Optional[int] = None) -> Response:
     try:
-        result = snmp_client.get_all_outlets()
-        # Convert SNMP types to standard Python types
-        result = convert_snmp_types(result)
+        result = await device.poller.get_outlets(fresh, since)
         print(f"Retrieved all outlets: {len(result['outlets'])} outlets found")
-        return result
+    except DeviceUnreachable as e:
+        # Nothing known about this PDU yet
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get outlets: {str(e)}")
 
-@app.get("/outlets/{outlet_id}")
-async def get_outlet(outlet_id: str) -> Dict[str, Any]:
-    """Get outlet by ID"""
+    # The version only moves when outlet data changes; stale/unreachable responses differ in their flags
+    etag = f'W/"{result["version"]}{"-stale" if result["stale"] else ""}{"" if result["reachable"] else "-unreachable"}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(device.poller.snapshot.modified, usegmt=True),
+        # Caches may keep the response but must revalidate it (cheap: a 304 without a body)
+        "Cache-Control": "no-cache"
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=result, headers=headers)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match against an ETag, with the weak comparison RFC 7232 prescribes for it"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+async def _get_outlet(device: Device, outlet_id: str, fresh: bool) -> Dict[str, Any]:
     try:
-        result = snmp_client.get_outlet_state(outlet_id)
-        
-        # Convert SNMP types to standard Python types
-        result = convert_snmp_types(result)
+        result = await device.poller.get_outlet(outlet_id, fresh)
         
-        # Log the outlet state to Supabase
-        if supabase_client.is_connected():
-            supabase_client.log_outlet_state(result)
+        # Log the outlet state to Supabase (last known states of an unreachable PDU are not new readings)
+        if result.get("reachable", True):
+            await _log_outlet_state(device, result)
             
         return result
+    except DeviceUnreachable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get outlet {outlet_id}: {str(e)}")
 
-@app.post("/outlets/{outlet_id}/toggle")
-async def toggle_outlet(outlet_id: str) -> Dict[str, Any]:
-    """Toggle outlet state"""
+async def _submit_operation(device: Device, outlet_id: str, action: str, wait: bool):
+    """Start a control operation; 202 with its id, or the confirmed outlet when wait=true"""
     try:
-        result = snmp_client.toggle_outlet(outlet_id)
-        if "error" in result:
-            raise HTTPException(status_code=500, detail=result["error"])
-        
-        # Convert SNMP types to standard Python types
-        result = convert_snmp_types(result)
-        
-        # Log the outlet state change to Supabase
-        if supabase_client.is_connected():
-            supabase_client.log_outlet_state(result)
-            
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to toggle outlet {outlet_id}: {str(e)}")
+        operation = operation_manager.submit(device, outlet_id, action)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many queued operations for outlet {outlet_id}: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {action} request for outlet {outlet_id}: {str(e)}")
+
+    if not wait:
+        return JSONResponse(
+            status_code=202,
+            content=operation.to_dict(),
+            headers={"Location": f"/operations/{operation.id}"}
+        )
+
+    await operation.wait()
+    if operation.status == "failed":
+        raise HTTPException(status_code=500, detail=operation.error or f"Failed to {action} outlet {outlet_id}")
+    if operation.result is None:
+        # Switched, but the outlet could not be read back afterwards
+        result = {"id": outlet_id, "state": operation.observed_state, "readError": operation.read_error,
+                  "operationId": operation.id, "status": operation.status}
+    else:
+        result = dict(operation.result, operationId=operation.id, status=operation.status)
+    if operation.error:
+        result["message"] = operation.error
+    return result
+
+class BulkStagger(BaseModel):
+    batch: int = 0          # Outlets switched together per PDU (0 = all at once)
+    intervalMs: int = 0     # Delay between batches
 
-@app.post("/outlets/{outlet_id}/cycle")
-async def cycle_outlet(outlet_id: str) -> Dict[str, Any]:
+class BulkControlRequest(BaseModel):
+    action: str                             # "on", "off" or "cycle"
+    outlets: List[str] = []                 # Outlets of the default PDU
+    devices: Dict[str, List[str]] = {}      # Fleet device id -> outlet ids
+    stagger: Optional[BulkStagger] = None
+
+def _stream_response(device: Device, request: Request) -> StreamingResponse:
+    return StreamingResponse(
+        outlet_streams[device.id].events(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/outlets/stream")
+async def stream_outlets(request: Request):
+    """Server-Sent Events: a full snapshot on connect, then per-outlet diffs"""
+    return _stream_response(fleet.default, request)
+
+@app.get("/outlets")
+async def get_outlets(request: Request, fresh: bool = False, since: Optional[int] = None) -> Response:
+    """Get all outlets (from the poller snapshot unless fresh=true); since=<version> returns only changes"""
+    return await _get_outlets(fleet.default, request, fresh, since)
+
+@app.get("/outlets/{outlet_id}")
+async def get_outlet(outlet_id: str, fresh: bool = False) -> Dict[str, Any]:
+    """Get outlet by ID (from the poller snapshot unless fresh=true)"""
+    return await _get_outlet(fleet.default, outlet_id, fresh)
+
+@app.post("/outlets/{outlet_id}/toggle", status_code=202)
+async def toggle_outlet(outlet_id: str, wait: bool = False):
+    """Toggle outlet state (202 + operation id; wait=true blocks until confirmed)"""
+    return await _submit_operation(fleet.default, outlet_id, "toggle", wait)
+
+@app.post("/outlets/{outlet_id}/cycle", status_code=202)
+async def cycle_outlet(outlet_id: str, wait: bool = False):
     """Cycle outlet (turn off then on)"""
+    return await _submit_operation(fleet.default, outlet_id, "cycle", wait)
+
+@app.post("/outlets/bulk", status_code=202)
+async def bulk_control_outlets(body: BulkControlRequest, wait: bool = False):
+    """Switch many outlets, optionally on several PDUs, as one operation"""
+    targets = [(_get_device(device_id), outlet_ids) for device_id, outlet_ids in body.devices.items()]
+    if body.outlets:
+        targets.insert(0, (fleet.default, body.outlets))
+    stagger = body.stagger or BulkStagger()
+
     try:
-        result = snmp_client.cycle_outlet(outlet_id)
-        if "error" in result:
-            raise HTTPException(status_code=500, detail=result["error"])
-        
-        # Convert SNMP types to standard Python types
-        result = convert_snmp_types(result)
-            
-        # Log the outlet state change to Supabase
-        if supabase_client.is_connected():
-            supabase_client.log_outlet_state(result)
-            
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to cycle outlet {outlet_id}: {str(e)}")
+        operation = operation_manager.submit_bulk(
+            targets, body.action, stagger_batch=stagger.batch, stagger_interval=stagger.intervalMs / 1000.0
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many queued operations: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk {body.action} request: {str(e)}")
 
-# Add endpoint to get outlet history from Supabase
-@app.get("/outlets/{outlet_id}/history")
-async def get_outlet_history(outlet_id: str, limit: int = 100) -> Dict[str, Any]:
-    """Get outlet history from Supabase"""
+    if not wait:
+        return JSONResponse(
+            status_code=202,
+            content=operation.to_dict(),
+            headers={"Location": f"/operations/{operation.id}"}
+        )
+    await operation.wait()
+    return operation.to_dict()
+
+@app.get("/operations/{operation_id}")
+async def get_operation(operation_id: str) -> Dict[str, Any]:
+    """Status of a control operation"""
+    operation = operation_manager.get(operation_id)
+    if operation is None:
+        raise HTTPException(status_code=404, detail=f"Unknown operation {operation_id}")
+    return operation.to_dict()
+
+@app.get("/devices")
+async def get_devices() -> Dict[str, Any]:
+    """List the PDUs served by this agent"""
+    devices = []
+    for device in fleet.devices.values():
+        info = device.config.to_dict()
+        snapshot = device.poller.snapshot
+        info["version"] = snapshot.version if snapshot else None
+        info["lastPolled"] = snapshot.timestamp if snapshot else None
+        info.update(device.poller.availability())
+        info["circuit"] = device.client.session.breaker.stats()
+        info["timeout"] = device.client.session.rto.stats()
+        info["snmpV3"] = device.client.session.usm_stats()
+        info["polling"] = device.poller.schedule.stats() if device.poller.schedule else None
+        devices.append(info)
+    return {"devices": devices}
+
+@app.get("/devices/{device_id}/outlets/stream")
+async def stream_device_outlets(device_id: str, request: Request):
+    """Server-Sent Events stream of a fleet device's outlets"""
+    return _stream_response(_get_device(device_id), request)
+
+@app.get("/devices/{device_id}/outlets")
+async def get_device_outlets(device_id: str, request: Request, fresh: bool = False,
+                             since: Optional[int] = None) -> Response:
+    """Get all outlets of a fleet device"""
+    return await _get_outlets(_get_device(device_id), request, fresh, since)
+
+@app.get("/devices/{device_id}/outlets/{outlet_id}")
+async def get_device_outlet(device_id: str, outlet_id: str, fresh: bool = False) -> Dict[str, Any]:
+    """Get one outlet of a fleet device"""
+    return await _get_outlet(_get_device(device_id), outlet_id, fresh)
+
+@app.get("/devices/{device_id}/topology")
+async def get_device_topology(device_id: str, refresh: bool = False) -> Dict[str, Any]:
+    """Discovered inlets, outlets and sensor types of a fleet device"""
+    device = _get_device(device_id)
+    try:
+        if refresh or device.client.topology is None:
+            await device.client.discover()
+    except DeviceUnreachable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return device.client.topology.to_dict()
+
+@app.get("/devices/{device_id}/sensors")
+async def get_device_sensors(device_id: str, refresh: bool = False) -> Dict[str, Any]:
+    """Cached decimal digits, units and availability of a fleet device's sensors"""
+    device = _get_device(device_id)
+    if refresh:
+        try:
+            await device.client.refresh_sensor_metadata([], force=True)
+        except DeviceUnreachable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return device.client.sensors.to_dict()
+
+@app.post("/devices/{device_id}/outlets/{outlet_id}/toggle", status_code=202)
+async def toggle_device_outlet(device_id: str, outlet_id: str, wait: bool = False):
+    """Toggle an outlet of a fleet device"""
+    return await _submit_operation(_get_device(device_id), outlet_id, "toggle", wait)
+
+@app.post("/devices/{device_id}/outlets/{outlet_id}/cycle", status_code=202)
+async def cycle_device_outlet(device_id: str, outlet_id: str, wait: bool = False):
+    """Cycle an outlet of a fleet device"""
+    return await _submit_operation(_get_device(device_id), outlet_id, "cycle", wait)
+
+@app.get("/traps")
+async def get_trap_stats() -> Dict[str, Any]:
+    """Counters of the SNMP trap receiver"""
+    if trap_handler is None:
+        return {"enabled": False}
+    return dict(trap_handler.stats(), enabled=True)
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """Prometheus metrics in the text exposition format"""
+    return Response(content=metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/coalescing")
+async def get_coalescing_stats() -> Dict[str, Any]:
+    """How many reads were shared and how control operations were serialized"""
+    reads = {"calls": 0, "executed": 0, "deduplicated": 0, "inFlight": 0}
+    for device in fleet.devices.values():
+        for key, value in device.poller.reads.stats().items():
+            reads[key] += value
+    return {"reads": reads, "operations": operation_manager.stats()}
+
+@app.get("/spool")
+async def get_spool_status() -> Dict[str, Any]:
+    """Size and upload lag of the local Supabase write-ahead spool"""
+    return supabase_client.spool_status()
+
+def _parse_time(value: Optional[str], default: float) -> float:
+    """Unix seconds or an ISO 8601 timestamp from a query parameter"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return rollups.parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+
+async def _get_outlet_history(device: Device, outlet_id: str, limit: int, start: Optional[str],
+                              end: Optional[str], resolution: Optional[float]) -> Dict[str, Any]:
+    """Bucketed history from the agent's ring buffers or the Supabase rollups, or the latest raw rows"""
+    if start is None and end is None and resolution is None:
+        return await _get_latest_readings(device, outlet_id, limit)
+    
+    end_ts = _parse_time(end, time.time())
+    start_ts = _parse_time(start, end_ts - 3600)
+    # About 100 buckets unless a resolution is given
+    step = resolution or max(config.POLL_INTERVAL, (end_ts - start_ts) / 100)
+    try:
+        check_range(start_ts, end_ts, step)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = {
+        "outletId": outlet_id,
+        "start": datetime.fromtimestamp(start_ts).isoformat(),
+        "end": datetime.fromtimestamp(end_ts).isoformat(),
+        "resolution": step
+    }
+    history = device.history
+    if history is not None and (history.covers(outlet_id, start_ts) or not supabase_client.is_connected()):
+        response.update(source="agent", buckets=history.query(outlet_id, start_ts, end_ts, step))
+        return response
+    
+    if not supabase_client.is_connected():
+        raise HTTPException(status_code=503, detail="Supabase connection not available")
+    
+    table, _ = rollups.pick_table(start_ts, step)
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, supabase_client.get_outlet_range, outlet_id, table,
+        datetime.fromtimestamp(start_ts, timezone.utc).isoformat(),
+        datetime.fromtimestamp(end_ts, timezone.utc).isoformat(),
+        device.config
+    )
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["message"])
+    
+    response.update(source="supabase", table=table, buckets=rollups.buckets(table, result["data"], start_ts, end_ts, step))
+    return response
+
+async def _get_latest_readings(device: Device, outlet_id: str, limit: int) -> Dict[str, Any]:
+    """The latest raw readings of an outlet from Supabase"""
     try:
         if not supabase_client.is_connected():
             raise HTTPException(status_code=503, detail="Supabase connection not available")
-            
-        result = supabase_client.get_outlet_history(outlet_id, limit)
+        
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, supabase_client.get_outlet_history, outlet_id, limit, device.config
+        )
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result["message"])
         
         # Convert any SNMP types in the result
-        result_data = convert_snmp_types(result["data"])
-            
-        return result_data
+        return convert_snmp_types(result["data"])
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get outlet history: {str(e)}")
 
+@app.get("/outlets/{outlet_id}/history")
+async def get_outlet_history(outlet_id: str, limit: int = 100, start: Optional[str] = None,
+                             end: Optional[str] = None, resolution: Optional[float] = None) -> Dict[str, Any]:
+    """Get outlet history: min/avg/max buckets for a time range, or the latest raw Supabase readings"""
+    return await _get_outlet_history(fleet.default, outlet_id, limit, start, end, resolution)
+
+@app.get("/devices/{device_id}/outlets/{outlet_id}/history")
+async def get_device_outlet_history(device_id: str, outlet_id: str, limit: int = 100,
+                                    start: Optional[str] = None, end: Optional[str] = None,
+                                    resolution: Optional[float] = None) -> Dict[str, Any]:
+    """Get the history of one outlet of a fleet device"""
+    return await _get_outlet_history(_get_device(device_id), outlet_id, limit, start, end, resolution)
+
+def _get_energy(device: Device) -> Dict[str, Any]:
+    if device.energy is None:
+        raise HTTPException(status_code=404, detail=f"No energy meter for device {device.id}")
+    return dict(device.energy.to_dict(), checkpoint=fleet.checkpoints.stats())
+
+@app.get("/energy")
+async def get_energy() -> Dict[str, Any]:
+    """Power, energy totals and rolling 1-minute/1-hour averages and peaks per outlet and inlet"""
+    return _get_energy(fleet.default)
+
+@app.get("/devices/{device_id}/energy")
+async def get_device_energy(device_id: str) -> Dict[str, Any]:
+    """Power and energy of one fleet device"""
+    return _get_energy(_get_device(device_id))
+
+@app.get("/history")
+async def get_history_stats() -> Dict[str, Any]:
+    """Memory use and coverage of the in-memory outlet history per device"""
+    return {
+        device_id: device.history.stats() if device.history is not None else None
+        for device_id, device in fleet.devices.items()
+    }
+
 # Enhanced OPTIONS handler for CORS preflight requests
 @app.options("/{path:path}")
 async def options_handler(request: Request, path: str):
@@ -150,7 +551,10 @@ if __name__ == "__main__":
     host = config.API_HOST
     debug = config.DEBUG
     print(f"Starting SNMP Agent API on {host}:{port}")
-    print(f"PDU IP: {config.SNMP_HOST}, Model: {config.PDU_MODEL}, Outlets: {config.PDU_OUTLETS}")
+    if config.FLEET_CONFIG_FILE:
+        print(f"Fleet mode: {len(fleet.devices)} PDUs from {config.FLEET_CONFIG_FILE}")
+    else:
+        print(f"PDU IP: {config.SNMP_HOST}, Model: {config.PDU_MODEL}, Outlets: {config.PDU_OUTLETS}")
     print(f"SNMP Version: {config.SNMP_VERSION}, Community: {config.SNMP_COMMUNITY}")
     
     # Log Supabase connection status
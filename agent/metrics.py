@@ -0,0 +1,300 @@
+"""Prometheus metrics for the agent, rendered in the text exposition format.
+
+The instruments are deliberately small: a labelled child is created once and
+cached, and recording a sample is a dict lookup, a bisect and a few additions
+under a lock (the Supabase writer records from its own thread), so they are
+safe to use on every SNMP request.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable
+from pysnmp.proto import errind
+
+# Seconds; SNMP round trips on a LAN are milliseconds, timeouts are seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Any:
+        """The child for one combination of label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(_Metric):
+    """Current value; either set directly or computed by a callback at scrape time.
+
+    The callback returns a number (no labels) or {label values tuple: number}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], Any]] = None):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def render(self) -> List[str]:
+        if self.callback is None:
+            return super().render()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values: Tuple[str, ...], child: _HistogramChild) -> List[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together for /metrics"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+snmp_request_duration = registry.register(Histogram(
+    "pdu_snmp_request_duration_seconds", "SNMP request round trip time",
+    ("device", "operation", "oid_group")
+))
+snmp_errors = registry.register(Counter(
+    "pdu_snmp_errors_total", "SNMP requests that timed out or returned an error",
+    ("device", "operation", "kind")
+))
+snmp_retries = registry.register(Counter(
+    "pdu_snmp_retries_total", "SNMP requests retransmitted after a timeout", ("device",)
+))
+poll_duration = registry.register(Histogram(
+    "pdu_poll_duration_seconds", "Duration of an outlet poll (full or tiered tick) of one PDU", ("device",)
+))
+poll_errors = registry.register(Counter(
+    "pdu_poll_errors_total", "Outlet polls (full or tiered tick) that failed or timed out", ("device",)
+))
+poll_group_reads = registry.register(Counter(
+    "pdu_poll_group_reads_total", "Metric groups read by tiered polling ticks", ("device", "group")
+))
+supabase_request_duration = registry.register(Histogram(
+    "pdu_supabase_request_duration_seconds", "Supabase REST request duration", ("method", "table")
+))
+supabase_errors = registry.register(Counter(
+    "pdu_supabase_errors_total", "Supabase REST requests that failed or returned an error status",
+    ("method", "table")
+))
+supabase_rejected_rows = registry.register(Counter(
+    "pdu_supabase_rejected_rows_total", "Spooled rows Supabase rejected (4xx) and moved to the dead-letter table",
+    ("table",)
+))
+http_request_duration = registry.register(Histogram(
+    "pdu_http_request_duration_seconds", "Agent API handler latency (until response headers)",
+    ("method", "route", "status")
+))
+
+# PDU2-MIB subtrees used to group SNMP latency by what was read or written
+OID_GROUPS = (
+    (".1.3.6.1.4.1.13742.6.4.1.2.1.2", "outlet_control"),
+    (".1.3.6.1.4.1.13742.6.4.1.2.1.3", "outlet_state"),
+    (".1.3.6.1.4.1.13742.6.5.2.3", "inlet_sensor"),
+    (".1.3.6.1.4.1.13742.6.5.4.3", "outlet_sensor"),
+    (".1.3.6.1.4.1.13742.6.3", "sensor_metadata"),
+)
+_oid_group_cache: Dict[str, str] = {}
+
+
+def oid_group(oid: str) -> str:
+    """Name of the PDU2-MIB group an OID belongs to (cached per OID)"""
+    group = _oid_group_cache.get(oid)
+    if group is None:
+        normalized = "." + str(oid).lstrip(".")
+        group = "other"
+        for prefix, name in OID_GROUPS:
+            if normalized == prefix or normalized.startswith(prefix + "."):
+                group = name
+                break
+        _oid_group_cache[oid] = group
+    return group
+
+
+def oids_group(oids: Iterable[str]) -> str:
+    """Group shared by all OIDs of a request, or "mixed" """
+    groups = {oid_group(oid) for oid in oids}
+    return groups.pop() if len(groups) == 1 else "mixed"
+
+
+def record_snmp(device: str, operation: str, oids: Iterable[str], seconds: float,
+                error_indication=None, error_status=None) -> None:
+    """Record one SNMP request: its latency and, if it failed, the kind of error"""
+    snmp_request_duration.labels(device, operation, oids_group(oids)).observe(seconds)
+    if error_indication:
+        kind = "timeout" if isinstance(error_indication, errind.RequestTimedOut) else "error"
+        snmp_errors.labels(device, operation, kind).inc()
+    elif error_status:
+        snmp_errors.labels(device, operation, "error_status").inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording handler latency per route template.
+
+    Latency is measured until the response headers are sent, so long-lived
+    streams (SSE) count only their setup time. Routes are labelled by their
+    template (/outlets/{outlet_id}) to keep the label set small.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                http_request_duration.labels(
+                    scope["method"], getattr(route, "path", "unmatched"), str(message["status"])
+                ).observe(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_with_metrics)
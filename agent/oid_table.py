@@ -0,0 +1,178 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from pysnmp.hlapi import ObjectIdentity, ObjectType
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from poll_schedule import GROUPS, VOLTAGE, CONFIG, STATE, CURRENT
+from sensor_metadata import OUTLET_READINGS
+from topology import OUTLET_COUNT, OUTLET_NAME
+
+
+class OutletOidTable:
+    """The OIDs a client reads and writes for one PDU, built once per device.
+
+    Replaces formatting OID strings on every request: each outlet's state,
+    control and sensor OIDs (and the poll's OID list) are computed when the
+    client is created and looked up afterwards. Outlets found beyond the
+    configured count are added on first use.
+
+    The outlet readings (OUTLET_READINGS with a type in sensor_types) are read
+    together, in that order, wherever an outlet's readings are requested.
+    """
+
+    def __init__(self, oids: Dict[str, str], sensor_types: Dict[str, int], outlets: int):
+        self.base = oids
+        self.sensor_types = sensor_types
+        self.state_column = f"{oids['outlet_state']}.1"
+        self.outlet_fields = [field for field in OUTLET_READINGS if field in sensor_types]
+        self.inlet_voltage = f"{oids['inlet_voltage']}.1.1.{sensor_types['voltage']}"
+        self.state: Dict[int, str] = {}
+        self.control: Dict[int, str] = {}
+        self.current: Dict[int, str] = {}
+        # Outlet number -> reading -> sensor value OID
+        self.readings: Dict[int, Dict[str, str]] = {}
+        self.name: Dict[int, str] = {}
+        self._poll_oids: Dict[Tuple[Tuple[int, ...], Tuple[str, ...]], List[str]] = {}
+        self._group_oids: Dict[Tuple[Tuple[str, ...], Tuple[int, ...], Tuple[str, ...]], List[str]] = {}
+        for outlet_num in range(1, outlets + 1):
+            self.add_outlet(outlet_num)
+
+    def add_outlet(self, outlet_num: int) -> None:
+        self.state[outlet_num] = f"{self.base['outlet_state']}.1.{outlet_num}"
+        self.control[outlet_num] = f"{self.base['outlet_control']}.1.{outlet_num}"
+        self.readings[outlet_num] = {
+            field: f"{self.base['outlet_current']}.1.{outlet_num}.{self.sensor_types[field]}"
+            for field in self.outlet_fields
+        }
+        self.current[outlet_num] = self.readings[outlet_num]["current"]
+        self.name[outlet_num] = f"{OUTLET_NAME}.{outlet_num}"
+
+    def state_oid(self, outlet_num: int) -> str:
+        oid = self.state.get(outlet_num)
+        if oid is None:
+            self.add_outlet(outlet_num)
+            oid = self.state[outlet_num]
+        return oid
+
+    def control_oid(self, outlet_num: int) -> str:
+        oid = self.control.get(outlet_num)
+        if oid is None:
+            self.add_outlet(outlet_num)
+            oid = self.control[outlet_num]
+        return oid
+
+    def current_oid(self, outlet_num: int) -> str:
+        oid = self.current.get(outlet_num)
+        if oid is None:
+            self.add_outlet(outlet_num)
+            oid = self.current[outlet_num]
+        return oid
+
+    def reading_oids(self, outlet_num: int, fields: Sequence[str]) -> List[str]:
+        oids = self.readings.get(outlet_num)
+        if oids is None:
+            self.add_outlet(outlet_num)
+            oids = self.readings[outlet_num]
+        return [oids[field] for field in fields]
+
+    def name_oid(self, outlet_num: int) -> str:
+        oid = self.name.get(outlet_num)
+        if oid is None:
+            self.add_outlet(outlet_num)
+            oid = self.name[outlet_num]
+        return oid
+
+    def poll_oids(self, outlet_nums: Iterable[int], fields: Optional[Sequence[str]] = None) -> List[str]:
+        """One poll of known outlets (cached per outlet set).
+
+        Inlet voltage and the PDU's outlet count (to notice configuration
+        changes), then every outlet's state and the readings in fields (by
+        default all of them).
+        """
+        key = (tuple(outlet_nums), tuple(fields if fields is not None else self.outlet_fields))
+        oids = self._poll_oids.get(key)
+        if oids is None:
+            oids = [self.inlet_voltage, OUTLET_COUNT]
+            for num in key[0]:
+                oids.append(self.state_oid(num))
+                oids.extend(self.reading_oids(num, key[1]))
+            self._poll_oids[key] = oids
+        return oids
+
+    def group_oids(self, groups: Iterable[str], outlet_nums: Iterable[int],
+                   fields: Optional[Sequence[str]] = None) -> List[str]:
+        """The OIDs of the due metric groups (see poll_schedule), laid out in GROUPS order.
+
+        voltage: inlet voltage; config: outlet count, then every outlet's name;
+        state: one OID per outlet; current: every outlet's readings in fields
+        (by default all of them). Cached per group, outlet set and fields.
+        """
+        key = (tuple(group for group in GROUPS if group in groups), tuple(outlet_nums),
+               tuple(fields if fields is not None else self.outlet_fields))
+        oids = self._group_oids.get(key)
+        if oids is None:
+            oids = []
+            for group in key[0]:
+                if group == VOLTAGE:
+                    oids.append(self.inlet_voltage)
+                elif group == CONFIG:
+                    oids.append(OUTLET_COUNT)
+                    oids.extend(self.name_oid(num) for num in key[1])
+                elif group == STATE:
+                    oids.extend(self.state_oid(num) for num in key[1])
+                elif group == CURRENT:
+                    for num in key[1]:
+                        oids.extend(self.reading_oids(num, key[2]))
+            self._group_oids[key] = oids
+        return oids
+
+    def readings_oids(self, outlet_nums: Iterable[int], fields: Optional[Sequence[str]] = None) -> List[str]:
+        """Inlet voltage followed by every outlet's readings in fields (by default all of them)"""
+        fields = fields if fields is not None else self.outlet_fields
+        oids = [self.inlet_voltage]
+        for num in outlet_nums:
+            oids.extend(self.reading_oids(num, fields))
+        return oids
+
+    def read_oids(self) -> List[str]:
+        """Every OID the client GETs, for pre-resolving var-binds"""
+        oids = [self.inlet_voltage, OUTLET_COUNT] + list(self.state.values())
+        for readings in self.readings.values():
+            oids.extend(readings.values())
+        return oids + list(self.name.values())
+
+
+class VarBindCache:
+    """Resolved GET var-binds and object identities, reused across requests.
+
+    pysnmp resolves every ObjectIdentity against the MIB view before sending
+    (even with lookupMib=False); an already resolved instance is returned as
+    is, so building them once per OID skips that work on every request.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._var_binds: Dict[str, ObjectType] = {}
+        self._identities: Dict[str, ObjectIdentity] = {}
+
+    def _mib_view(self):
+        return CommandGeneratorVarBinds.getMibViewController(self.engine)
+
+    def identity(self, oid: str) -> ObjectIdentity:
+        identity = self._identities.get(oid)
+        if identity is None:
+            identity = ObjectIdentity(oid).resolveWithMib(self._mib_view())
+            self._identities[oid] = identity
+        return identity
+
+    def get(self, oids: Iterable[str]) -> List[ObjectType]:
+        """GET var-binds (OID with an unspecified value) for the OIDs"""
+        var_binds = []
+        for oid in oids:
+            var_bind = self._var_binds.get(oid)
+            if var_bind is None:
+                var_bind = ObjectType(self.identity(oid)).resolveWithMib(self._mib_view())
+                self._var_binds[oid] = var_bind
+            var_binds.append(var_bind)
+        return var_binds
+
+    def precompile(self, oids: Iterable[str]) -> None:
+        self.get(oids)
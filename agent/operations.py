@@ -0,0 +1,404 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Tuple
+import config
+from snmp_types import convert_snmp_types
+from coalescing import KeyedSerializer
+
+# Operation statuses
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TIMED_OUT = "timeout"
+
+
+class Operation:
+    """A control operation (toggle/on/off/cycle) on one outlet, confirmed by polling"""
+
+    def __init__(self, device, outlet_id: str, action: str):
+        self.id = uuid.uuid4().hex
+        self.device = device
+        self.outlet_id = outlet_id
+        self.action = action
+        self.status = PENDING
+        self.target_state: Optional[str] = None
+        self.observed_state: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        # Set when the outlet converged but the final read for the result failed
+        self.read_error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.completed_at: Optional[str] = None
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, TIMED_OUT)
+
+    async def wait(self) -> "Operation":
+        """Wait until the operation has converged, failed or timed out"""
+        await self._done.wait()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": "outlet",
+            "deviceId": self.device.id,
+            "outletId": self.outlet_id,
+            "action": self.action,
+            "status": self.status,
+            "targetState": self.target_state,
+            "observedState": self.observed_state,
+            "createdAt": self.created_at,
+            "completedAt": self.completed_at,
+            "result": self.result,
+            "error": self.error,
+            "readError": self.read_error
+        }
+
+
+class BulkOperation:
+    """One control action applied to many outlets, possibly across several PDUs.
+
+    The outlets of each PDU are switched in batches of stagger_batch outlets,
+    stagger_interval seconds apart, to limit inrush current; PDUs are handled
+    in parallel. Per-outlet progress is aggregated into a single status.
+    """
+
+    def __init__(self, targets: List[Tuple[Any, List[str]]], action: str,
+                 stagger_batch: int = 0, stagger_interval: float = 0.0):
+        self.id = uuid.uuid4().hex
+        self.targets = targets
+        self.action = action
+        self.target_state = "on" if action == "cycle" else action
+        self.stagger_batch = stagger_batch
+        self.stagger_interval = stagger_interval
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.completed_at: Optional[str] = None
+        # Per-outlet progress keyed by (device id, outlet id)
+        self.outlets: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        for device, outlet_ids in targets:
+            for outlet_id in outlet_ids:
+                self.outlets[(device.id, outlet_id)] = {
+                    "deviceId": device.id,
+                    "outletId": outlet_id,
+                    "status": PENDING,
+                    "observedState": None,
+                    "error": None
+                }
+        # Confirmed outlet readings per device id, filled in when a PDU is done
+        self.results: Dict[str, List[Dict[str, Any]]] = {}
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED, TIMED_OUT)
+
+    @property
+    def devices(self) -> List[Any]:
+        return [device for device, _ in self.targets]
+
+    async def wait(self) -> "BulkOperation":
+        """Wait until every outlet has converged, failed or timed out"""
+        await self._done.wait()
+        return self
+
+    def _count(self, status: str) -> int:
+        return sum(1 for entry in self.outlets.values() if entry["status"] == status)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": "bulk",
+            "action": self.action,
+            "status": self.status,
+            "targetState": self.target_state,
+            "stagger": {"batch": self.stagger_batch, "intervalMs": int(self.stagger_interval * 1000)},
+            "createdAt": self.created_at,
+            "completedAt": self.completed_at,
+            "total": len(self.outlets),
+            "succeeded": self._count(SUCCEEDED),
+            "failed": self._count(FAILED),
+            "timedOut": self._count(TIMED_OUT),
+            "outlets": list(self.outlets.values()),
+            "results": self.results,
+            "error": self.error
+        }
+
+
+class OperationManager:
+    """Runs control operations in the background and tracks them by id.
+
+    After the SET, outletSwitchingState is polled every poll_interval seconds
+    until it reaches the target state (for a cycle: goes off and back on) or the
+    timeout expires, so completion tracks the real PDU instead of a fixed sleep.
+
+    Operations on the same outlet never overlap: they wait for each other in a
+    bounded per-outlet queue (max_queue), and an on/off/cycle request that is
+    identical to one still waiting in that queue is merged into it.
+    """
+
+    def __init__(self, timeout: float = 10.0, cycle_timeout: float = 30.0,
+                 poll_interval: float = 0.25, max_history: int = 1000, max_queue: int = 4):
+        self.timeout = timeout
+        self.cycle_timeout = cycle_timeout
+        self.poll_interval = poll_interval
+        self.max_history = max_history
+        self.operations: "OrderedDict[str, Operation]" = OrderedDict()
+        self.serializer = KeyedSerializer(max_queue)
+        # Queued (not yet started) operations by (device id, outlet id, action)
+        self._queued: Dict[Tuple[str, str, str], Operation] = {}
+        self.deduplicated = 0
+        # Called with the operation on every status change
+        self.listeners: List[Callable[[Operation], None]] = []
+
+    def _track(self, operation) -> None:
+        self.operations[operation.id] = operation
+        while len(self.operations) > self.max_history:
+            oldest_id, oldest = next(iter(self.operations.items()))
+            if not oldest.done:
+                break
+            del self.operations[oldest_id]
+
+    @staticmethod
+    def _check_outlet(device, outlet_id: str) -> None:
+        """Reject outlets the PDU's discovered topology does not have"""
+        topology = device.client.topology
+        if topology is not None and topology.outlets and int(outlet_id) not in topology.outlets:
+            raise ValueError(f"Outlet {outlet_id} does not exist on {device.id}")
+
+    def submit(self, device, outlet_id: str, action: str) -> Operation:
+        """Create an operation and start it in the background"""
+        if action not in ("toggle", "on", "off", "cycle"):
+            raise ValueError(f"Unsupported action: {action}")
+        key = (device.id, str(int(outlet_id)))  # Outlet ids are numeric; fail before accepting
+        self._check_outlet(device, key[1])
+
+        # Two toggles mean two flips, but a repeated on/off/cycle can share the queued one
+        queued = self._queued.get(key + (action,))
+        if action != "toggle" and queued is not None and queued.status == PENDING:
+            self.deduplicated += 1
+            return queued
+
+        self.serializer.reserve([key])
+        operation = Operation(device, outlet_id, action)
+        if action != "toggle":
+            self._queued[key + (action,)] = operation
+        self._track(operation)
+        self._notify(operation)
+        asyncio.ensure_future(self._run(operation, key))
+        return operation
+
+    def submit_bulk(self, targets: List[Tuple[Any, List[str]]], action: str,
+                    stagger_batch: int = 0, stagger_interval: float = 0.0) -> BulkOperation:
+        """Create a bulk operation over (device, outlet ids) targets and start it in the background"""
+        if action not in ("on", "off", "cycle"):
+            raise ValueError(f"Unsupported bulk action: {action}")
+        if stagger_batch < 0 or stagger_interval < 0:
+            raise ValueError("Stagger batch and interval must not be negative")
+
+        merged: "OrderedDict[str, Tuple[Any, List[str]]]" = OrderedDict()
+        for device, outlet_ids in targets:
+            _, ids = merged.setdefault(device.id, (device, []))
+            for outlet_id in outlet_ids:
+                outlet_id = str(int(outlet_id))  # Numeric ids only; also normalises "03"
+                self._check_outlet(device, outlet_id)
+                if outlet_id not in ids:
+                    ids.append(outlet_id)
+        targets = [(device, ids) for device, ids in merged.values() if ids]
+        if not targets:
+            raise ValueError("No outlets given")
+
+        self.serializer.reserve([(device.id, outlet_id) for device, ids in targets for outlet_id in ids])
+        operation = BulkOperation(targets, action, stagger_batch, stagger_interval)
+        self._track(operation)
+        self._notify(operation)
+        asyncio.ensure_future(self._run_bulk(operation))
+        return operation
+
+    def get(self, operation_id: str):
+        return self.operations.get(operation_id)
+
+    def _notify(self, operation) -> None:
+        for listener in self.listeners:
+            try:
+                listener(operation)
+            except Exception as e:
+                print(f"Error in operation listener: {e}")
+
+    def _finish(self, operation, status: str, error: Optional[str] = None) -> None:
+        operation.status = status
+        operation.error = error
+        operation.completed_at = datetime.now().isoformat()
+        operation._done.set()
+        self._notify(operation)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.serializer.stats(),
+            deduplicated=self.deduplicated,
+            active=sum(1 for operation in self.operations.values() if not operation.done)
+        )
+
+    async def _run(self, operation: Operation, key: Tuple[str, str]) -> None:
+        async with self.serializer.hold([key]):
+            if self._queued.get(key + (operation.action,)) is operation:
+                del self._queued[key + (operation.action,)]
+            await self._execute(operation)
+
+    async def _execute(self, operation: Operation) -> None:
+        client = operation.device.client
+        try:
+            operation.status = RUNNING
+            action = operation.action
+            if action == "toggle":
+                current = await client.get_switching_state(operation.outlet_id)
+                if current is None:
+                    self._finish(operation, FAILED, "Could not read current outlet state")
+                    return
+                action = "off" if current == "on" else "on"
+            operation.target_state = "on" if action == "cycle" else action
+            self._notify(operation)
+
+            if not await client.set_outlet(operation.outlet_id, action):
+                self._finish(operation, FAILED, "SNMP SET operation failed")
+                return
+
+            converged = await self._converge(operation, cycle=(action == "cycle"))
+
+            # One full read of the outlet for the result and the snapshot; the
+            # switch itself is settled by convergence, so a failed read only
+            # leaves the result empty
+            try:
+                result = convert_snmp_types(await client.get_outlet_state(operation.outlet_id))
+                if "error" not in result:
+                    operation.device.poller.update_outlet(result)
+                operation.result = result
+            except Exception as e:
+                print(f"Error reading outlet {operation.outlet_id} after operation {operation.id}: {e}")
+                operation.read_error = str(e)
+
+            if converged:
+                self._finish(operation, SUCCEEDED)
+            else:
+                self._finish(operation, TIMED_OUT,
+                             f"Outlet did not reach state {operation.target_state} in time")
+        except Exception as e:
+            print(f"Error running operation {operation.id}: {e}")
+            self._finish(operation, FAILED, str(e))
+
+    async def _run_bulk(self, operation: BulkOperation) -> None:
+        try:
+            operation.status = RUNNING
+            self._notify(operation)
+            await asyncio.gather(*[
+                self._run_bulk_device(operation, device, outlet_ids)
+                for device, outlet_ids in operation.targets
+            ])
+
+            if operation._count(FAILED):
+                self._finish(operation, FAILED, f"{operation._count(FAILED)} of {len(operation.outlets)} outlet(s) failed")
+            elif operation._count(TIMED_OUT):
+                self._finish(operation, TIMED_OUT,
+                             f"{operation._count(TIMED_OUT)} outlet(s) did not reach state {operation.target_state} in time")
+            else:
+                self._finish(operation, SUCCEEDED)
+        except Exception as e:
+            print(f"Error running bulk operation {operation.id}: {e}")
+            self._finish(operation, FAILED, str(e))
+
+    async def _run_bulk_device(self, operation: BulkOperation, device, outlet_ids: List[str]) -> None:
+        """Switch the outlets of one PDU in staggered batches, then wait for them to converge"""
+        async with self.serializer.hold([(device.id, outlet_id) for outlet_id in outlet_ids]):
+            await self._execute_bulk_device(operation, device, outlet_ids)
+
+    async def _execute_bulk_device(self, operation: BulkOperation, device, outlet_ids: List[str]) -> None:
+        client = device.client
+        entries = {outlet_id: operation.outlets[(device.id, outlet_id)] for outlet_id in outlet_ids}
+        batch_size = operation.stagger_batch or len(outlet_ids)
+        batches = [outlet_ids[start:start + batch_size] for start in range(0, len(outlet_ids), batch_size)]
+
+        accepted: List[str] = []
+        for number, batch in enumerate(batches):
+            if number and operation.stagger_interval:
+                await asyncio.sleep(operation.stagger_interval)
+            try:
+                results = await client.set_outlets(batch, operation.action)
+            except Exception as e:
+                print(f"Error switching outlets {batch} on {device.id}: {e}")
+                results = {outlet_id: False for outlet_id in batch}
+            for outlet_id in batch:
+                if results.get(outlet_id):
+                    entries[outlet_id]["status"] = RUNNING
+                    accepted.append(outlet_id)
+                else:
+                    entries[outlet_id]["status"] = FAILED
+                    entries[outlet_id]["error"] = "SNMP SET operation failed"
+            self._notify(operation)
+
+        if accepted:
+            cycle = operation.action == "cycle"
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (self.cycle_timeout if cycle else self.timeout)
+            pending = list(accepted)
+            seen_off = set()
+            while pending and loop.time() < deadline:
+                states = await client.get_switching_states(pending)
+                for outlet_id, state in states.items():
+                    if state is None:
+                        continue
+                    entries[outlet_id]["observedState"] = state
+                    if state == "off":
+                        seen_off.add(outlet_id)
+                    if state == operation.target_state and (not cycle or outlet_id in seen_off):
+                        entries[outlet_id]["status"] = SUCCEEDED
+                remaining = [outlet_id for outlet_id in pending if entries[outlet_id]["status"] == RUNNING]
+                if len(remaining) != len(pending):
+                    self._notify(operation)
+                pending = remaining
+                if pending:
+                    await asyncio.sleep(self.poll_interval)
+            for outlet_id in pending:
+                entries[outlet_id]["status"] = TIMED_OUT
+                entries[outlet_id]["error"] = f"Outlet did not reach state {operation.target_state} in time"
+
+        # One full poll of the PDU updates the snapshot and provides the confirmed readings
+        try:
+            snapshot = await device.poller.refresh()
+            operation.results[device.id] = [snapshot.by_id[outlet_id] for outlet_id in outlet_ids if outlet_id in snapshot.by_id]
+        except Exception as e:
+            print(f"Error refreshing {device.id} after bulk operation: {e}")
+
+    async def _converge(self, operation: Operation, cycle: bool) -> bool:
+        """Poll the switching state until it reaches the target"""
+        client = operation.device.client
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.cycle_timeout if cycle else self.timeout)
+        seen_off = False
+
+        while loop.time() < deadline:
+            state = await client.get_switching_state(operation.outlet_id)
+            if state is not None:
+                operation.observed_state = state
+                if state == "off":
+                    seen_off = True
+                if state == operation.target_state and (not cycle or seen_off):
+                    return True
+            await asyncio.sleep(self.poll_interval)
+        return False
+
+
+def create_operation_manager() -> OperationManager:
+    """Create an operation manager with the timeouts configured in config.py"""
+    return OperationManager(
+        timeout=config.CONTROL_TIMEOUT,
+        cycle_timeout=config.CONTROL_CYCLE_TIMEOUT,
+        poll_interval=config.CONTROL_POLL_INTERVAL,
+        max_queue=config.CONTROL_MAX_QUEUE
+    )
@@ -0,0 +1,77 @@
+"""Tiered polling: when each metric group of one PDU is due.
+
+Outlet switching state needs second-level freshness, inlet voltage barely
+moves and outlet names change only when someone edits the PDU. Instead of
+reading everything at the poll interval, every metric group has its own
+interval and jitter, and a tick reads only the groups that are due. Ticks
+follow the most frequently read group (normally the switching states); the
+other groups ride along with the first tick within the merge window of their
+due time, so their OIDs share multi-varbind GETs instead of costing requests
+of their own.
+"""
+import random
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+# Metric groups, in the order their OIDs are laid out in a request
+VOLTAGE = "voltage"   # inlet voltage
+CONFIG = "config"     # outlet count (configuration changes) and outlet names
+STATE = "state"       # outlet switching state
+CURRENT = "current"   # outlet current, active and apparent power
+GROUPS = (VOLTAGE, CONFIG, STATE, CURRENT)
+
+
+class PollSchedule:
+    """Next due time of every metric group of one PDU (monotonic seconds).
+
+    intervals maps a group to (interval, jitter), jitter being the fraction of
+    the interval by which each period is randomly lengthened or shortened so
+    PDUs (and groups) started together drift apart.
+    """
+
+    def __init__(self, intervals: Dict[str, Tuple[float, float]], merge_window: Optional[float] = None):
+        unknown = set(intervals) - set(GROUPS)
+        if unknown:
+            raise ValueError(f"Unknown metric group(s): {', '.join(sorted(unknown))}")
+        self.intervals = {group: intervals[group] for group in GROUPS if group in intervals}
+        self.groups = tuple(self.intervals)
+        # The group read most often: its due times are the ticks
+        self.carrier = min(self.groups, key=lambda group: self.intervals[group][0])
+        # Groups due within this many seconds of a tick are read along with it
+        self.merge_window = merge_window if merge_window is not None else \
+            min(interval for interval, _ in self.intervals.values()) / 2
+        # Everything is due until the first poll
+        self.next_due: Dict[str, float] = {group: 0.0 for group in self.groups}
+        self.reads: Dict[str, int] = {group: 0 for group in self.groups}
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Groups to read in a tick at now (in GROUPS order)"""
+        now = now if now is not None else time.monotonic()
+        if self.next_due[self.carrier] > now + self.merge_window:
+            return []
+        return [group for group in self.groups if self.next_due[group] <= now + self.merge_window]
+
+    def wait(self, now: Optional[float] = None) -> float:
+        """Seconds until the next tick"""
+        now = now if now is not None else time.monotonic()
+        return max(0.0, self.next_due[self.carrier] - now)
+
+    def done(self, groups, now: Optional[float] = None) -> None:
+        """Groups were read at now: schedule their next period"""
+        now = now if now is not None else time.monotonic()
+        for group in groups:
+            interval, jitter = self.intervals[group]
+            self.next_due[group] = now + interval * (1 + random.uniform(-jitter, jitter))
+            self.reads[group] += 1
+
+    def stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now if now is not None else time.monotonic()
+        return {
+            group: {
+                "interval": interval,
+                "jitter": jitter,
+                "dueIn": round(max(0.0, self.next_due[group] - now), 1),
+                "reads": self.reads[group]
+            }
+            for group, (interval, jitter) in self.intervals.items()
+        }
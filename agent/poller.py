@@ -0,0 +1,433 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, List, Callable
+from datetime import datetime
+import config
+from snmp_types import convert_snmp_types
+from coalescing import SingleFlight
+from resilience import DeviceUnreachable
+from poll_schedule import PollSchedule, VOLTAGE, CONFIG, STATE, CURRENT
+import metrics
+
+
+class OutletSnapshot:
+    """Immutable view of every outlet of a PDU at one point in time.
+
+    The version only changes when an outlet's data changes, so it (and the
+    ETag derived from it) stays put across polls that read the same values.
+    """
+
+    def __init__(self, version: int, outlets: List[Dict[str, Any]], taken_at: Optional[float] = None,
+                 timestamp: Optional[str] = None, changed: Optional[Dict[str, int]] = None,
+                 modified: Optional[float] = None, reset_version: Optional[int] = None):
+        self.version = version
+        self.outlets = outlets
+        self.by_id = {outlet["id"]: outlet for outlet in outlets}
+        # taken_at/timestamp describe the last full poll, partial updates keep them
+        self.taken_at = taken_at if taken_at is not None else time.monotonic()
+        self.timestamp = timestamp or datetime.now().isoformat()
+        # Version at which each outlet last changed, for ?since= deltas
+        self.changed = changed if changed is not None else {outlet["id"]: version for outlet in outlets}
+        # Unix time of the last change (Last-Modified)
+        self.modified = modified if modified is not None else time.time()
+        # The outlet set itself changed at this version; older deltas cannot be built
+        self.reset_version = reset_version if reset_version is not None else version
+
+    def age(self) -> float:
+        """Seconds since this snapshot was taken"""
+        return time.monotonic() - self.taken_at
+
+    def changed_since(self, since: int) -> Optional[List[Dict[str, Any]]]:
+        """Outlets that changed after version since; None if no delta can be built from there"""
+        if since < self.reset_version or since > self.version:
+            return None
+        return [outlet for outlet in self.outlets if self.changed[outlet["id"]] > since]
+
+
+class OutletPoller:
+    """Polls a PDU in the background and serves reads from an in-memory snapshot.
+
+    Reads younger than max_age are answered from the snapshot. Reads within the
+    stale-while-revalidate window are still answered from the snapshot but kick
+    off a background refresh; older snapshots (or fresh=True) force a live read.
+    While the PDU is unreachable, reads return the last known snapshot marked
+    as unreachable together with its age.
+
+    With a PollSchedule the background loop reads each metric group at its
+    own interval instead of everything every interval; a tick that reads the
+    switching states counts as a poll (fresh snapshot, poll listeners).
+    """
+
+    def __init__(self, client, interval: float = 5.0, max_age: float = 10.0,
+                 stale_while_revalidate: float = 30.0, timeout: Optional[float] = None,
+                 semaphore: Optional[asyncio.Semaphore] = None, start_delay: float = 0.0,
+                 schedule: Optional[PollSchedule] = None):
+        self.client = client
+        self.interval = interval
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        # Fleet mode: bound a single poll, share an in-flight limit, stagger start times
+        self.timeout = timeout
+        self.semaphore = semaphore
+        self.start_delay = start_delay
+        # Tiered polling (None: read everything every interval)
+        self.schedule = schedule
+
+        self.snapshot: Optional[OutletSnapshot] = None
+        # Called with each snapshot produced by a full poll (or a tiered tick that read the states)
+        self.poll_listeners: List[Callable[[OutletSnapshot], None]] = []
+        # Called with (snapshot, changed outlets) whenever an outlet's data actually changes
+        self.change_listeners: List[Callable[[OutletSnapshot, List[Dict[str, Any]]], None]] = []
+        # Called once per new snapshot with the outlets it has a new reading of: every
+        # outlet after a poll, the changed ones after a partial update (trap, control
+        # operation, tiered tick without the states)
+        self.sample_listeners: List[Callable[[OutletSnapshot, List[Dict[str, Any]]], None]] = []
+        # Versions start at the wall clock in milliseconds, so they keep increasing
+        # across agent restarts and a client's ?since= from a previous run is never
+        # mistaken for a current version
+        self._version = int(time.time() * 1000)
+        self._task: Optional[asyncio.Task] = None
+        # Concurrent identical live reads (full polls, single outlets) share one SNMP request
+        self.reads = SingleFlight()
+        # Set (monotonic time) while the PDU does not answer
+        self.unreachable_since: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Start the background polling loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the polling loop and wait for it to exit"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        if self.start_delay:
+            await asyncio.sleep(self.start_delay)
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                if self.schedule is None:
+                    await self.refresh()
+                else:
+                    await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except DeviceUnreachable as e:
+                print(f"Polling skipped: {e}")
+            except Exception as e:
+                print(f"Error polling outlets: {e}")
+            if self.schedule is not None:
+                await asyncio.sleep(self.schedule.wait())
+                continue
+            # Keep a fixed cadence regardless of how long the poll took
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+    async def refresh(self) -> OutletSnapshot:
+        """Read all outlets from the PDU; concurrent callers share one read"""
+        return await self.reads.do("all", self._poll)
+
+    async def _poll(self) -> OutletSnapshot:
+        started = time.monotonic()
+        try:
+            result = await self._read(self.client.get_all_outlets)
+        finally:
+            if self.schedule is not None:
+                # Every group was just read (or tried): none is due before its next period
+                self.schedule.done(self.schedule.groups, started)
+        snapshot = self._publish(convert_snmp_types(result)["outlets"], poll=True)
+        self._notify_poll(snapshot)
+        return snapshot
+
+    async def tick(self) -> Optional[OutletSnapshot]:
+        """Read the metric groups that are due (tiered polling) into a new snapshot version"""
+        started = time.monotonic()
+        groups = self.schedule.due(started)
+        if not groups:
+            return None
+        if self.snapshot is None or self.reads.in_flight("all"):
+            return await self.refresh()
+        try:
+            outlets = await self._read(lambda: self.client.poll_groups(groups))
+        except Exception:
+            # Try again next period rather than on every loop iteration
+            self.schedule.done(groups, started)
+            raise
+        if outlets is None:
+            # Topology not known yet or changed: read everything
+            return await self.refresh()
+        self.schedule.done(groups, started)
+        for group in groups:
+            metrics.poll_group_reads.labels(self.client.device_id, group).inc()
+
+        merged = self._merged(outlets)
+        if STATE not in groups:
+            return self._publish(merged, previous=self.snapshot)
+        snapshot = self._publish(merged, poll=True)
+        self._notify_poll(snapshot)
+        return snapshot
+
+    def _notify_poll(self, snapshot: OutletSnapshot) -> None:
+        for listener in self.poll_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in poll listener: {e}")
+
+    async def _read(self, read) -> Any:
+        """Run one poll of the PDU within the in-flight limit and timeout, tracking reachability.
+
+        Any failed poll (no answer, poll timeout, unexpected error) marks the
+        PDU unreachable and raises DeviceUnreachable, so readers get the last
+        known snapshot rather than made-up values.
+        """
+        try:
+            if self.semaphore is None:
+                result = await self._timed(read)
+            else:
+                async with self.semaphore:
+                    result = await self._timed(read)
+        except Exception as e:
+            if self.unreachable_since is None:
+                self.unreachable_since = time.monotonic()
+            if isinstance(e, DeviceUnreachable):
+                self.last_error = str(e)
+                raise
+            if isinstance(e, asyncio.TimeoutError):
+                error = DeviceUnreachable(self.client.pdu_ip, f"poll timed out after {self.timeout}s")
+            else:
+                error = DeviceUnreachable(self.client.pdu_ip, f"poll failed: {e}")
+            self.last_error = str(error)
+            raise error from e
+        self.unreachable_since = None
+        self.last_error = None
+        return result
+
+    async def _timed(self, read) -> Any:
+        device = self.client.device_id
+        started = time.perf_counter()
+        try:
+            if self.timeout is None:
+                return await read()
+            return await asyncio.wait_for(read(), self.timeout)
+        except Exception:
+            metrics.poll_errors.labels(device).inc()
+            raise
+        finally:
+            metrics.poll_duration.labels(device).observe(time.perf_counter() - started)
+
+    def _publish(self, outlets: List[Dict[str, Any]], previous: Optional[OutletSnapshot] = None,
+                 poll: bool = False) -> OutletSnapshot:
+        """Install a new snapshot; previous (for partial updates) keeps the last full poll's time.
+
+        poll: the outlets were all just read from the PDU, so every one is a new sample.
+        """
+        old = self.snapshot
+        taken_at, timestamp = (previous.taken_at, previous.timestamp) if previous is not None else (None, None)
+        if old is None or [outlet["id"] for outlet in outlets] != [outlet["id"] for outlet in old.outlets]:
+            # First snapshot, or outlets were added or removed
+            self._version += 1
+            changed = list(outlets)
+            self.snapshot = OutletSnapshot(self._version, outlets, taken_at, timestamp)
+        else:
+            changed = _changed_outlets(old, outlets)
+            if changed:
+                self._version += 1
+                changed_ids = {outlet["id"] for outlet in changed}
+                # Unchanged outlets keep their dicts, and with them when their values were observed
+                outlets = [outlet if outlet["id"] in changed_ids else old.by_id[outlet["id"]] for outlet in outlets]
+                versions = dict(old.changed)
+                versions.update((outlet_id, self._version) for outlet_id in changed_ids)
+                self.snapshot = OutletSnapshot(self._version, outlets, taken_at, timestamp, versions,
+                                               reset_version=old.reset_version)
+            else:
+                # Same data: same version and payload, only the poll time moves
+                self.snapshot = OutletSnapshot(old.version, old.outlets, taken_at, timestamp, old.changed,
+                                               old.modified, old.reset_version)
+
+        if changed:
+            for listener in self.change_listeners:
+                try:
+                    listener(self.snapshot, changed)
+                except Exception as e:
+                    print(f"Error in change listener: {e}")
+        samples = self.snapshot.outlets if poll else changed
+        if samples:
+            for listener in self.sample_listeners:
+                try:
+                    listener(self.snapshot, samples)
+                except Exception as e:
+                    print(f"Error in sample listener: {e}")
+        return self.snapshot
+
+    async def get_snapshot(self, fresh: bool = False) -> OutletSnapshot:
+        """Return a snapshot that honours max-age / stale-while-revalidate"""
+        snapshot = self.snapshot
+        if fresh or snapshot is None:
+            return await self._refresh_or_last_known()
+
+        age = snapshot.age()
+        if age <= self.max_age:
+            return snapshot
+        if age <= self.max_age + self.stale_while_revalidate:
+            # Serve the stale copy now and revalidate in the background
+            self.reads.start("all", self._poll)
+            return snapshot
+        return await self._refresh_or_last_known()
+
+    async def _refresh_or_last_known(self) -> OutletSnapshot:
+        try:
+            return await self.refresh()
+        except DeviceUnreachable:
+            if self.snapshot is None:
+                raise
+            return self.snapshot
+
+    @property
+    def reachable(self) -> bool:
+        return self.unreachable_since is None
+
+    def availability(self) -> Dict[str, Any]:
+        """Reachability fields added to read responses"""
+        if self.reachable:
+            return {"reachable": True}
+        snapshot = self.snapshot
+        return {
+            "reachable": False,
+            "unreachableFor": round(time.monotonic() - self.unreachable_since, 1),
+            "lastSeen": snapshot.timestamp if snapshot else None,
+            "age": round(snapshot.age(), 1) if snapshot else None,
+            "error": self.last_error
+        }
+
+    async def get_outlets(self, fresh: bool = False, since: Optional[int] = None) -> Dict[str, Any]:
+        """Get all outlets in the API response shape.
+
+        With since (a version from an earlier response) only the outlets that
+        changed after it are returned ("delta": true), unless the delta cannot
+        be built from there (e.g. outlets were added since); then all are.
+        """
+        snapshot = await self.get_snapshot(fresh)
+        result = {
+            "outlets": snapshot.outlets,
+            "version": snapshot.version,
+            "lastModified": datetime.fromtimestamp(snapshot.modified).isoformat(),
+            "stale": snapshot.age() > self.max_age
+        }
+        if since is not None:
+            changed = snapshot.changed_since(since)
+            result["delta"] = changed is not None
+            if changed is not None:
+                result["outlets"] = changed
+                result["since"] = since
+        return dict(result, **self.availability())
+
+    async def get_outlet(self, outlet_id: str, fresh: bool = False) -> Dict[str, Any]:
+        """Get one outlet, from the snapshot unless fresh or unknown"""
+        if not fresh:
+            snapshot = await self.get_snapshot()
+            outlet = snapshot.by_id.get(outlet_id)
+            if outlet is not None:
+                return outlet if self.reachable else dict(outlet, **self.availability())
+
+        try:
+            if self.reads.in_flight("all"):
+                # A full poll is already running; its result is at least as fresh
+                snapshot = await self.refresh()
+                outlet = snapshot.by_id.get(outlet_id)
+                if outlet is not None:
+                    return outlet
+            return await self.reads.do(("outlet", outlet_id), lambda: self._read_outlet(outlet_id))
+        except DeviceUnreachable as e:
+            last_known = self.snapshot.by_id.get(outlet_id) if self.snapshot else None
+            if last_known is None:
+                raise
+            if self.unreachable_since is None:
+                self.unreachable_since = time.monotonic()
+                self.last_error = str(e)
+            return dict(last_known, **self.availability())
+
+    async def _read_outlet(self, outlet_id: str) -> Dict[str, Any]:
+        outlet = convert_snmp_types(await self.client.get_outlet_state(outlet_id))
+        if "error" not in outlet:
+            self.update_outlet(outlet)
+        return outlet
+
+    def update_outlet(self, outlet: Dict[str, Any]) -> None:
+        """Fold a live single-outlet read (e.g. after a toggle) into a new snapshot version"""
+        self.update_outlets([outlet])
+
+    def update_outlets(self, outlets: List[Dict[str, Any]]) -> None:
+        """Merge partial outlet updates (live reads, traps) into one new snapshot version"""
+        if self.snapshot is None or not outlets:
+            return
+        self._publish(self._merged(outlets), previous=self.snapshot)
+
+    def _merged(self, outlets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The snapshot's outlets with the fields of partial outlets applied"""
+        updates = {}
+        for outlet in outlets:
+            updates.setdefault(outlet["id"], {}).update(
+                {key: outlet[key] for key in ("id", "name", "state", "voltage", "current", "lastUpdated")
+                 if key in outlet}
+            )
+        return [dict(existing, **updates[existing["id"]]) if existing["id"] in updates else existing
+                for existing in self.snapshot.outlets]
+
+
+# Fields compared to decide whether an outlet changed (lastUpdated changes on every read)
+_COMPARED_FIELDS = ("name", "state", "voltage", "current", "power", "apparentPower", "error")
+
+
+def _changed_outlets(old: Optional[OutletSnapshot], outlets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if old is None:
+        return list(outlets)
+    changed = []
+    for outlet in outlets:
+        previous = old.by_id.get(outlet["id"])
+        if previous is None or any(previous.get(field) != outlet.get(field) for field in _COMPARED_FIELDS):
+            changed.append(outlet)
+    return changed
+
+
+def create_schedule(interval: float) -> Optional[PollSchedule]:
+    """The metric group intervals configured in config.py (None unless POLL_TIERED).
+
+    Switching states are read every interval (the poll interval, or the trap
+    reconciliation interval when traps report state changes); the other groups
+    are never read more often than that.
+    """
+    if not config.POLL_TIERED:
+        return None
+    return PollSchedule({
+        STATE: (interval, config.POLL_STATE_JITTER),
+        CURRENT: (max(interval, config.POLL_CURRENT_INTERVAL), config.POLL_CURRENT_JITTER),
+        VOLTAGE: (max(interval, config.POLL_VOLTAGE_INTERVAL), config.POLL_VOLTAGE_JITTER),
+        CONFIG: (max(interval, config.POLL_CONFIG_INTERVAL), config.POLL_CONFIG_JITTER)
+    })
+
+
+def create_poller(client, **kwargs) -> OutletPoller:
+    """Create a poller with the intervals configured in config.py"""
+    interval = config.POLL_INTERVAL
+    max_age = config.CACHE_MAX_AGE
+    if config.TRAP_ENABLED:
+        # Traps keep the snapshot fresh; polling only reconciles missed traps
+        interval = config.TRAP_RECONCILE_INTERVAL
+        max_age = config.TRAP_RECONCILE_INTERVAL + config.CACHE_MAX_AGE
+    return OutletPoller(
+        client,
+        interval=interval,
+        max_age=max_age,
+        stale_while_revalidate=config.CACHE_STALE_WHILE_REVALIDATE,
+        schedule=create_schedule(interval),
+        **kwargs
+    )
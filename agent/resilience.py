@@ -0,0 +1,163 @@
+import time
+from typing import Dict, Any, Optional
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# pysnmp registers one target per (timeout, retries) pair on the engine, so the
+# adaptive timeout is rounded up to one of these values instead of varying freely
+TIMEOUT_STEPS = (0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0)
+
+
+class DeviceUnreachable(Exception):
+    """The PDU did not answer (retries exhausted) or its circuit breaker is open"""
+
+    def __init__(self, host: str, reason: str):
+        super().__init__(f"PDU {host} is unreachable: {reason}")
+        self.host = host
+        self.reason = reason
+
+
+class AdaptiveTimeout:
+    """Per-device request timeout derived from observed round trip times.
+
+    Follows the TCP retransmission timer (RFC 6298): timeout = SRTT + 4 * RTTVAR,
+    clamped to [minimum, maximum]. Samples from requests that needed a retry are
+    ambiguous and ignored (Karn's algorithm); a timeout doubles the value until
+    the next clean sample.
+    """
+
+    def __init__(self, initial: float = 1.0, minimum: float = 0.2, maximum: float = 5.0):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self._rto = initial
+
+    def observe(self, rtt: float) -> None:
+        """Fold in the round trip time of a request answered on its first attempt"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self._rto = self.srtt + 4 * self.rttvar
+
+    def backoff(self) -> None:
+        """A request timed out: wait longer next time"""
+        self._rto = min(self.maximum, self.timeout * 2)
+
+    @property
+    def timeout(self) -> float:
+        rto = min(self.maximum, max(self.minimum, self._rto))
+        for step in TIMEOUT_STEPS:
+            if step >= rto:
+                return min(step, self.maximum)
+        return self.maximum
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "timeout": self.timeout,
+            "srtt": round(self.srtt, 4) if self.srtt is not None else None,
+            "rttvar": round(self.rttvar, 4) if self.rttvar is not None else None
+        }
+
+
+class RetryBudget:
+    """Number of retransmissions all requests of one poll may spend together.
+
+    Keeps a poll of an unresponsive PDU from paying the full retry cycle for
+    every one of its requests.
+    """
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+
+    def take(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+class CircuitBreaker:
+    """Fails requests to a PDU fast once it stopped answering.
+
+    After failure_threshold consecutive unanswered requests the breaker opens
+    and requests are rejected without touching the network. After
+    reset_timeout seconds one probe request is let through (half-open): an
+    answer closes the breaker, a failure reopens it with the reset timeout
+    doubled (up to max_reset_timeout).
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 max_reset_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.opened_count = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != CLOSED:
+            print("Circuit breaker closed: PDU is answering again")
+        self.state = CLOSED
+        self.opened_at = None
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # The probe failed: stay open for longer
+            self._probe_in_flight = False
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def release_probe(self) -> None:
+        """The request was abandoned without an answer or failure (cancelled): allow another probe"""
+        self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened_count += 1
+
+    def retry_in(self) -> Optional[float]:
+        """Seconds until the next probe is allowed while open"""
+        if self.state != OPEN:
+            return None
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened_count,
+            "rejected": self.rejected,
+            "retryIn": self.retry_in()
+        }
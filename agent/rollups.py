@@ -0,0 +1,171 @@
+"""Resolution selection and bucketing for outlet history read from Supabase.
+
+Readings are rolled up in the database (see the outlet_readings_rollups
+migration) into 1-minute and 1-hour tables holding per-bucket sample counts,
+sums, minima and maxima, and how long the bucket's readings held with their
+duration-weighted sums (outlet_readings_time_weighted migration). Stored
+readings are a step function, so averages and the on-ratio are taken over time;
+buckets without hold durations (older than that migration) fall back to
+per-row averages. A history query reads the coarsest table that is still
+at least as fine as the requested resolution and whose retention covers the
+range, then merges its rows into buckets of the requested size.
+"""
+import math
+import re
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+import config
+
+RAW_TABLE = "outlet_readings"
+# (table, granularity in seconds), coarsest first
+TABLES = [("outlet_readings_1h", 3600), ("outlet_readings_1m", 60), (RAW_TABLE, 0)]
+ROLLUP_COLUMNS = ("bucket,samples,on_samples,voltage_min,voltage_max,voltage_sum,current_min,current_max,current_sum,"
+                  "held_seconds,on_seconds,voltage_seconds,voltage_weighted,current_seconds,current_weighted")
+WEIGHT_COLUMNS = ("held_seconds", "on_seconds", "voltage_seconds", "voltage_weighted", "current_seconds",
+                  "current_weighted")
+RAW_COLUMNS = "created_at,state,voltage,current"
+
+_FRACTION = re.compile(r"\.(\d+)")
+
+
+def _retention(table: str) -> Optional[float]:
+    """Seconds rows are kept in a table (None: forever)"""
+    if table == RAW_TABLE:
+        return config.SUPABASE_RAW_RETENTION_DAYS * 86400
+    if table == "outlet_readings_1m":
+        return config.SUPABASE_ROLLUP_1M_RETENTION_DAYS * 86400
+    return None
+
+
+def pick_table(start: float, step: float, now: Optional[float] = None) -> Tuple[str, int]:
+    """The table to answer a query starting at start with step-second buckets"""
+    age = (now if now is not None else time.time()) - start
+    candidates = [(table, granularity) for table, granularity in TABLES
+                  if _retention(table) is None or age <= _retention(table)]
+    for table, granularity in candidates:
+        if granularity <= step:
+            return table, granularity
+    # Finer than any retained table: the finest one available
+    return candidates[-1]
+
+
+def columns(table: str) -> str:
+    return RAW_COLUMNS if table == RAW_TABLE else ROLLUP_COLUMNS
+
+
+def time_column(table: str) -> str:
+    return "created_at" if table == RAW_TABLE else "bucket"
+
+
+def parse_timestamp(value: str) -> float:
+    """ISO 8601 / PostgREST timestamptz to Unix seconds.
+
+    fromisoformat before 3.11 rejects a trailing "Z" and wants 3 or 6 fraction
+    digits, so both are normalised first.
+    """
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    value = _FRACTION.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), value, count=1)
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _as_rollups(rows: List[Dict[str, Any]], end: float) -> List[Dict[str, Any]]:
+    """Raw readings as one-sample rollup rows, each holding until the next reading.
+
+    The last reading holds until end (or now), and every hold is capped at
+    READING_MAX_HOLD like in the rollup trigger.
+    """
+    times = [parse_timestamp(row["created_at"]) for row in rows]
+    until = times[1:] + [min(end, time.time())]
+    result = []
+    for row, at, next_at in zip(rows, times, until):
+        voltage, current = row.get("voltage"), row.get("current")
+        held = min(max(next_at - at, 0.0), config.READING_MAX_HOLD)
+        result.append({
+            "bucket": row["created_at"], "samples": 1, "on_samples": 1 if row.get("state") == "on" else 0,
+            "voltage_min": voltage, "voltage_max": voltage, "voltage_sum": voltage,
+            "current_min": current, "current_max": current, "current_sum": current,
+            "held_seconds": held, "on_seconds": held if row.get("state") == "on" else 0.0,
+            "voltage_seconds": held if voltage is not None else 0.0,
+            "voltage_weighted": float(voltage) * held if voltage is not None else None,
+            "current_seconds": held if current is not None else 0.0,
+            "current_weighted": float(current) * held if current is not None else None
+        })
+    return result
+
+
+def buckets(table: str, rows: List[Dict[str, Any]], start: float, end: float, step: float) -> List[Dict[str, Any]]:
+    """Merge rows into step-second buckets over [start, end), in the shape OutletHistory.query returns.
+
+    A rollup row counts towards the bucket its own bucket starts in, and so does
+    the whole hold of a reading.
+    """
+    count = int(math.ceil((end - start) / step))
+    if table == RAW_TABLE:
+        rows = _as_rollups(rows, end)
+    merged: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        if not row["samples"] and not float(row.get("held_seconds") or 0):
+            continue
+        index = int((parse_timestamp(row["bucket"]) - start) // step)
+        if not 0 <= index < count:
+            continue
+        bucket = merged.get(index)
+        if bucket is None:
+            merged[index] = dict(row)
+            continue
+        bucket["samples"] += row["samples"]
+        bucket["on_samples"] += row["on_samples"]
+        for metric in ("voltage", "current"):
+            bucket[f"{metric}_min"] = _pick(min, bucket[f"{metric}_min"], row[f"{metric}_min"])
+            bucket[f"{metric}_max"] = _pick(max, bucket[f"{metric}_max"], row[f"{metric}_max"])
+            bucket[f"{metric}_sum"] = _add(bucket[f"{metric}_sum"], row[f"{metric}_sum"])
+        for column in WEIGHT_COLUMNS:
+            bucket[column] = _add(bucket.get(column), row.get(column))
+
+    result = []
+    for index in sorted(merged):
+        bucket = merged[index]
+        samples, held = bucket["samples"], float(bucket.get("held_seconds") or 0)
+        result.append({
+            "start": datetime.fromtimestamp(start + step * index).isoformat(),
+            "count": samples,
+            "voltage": _stats(bucket, "voltage"),
+            "current": _stats(bucket, "current"),
+            "onRatio": round(float(bucket.get("on_seconds") or 0) / held if held > 0
+                             else bucket["on_samples"] / samples, 3)
+        })
+    return result
+
+
+def _add(total: Any, value: Any) -> Optional[float]:
+    if total is None and value is None:
+        return None
+    return float(total or 0) + float(value or 0)
+
+
+def _pick(reduce, current: Any, value: Any) -> Any:
+    if current is None:
+        return value
+    if value is None:
+        return current
+    return reduce(float(current), float(value))
+
+
+def _stats(bucket: Dict[str, Any], metric: str) -> Dict[str, Optional[float]]:
+    """min/avg/max of a bucket; the average is time-weighted where the readings' holds are known"""
+    low, high = bucket[f"{metric}_min"], bucket[f"{metric}_max"]
+    seconds, weighted = float(bucket.get(f"{metric}_seconds") or 0), bucket.get(f"{metric}_weighted")
+    total, samples = bucket[f"{metric}_sum"], bucket["samples"]
+    if seconds > 0 and weighted is not None:
+        avg: Optional[float] = float(weighted) / seconds
+    elif total is not None and samples:
+        avg = float(total) / samples
+    else:
+        avg = None
+    return {
+        "min": round(float(low), 3) if low is not None else None,
+        "avg": round(avg, 3) if avg is not None else None,
+        "max": round(float(high), 3) if high is not None else None
+    }
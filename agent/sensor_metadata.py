@@ -0,0 +1,147 @@
+import time
+from typing import Dict, Any, Optional, List, Iterable
+from snmp_types import scaled, to_native
+
+# PDU2-MIB sensor configuration tables (.pdu.inlet|outlet.sensorType)
+INLET_SENSOR_CONFIG = ".1.3.6.1.4.1.13742.6.3.3.4.1"
+OUTLET_SENSOR_CONFIG = ".1.3.6.1.4.1.13742.6.3.5.4.1"
+SENSOR_UNITS_COLUMN = 6
+SENSOR_DECIMAL_DIGITS_COLUMN = 7
+
+# measurements*SensorIsAvailable (TruthValue) in the measurement tables
+INLET_SENSOR_AVAILABLE = ".1.3.6.1.4.1.13742.6.5.2.3.1.2"
+OUTLET_SENSOR_AVAILABLE = ".1.3.6.1.4.1.13742.6.5.4.3.1.2"
+TRUTH_TRUE = 1
+
+# SensorUnitsEnumeration
+SENSOR_UNITS = {
+    -1: "none", 0: "other", 1: "volt", 2: "amp", 3: "watt", 4: "voltamp",
+    5: "wattHour", 6: "voltampHour", 7: "degreeC", 8: "hertz", 9: "percent"
+}
+
+# Outlet readings taken from the outlet sensor table, in the order they are read per outlet
+OUTLET_READINGS = ("current", "power", "apparentPower")
+
+# Retry interval when a PDU answered none of the metadata OIDs
+EMPTY_RETRY_INTERVAL = 60.0
+
+
+class SensorInfo:
+    """Decimal digits, unit and availability of one sensor"""
+    __slots__ = ("digits", "units", "available")
+
+    def __init__(self, digits: int = 0, units: Optional[str] = None, available: Optional[bool] = None):
+        self.digits = digits
+        self.units = units
+        self.available = available
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"decimalDigits": self.digits, "units": self.units, "available": self.available}
+
+
+class SensorMetadata:
+    """Cached configuration of the sensors a client reads on one PDU.
+
+    Readings are integers with a per-sensor number of implied decimal places
+    (inletSensorDecimalDigits / outletSensorDecimalDigits). The digits, units
+    and availability are read once, in one multi-varbind GET, and kept for ttl
+    seconds; polls only apply the cached scale. The cache is refreshed when it
+    expires, when a poll finds outlets it has no entry for, or on invalidate().
+
+    outlet_sensor_types maps the outlet readings (OUTLET_READINGS) to the
+    sensor types they are read from.
+    """
+
+    def __init__(self, inlet_sensor_type: int, outlet_sensor_types: Dict[str, int], ttl: float = 3600.0):
+        self.inlet_sensor_type = inlet_sensor_type
+        self.outlet_sensor_types = {field: outlet_sensor_types[field]
+                                    for field in OUTLET_READINGS if field in outlet_sensor_types}
+        self.ttl = ttl
+        self.inlet_voltage = SensorInfo()
+        # Outlet number -> reading -> sensor
+        self.outlets: Dict[int, Dict[str, SensorInfo]] = {}
+        self.loaded_at: Optional[float] = None
+        self.expires_at = 0.0
+        self._outlet_oids: Dict[int, List[str]] = {}
+        self._inlet_oids = [
+            f"{INLET_SENSOR_CONFIG}.{SENSOR_DECIMAL_DIGITS_COLUMN}.1.1.{inlet_sensor_type}",
+            f"{INLET_SENSOR_CONFIG}.{SENSOR_UNITS_COLUMN}.1.1.{inlet_sensor_type}",
+            f"{INLET_SENSOR_AVAILABLE}.1.1.{inlet_sensor_type}"
+        ]
+
+    def needs_refresh(self, outlet_nums: Iterable[int]) -> bool:
+        if time.monotonic() >= self.expires_at:
+            return True
+        return any(num not in self.outlets for num in outlet_nums)
+
+    def invalidate(self) -> None:
+        self.expires_at = 0.0
+
+    def _oids_for_outlet(self, outlet_num: int) -> List[str]:
+        oids = self._outlet_oids.get(outlet_num)
+        if oids is None:
+            oids = self._outlet_oids[outlet_num] = []
+            for sensor_type in self.outlet_sensor_types.values():
+                index = f"1.{outlet_num}.{sensor_type}"
+                oids.extend([
+                    f"{OUTLET_SENSOR_CONFIG}.{SENSOR_DECIMAL_DIGITS_COLUMN}.{index}",
+                    f"{OUTLET_SENSOR_CONFIG}.{SENSOR_UNITS_COLUMN}.{index}",
+                    f"{OUTLET_SENSOR_AVAILABLE}.{index}"
+                ])
+        return oids
+
+    def request_oids(self, outlet_nums: Iterable[int]) -> List[str]:
+        """OIDs to GET for a refresh: digits, units and availability per sensor"""
+        oids = list(self._inlet_oids)
+        for num in outlet_nums:
+            oids.extend(self._oids_for_outlet(num))
+        return oids
+
+    def update(self, outlet_nums: Iterable[int], values: List[Optional[Any]]) -> None:
+        """Store the values returned for request_oids(outlet_nums), in the same order"""
+        self.inlet_voltage = self._sensor_info(values[0:3])
+        outlets = {}
+        start = 3
+        for num in outlet_nums:
+            outlets[num] = {}
+            for field in self.outlet_sensor_types:
+                outlets[num][field] = self._sensor_info(values[start:start + 3])
+                start += 3
+        self.outlets = outlets
+
+        now = time.monotonic()
+        self.loaded_at = now
+        if any(value is not None for value in values):
+            self.expires_at = now + self.ttl
+        else:
+            # Not answered (or not supported): readings stay unscaled, ask again later
+            print("Sensor metadata not available from PDU, readings are not scaled")
+            self.expires_at = now + min(self.ttl, EMPTY_RETRY_INTERVAL)
+
+    @staticmethod
+    def _sensor_info(values: List[Optional[Any]]) -> SensorInfo:
+        digits, units, available = (to_native(value) for value in values)
+        return SensorInfo(
+            digits=digits or 0,
+            units=SENSOR_UNITS.get(units) if units is not None else None,
+            available=(available == TRUTH_TRUE) if available is not None else None
+        )
+
+    def voltage(self, raw: Any) -> Optional[float]:
+        """Scale an inlet voltage reading"""
+        return scaled(raw, self.inlet_voltage.digits)
+
+    def reading(self, outlet_num: int, field: str, raw: Any) -> Optional[float]:
+        """Scale an outlet reading (current, power or apparentPower)"""
+        info = self.outlets.get(outlet_num, {}).get(field)
+        return scaled(raw, info.digits if info is not None else 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"inletVoltage": self.inlet_voltage.to_dict()}
+        for field in self.outlet_sensor_types:
+            # outletCurrent, outletPower, outletApparentPower
+            result[f"outlet{field[0].upper()}{field[1:]}"] = {
+                str(num): sensors[field].to_dict() for num, sensors in sorted(self.outlets.items())
+            }
+        result["age"] = round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None
+        return result
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""Local Raritan PX3 simulator for development and benchmarks.
+
+Serves the PDU2-MIB objects used by the agent (outlet switching state and
+control, inlet voltage and outlet current and power sensors and their configuration) over
+SNMP v1/v2c on UDP, and over SNMPv3 when a USM user is given. Many PDUs can be
+simulated by one process, each on its own port, with configurable response
+latency, jitter and packet loss.
+
+    python simulator.py --pdus 10 --outlets 24 --port 16100 --latency 5 --jitter 2 --loss 0.01 \\
+        --fleet-file sim-fleet.json
+
+    python simulator.py --v3-user agent --v3-auth-key authpass1 --v3-priv-key privpass1
+
+Point the agent at the generated fleet file (FLEET_CONFIG_FILE=sim-fleet.json)
+or at a single simulated PDU (SNMP_HOST=127.0.0.1, SNMP_PORT=16100).
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import sys
+import time
+from typing import Dict, Any, Optional, List, Tuple
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.carrier.base import AbstractTransportDispatcher
+from pysnmp.entity import engine, config as engine_config
+from pysnmp.entity.rfc3413 import cmdrsp, context
+from pysnmp.proto import api, rfc1905
+from pysnmp.smi import error as smi_error
+from snmp_auth import AUTH_PROTOCOLS, PRIV_PROTOCOLS, V3User
+
+# PDU2-MIB columns served by the simulator (same as BaseSNMPClient.oids)
+OUTLET_CONTROL = (1, 3, 6, 1, 4, 1, 13742, 6, 4, 1, 2, 1, 2)   # .pdu.outlet, read-write
+OUTLET_STATE = (1, 3, 6, 1, 4, 1, 13742, 6, 4, 1, 2, 1, 3)     # .pdu.outlet
+INLET_SENSOR_VALUE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 2, 3, 1, 4)   # .pdu.inlet.sensorType
+OUTLET_SENSOR_VALUE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 4, 3, 1, 4)  # .pdu.outlet.sensorType
+INLET_SENSOR_AVAILABLE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 2, 3, 1, 2)
+OUTLET_SENSOR_AVAILABLE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 4, 3, 1, 2)
+# Sensor configuration tables: units (column 6) and decimal digits (column 7)
+INLET_SENSOR_CONFIG = (1, 3, 6, 1, 4, 1, 13742, 6, 3, 3, 4, 1)
+OUTLET_SENSOR_CONFIG = (1, 3, 6, 1, 4, 1, 13742, 6, 3, 5, 4, 1)
+# Unit configuration (inletCount column 2, outletCount column 4) and the
+# inlet/outlet configuration tables (label column 2, name column 3)
+UNIT_CONFIG = (1, 3, 6, 1, 4, 1, 13742, 6, 3, 2, 2, 1)
+INLET_CONFIG = (1, 3, 6, 1, 4, 1, 13742, 6, 3, 3, 3, 1)
+OUTLET_CONFIG = (1, 3, 6, 1, 4, 1, 13742, 6, 3, 5, 3, 1)
+
+SENSOR_VOLTAGE = 4  # rmsVoltage
+SENSOR_CURRENT = 1  # rmsCurrent
+SENSOR_ACTIVE_POWER = 5
+SENSOR_APPARENT_POWER = 6
+UNITS_VOLT = 1
+UNITS_AMP = 2
+UNITS_WATT = 3
+UNITS_VOLTAMP = 4
+TRUTH_TRUE = 1
+# Outlet currents are reported in mA (3 decimal digits), voltage and power in whole V, W and VA
+CURRENT_DECIMAL_DIGITS = 3
+VOLTAGE_DECIMAL_DIGITS = 0
+POWER_DECIMAL_DIGITS = 0
+# Outlet sensors: type -> (units, decimal digits)
+OUTLET_SENSORS = {
+    SENSOR_CURRENT: (UNITS_AMP, CURRENT_DECIMAL_DIGITS),
+    SENSOR_ACTIVE_POWER: (UNITS_WATT, POWER_DECIMAL_DIGITS),
+    SENSOR_APPARENT_POWER: (UNITS_VOLTAMP, POWER_DECIMAL_DIGITS),
+}
+
+# outletSwitchingState values (PDU2-MIB: on(7), off(8))
+STATE_ON = 7
+STATE_OFF = 8
+# outletSwitchingOperation values (PDU2-MIB: off(0), on(1), cycle(2))
+ACTION_OFF = 0
+ACTION_ON = 1
+ACTION_CYCLE = 2
+# The state an off/on operation switches to
+SWITCH_TO = {ACTION_OFF: STATE_OFF, ACTION_ON: STATE_ON}
+
+# msgVersion of SNMPv3 messages (v1 and v2c are handled without an engine)
+SNMP_V3 = 3
+
+
+class SimulatedPDU:
+    """In-memory PX3 with one inlet and a number of switched outlets"""
+
+    def __init__(self, outlets: int = 24, voltage: int = 120, cycle_delay: float = 2.0,
+                 switch_delay: float = 0.0, seed: Optional[int] = None):
+        self.outlets = outlets
+        self.voltage = voltage
+        self.cycle_delay = cycle_delay
+        self.switch_delay = switch_delay
+        self.random = random.Random(seed)
+        self.states = {outlet: STATE_ON for outlet in range(1, outlets + 1)}
+        # Raw outlet current readings while an outlet is on
+        self.loads = {outlet: self.random.randint(100, 2000) for outlet in range(1, outlets + 1)}
+        # Power factor of each outlet's load
+        self.power_factors = {outlet: self.random.randint(80, 100) / 100 for outlet in range(1, outlets + 1)}
+
+        self._names: List[Tuple[int, ...]] = []
+        for outlet in range(1, outlets + 1):
+            self._names.append(OUTLET_CONTROL + (1, outlet))
+            self._names.append(OUTLET_STATE + (1, outlet))
+            self._names.extend(OUTLET_SENSOR_VALUE + (1, outlet, sensor) for sensor in OUTLET_SENSORS)
+        self._names.append(INLET_SENSOR_VALUE + (1, 1, SENSOR_VOLTAGE))
+
+        # Read-only sensor availability and configuration
+        self._static: Dict[Tuple[int, ...], Tuple[str, Any]] = {
+            UNIT_CONFIG + (2, 1): ("Integer", 1),
+            UNIT_CONFIG + (4, 1): ("Integer", outlets),
+            INLET_CONFIG + (2, 1, 1): ("OctetString", "I1"),
+            INLET_CONFIG + (3, 1, 1): ("OctetString", ""),
+            INLET_SENSOR_AVAILABLE + (1, 1, SENSOR_VOLTAGE): ("Integer", TRUTH_TRUE),
+            INLET_SENSOR_CONFIG + (6, 1, 1, SENSOR_VOLTAGE): ("Integer", UNITS_VOLT),
+            INLET_SENSOR_CONFIG + (7, 1, 1, SENSOR_VOLTAGE): ("Gauge32", VOLTAGE_DECIMAL_DIGITS),
+        }
+        for outlet in range(1, outlets + 1):
+            self._static[OUTLET_CONFIG + (2, 1, outlet)] = ("OctetString", str(outlet))
+            self._static[OUTLET_CONFIG + (3, 1, outlet)] = ("OctetString", "")
+            for sensor, (units, digits) in OUTLET_SENSORS.items():
+                self._static[OUTLET_SENSOR_AVAILABLE + (1, outlet, sensor)] = ("Integer", TRUTH_TRUE)
+                self._static[OUTLET_SENSOR_CONFIG + (6, 1, outlet, sensor)] = ("Integer", units)
+                self._static[OUTLET_SENSOR_CONFIG + (7, 1, outlet, sensor)] = ("Gauge32", digits)
+        self._names.extend(self._static)
+        self._names.sort()
+        self._known = set(self._names)
+
+    def read(self, name: Tuple[int, ...]) -> Optional[Tuple[str, Any]]:
+        """Return (SNMP type, value) for an instance OID, or None if it does not exist"""
+        if name not in self._known:
+            return None
+        if name in self._static:
+            return self._static[name]
+        if name[:len(OUTLET_STATE)] == OUTLET_STATE:
+            return "Integer", self.states[name[-1]]
+        if name[:len(OUTLET_CONTROL)] == OUTLET_CONTROL:
+            return "Integer", ACTION_ON if self.states[name[-1]] == STATE_ON else ACTION_OFF
+        if name[:len(OUTLET_SENSOR_VALUE)] == OUTLET_SENSOR_VALUE:
+            return "Gauge32", self.outlet_reading(name[-2], name[-1])
+        return "Gauge32", self.voltage
+
+    def outlet_reading(self, outlet: int, sensor: int) -> int:
+        """Raw value of an outlet sensor: current in mA, active power in W, apparent power in VA"""
+        if self.states[outlet] != STATE_ON:
+            return 0
+        if sensor == SENSOR_CURRENT:
+            return self.loads[outlet]
+        apparent = self.voltage * self.loads[outlet] / 10 ** CURRENT_DECIMAL_DIGITS
+        if sensor == SENSOR_ACTIVE_POWER:
+            return round(apparent * self.power_factors[outlet])
+        return round(apparent)
+
+    def next_name(self, name: Tuple[int, ...]) -> Optional[Tuple[int, ...]]:
+        """The first instance OID after name in lexicographic order"""
+        index = bisect.bisect_right(self._names, name)
+        return self._names[index] if index < len(self._names) else None
+
+    def check_write(self, name: Tuple[int, ...], value: int) -> Optional[str]:
+        """Validate a SET var-bind; returns an error name or None"""
+        if name[:len(OUTLET_CONTROL)] != OUTLET_CONTROL or name not in self._known:
+            return "notWritable"
+        if value not in (ACTION_OFF, ACTION_ON, ACTION_CYCLE):
+            return "wrongValue"
+        return None
+
+    def write(self, name: Tuple[int, ...], value: int) -> None:
+        """Apply an outlet control write; switching takes switch_delay seconds"""
+        outlet = name[-1]
+        loop = asyncio.get_event_loop()
+        if value == ACTION_CYCLE:
+            loop.call_later(self.switch_delay, self._switch, outlet, STATE_OFF)
+            loop.call_later(self.switch_delay + self.cycle_delay, self._switch, outlet, STATE_ON)
+        elif self.switch_delay:
+            loop.call_later(self.switch_delay, self._switch, outlet, SWITCH_TO[value])
+        else:
+            self._switch(outlet, SWITCH_TO[value])
+
+    def _switch(self, outlet: int, state: int) -> None:
+        self.states[outlet] = state
+
+
+class SimulatorProtocol(asyncio.DatagramProtocol):
+    """Answers GET, GETNEXT, GETBULK and SET requests for one SimulatedPDU"""
+
+    def __init__(self, pdu: SimulatedPDU, community: str = "public", latency: float = 0.0,
+                 jitter: float = 0.0, loss: float = 0.0, v3_user: Optional[V3User] = None):
+        self.pdu = pdu
+        self.community = community
+        self.usm = UsmResponder(self, v3_user) if v3_user is not None else None
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.transport = None
+        self.requests = 0
+        self.dropped = 0
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.requests += 1
+        if self.loss and self.pdu.random.random() < self.loss:
+            self.dropped += 1
+            return
+        try:
+            response = self.respond(data, addr)
+        except Exception as e:
+            print(f"Error handling request from {addr[0]}: {e}")
+            return
+        if response is None:
+            return
+
+        delay = self.latency
+        if self.jitter:
+            delay += self.pdu.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            asyncio.get_event_loop().call_later(delay, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+    def respond(self, data: bytes, addr=None) -> Optional[bytes]:
+        """Build the encoded response to one request message"""
+        version = int(api.decodeMessageVersion(data))
+        if version == SNMP_V3:
+            return self.usm.respond(data, addr) if self.usm is not None else None
+        if version not in api.protoModules:
+            return None
+        proto = api.protoModules[version]
+        request, _ = decoder.decode(data, asn1Spec=proto.Message())
+        if str(proto.apiMessage.getCommunity(request)) != self.community:
+            # Real agents silently drop requests with a wrong community
+            return None
+
+        response = proto.apiMessage.getResponse(request)
+        request_pdu = proto.apiMessage.getPDU(request)
+        response_pdu = proto.apiMessage.getPDU(response)
+
+        if request_pdu.isSameTypeWith(proto.GetRequestPDU()):
+            self._get(proto, request_pdu, response_pdu)
+        elif request_pdu.isSameTypeWith(proto.GetNextRequestPDU()):
+            self._get_next(proto, request_pdu, response_pdu)
+        elif hasattr(proto, "GetBulkRequestPDU") and request_pdu.isSameTypeWith(proto.GetBulkRequestPDU()):
+            self._get_bulk(proto, request_pdu, response_pdu)
+        elif request_pdu.isSameTypeWith(proto.SetRequestPDU()):
+            self._set(proto, version, request_pdu, response_pdu)
+        else:
+            proto.apiPDU.setErrorStatus(response_pdu, "genErr")
+        return encoder.encode(response)
+
+    def _value(self, proto, name: Tuple[int, ...]):
+        kind, value = self.pdu.read(name)
+        if kind == "Integer":
+            return proto.Integer(value)
+        if kind == "OctetString":
+            return proto.OctetString(value)
+        # SNMPv1 calls it Gauge, v2c Gauge32
+        gauge = proto.Gauge32 if hasattr(proto, "Gauge32") else proto.Gauge
+        return gauge(value)
+
+    def _get(self, proto, request_pdu, response_pdu) -> None:
+        var_binds = []
+        errors = []
+        for index, (name, value) in enumerate(proto.apiPDU.getVarBinds(request_pdu), 1):
+            name = tuple(name)
+            if self.pdu.read(name) is None:
+                var_binds.append((name, value))
+                errors.append(index)
+            else:
+                var_binds.append((name, self._value(proto, name)))
+        proto.apiPDU.setVarBinds(response_pdu, var_binds)
+        for index in errors:
+            proto.apiPDU.setNoSuchInstanceError(response_pdu, index)
+
+    def _get_next(self, proto, request_pdu, response_pdu) -> None:
+        var_binds = []
+        errors = []
+        for index, (name, value) in enumerate(proto.apiPDU.getVarBinds(request_pdu), 1):
+            next_name = self.pdu.next_name(tuple(name))
+            if next_name is None:
+                var_binds.append((name, value))
+                errors.append(index)
+            else:
+                var_binds.append((next_name, self._value(proto, next_name)))
+        proto.apiPDU.setVarBinds(response_pdu, var_binds)
+        for index in errors:
+            proto.apiPDU.setEndOfMibError(response_pdu, index)
+
+    def _get_bulk(self, proto, request_pdu, response_pdu) -> None:
+        non_repeaters = int(proto.apiBulkPDU.getNonRepeaters(request_pdu))
+        max_repetitions = int(proto.apiBulkPDU.getMaxRepetitions(request_pdu))
+        names = [tuple(name) for name, _ in proto.apiBulkPDU.getVarBinds(request_pdu)]
+
+        var_binds = []
+        for name in names[:non_repeaters]:
+            var_binds.append(self._next_var_bind(proto, name))
+        repeaters = names[non_repeaters:]
+        for _ in range(max_repetitions if repeaters else 0):
+            row = [self._next_var_bind(proto, name) for name in repeaters]
+            var_binds.extend(row)
+            repeaters = [name for name, _ in row]
+            if all(value is rfc1905.endOfMibView for _, value in row):
+                break
+        proto.apiBulkPDU.setVarBinds(response_pdu, var_binds)
+
+    def _next_var_bind(self, proto, name: Tuple[int, ...]):
+        next_name = self.pdu.next_name(name)
+        if next_name is None:
+            return name, rfc1905.endOfMibView
+        return next_name, self._value(proto, next_name)
+
+    def _set(self, proto, version: int, request_pdu, response_pdu) -> None:
+        var_binds = [(tuple(name), value) for name, value in proto.apiPDU.getVarBinds(request_pdu)]
+        proto.apiPDU.setVarBinds(response_pdu, var_binds)
+
+        # A SET is atomic: validate every var-bind before applying any of them
+        for index, (name, value) in enumerate(var_binds, 1):
+            error = self.pdu.check_write(name, int(value))
+            if error is not None:
+                if version == api.protoVersion1:
+                    error = "noSuchName" if error == "notWritable" else "badValue"
+                proto.apiPDU.setErrorStatus(response_pdu, error)
+                proto.apiPDU.setErrorIndex(response_pdu, index)
+                return
+        for name, value in var_binds:
+            self.pdu.write(name, int(value))
+
+
+class UsmResponder(AbstractTransportDispatcher):
+    """SNMPv3 side of one simulated PDU.
+
+    A pysnmp engine does the USM work (engine ID and time discovery,
+    authentication, privacy) for the v3 messages the SimulatorProtocol
+    receives. The engine is given this object as its transport dispatcher, so
+    its answers come back to the protocol and are delayed or dropped like
+    v1/v2c responses. Reads and writes go to the same SimulatedPDU.
+    """
+
+    def __init__(self, protocol: "SimulatorProtocol", user: V3User):
+        AbstractTransportDispatcher.__init__(self)
+        self.outbox = _Outbox()
+        self.registerTransport(engine_config.snmpUDPDomain, self.outbox)
+        # A new engine ID per simulated PDU
+        self.engine = engine.SnmpEngine()
+        self.engine.registerTransportDispatcher(self)
+        engine_config.addV3User(
+            self.engine, user.user,
+            AUTH_PROTOCOLS[user.auth_protocol], user.auth_key,
+            PRIV_PROTOCOLS[user.priv_protocol], user.priv_key
+        )
+
+        # Every context name the agent may use maps to the PDU (no VACM: the user may read and write)
+        snmp_context = context.SnmpContext(self.engine)
+        snmp_context.unregisterContextName(b"")
+        instrumentation = PduInstrumentation(protocol)
+        snmp_context.registerContextName(b"", instrumentation)
+        if user.context:
+            snmp_context.registerContextName(user.context, instrumentation)
+        for responder in (cmdrsp.GetCommandResponder, cmdrsp.NextCommandResponder,
+                          cmdrsp.BulkCommandResponder, cmdrsp.SetCommandResponder):
+            responder(self.engine, snmp_context)
+
+    def respond(self, data: bytes, addr) -> Optional[bytes]:
+        """Run one message through the engine; returns its response or Report, if any"""
+        self.handleTimerTick(time.time())
+        self.outbox.receive(self.outbox, tuple(addr), data)
+        messages, self.outbox.messages = self.outbox.messages, []
+        return messages[-1] if messages else None
+
+
+class _Outbox:
+    """Stands in for a pysnmp transport: collects what the engine sends"""
+
+    def __init__(self):
+        self.messages: List[bytes] = []
+        self.receive = None
+
+    def registerCbFun(self, callback) -> None:
+        self.receive = callback
+
+    def unregisterCbFun(self) -> None:
+        self.receive = None
+
+    def sendMessage(self, message: bytes, address) -> None:
+        self.messages.append(message)
+
+    def closeTransport(self) -> None:
+        pass
+
+
+class PduInstrumentation:
+    """The MIB instrumentation pysnmp's command responders call, backed by a SimulatedPDU"""
+
+    def __init__(self, protocol: "SimulatorProtocol"):
+        self.protocol = protocol
+        self.pdu = protocol.pdu
+        self.proto = api.protoModules[api.protoVersion2c]
+
+    def readVars(self, var_binds, ac_info=(None, None)):
+        result = []
+        for name, _ in var_binds:
+            name = tuple(name)
+            if self.pdu.read(name) is None:
+                result.append((name, rfc1905.noSuchInstance))
+            else:
+                result.append((name, self.protocol._value(self.proto, name)))
+        return result
+
+    def readNextVars(self, var_binds, ac_info=(None, None)):
+        return [self.protocol._next_var_bind(self.proto, tuple(name)) for name, _ in var_binds]
+
+    def writeVars(self, var_binds, ac_info=(None, None)):
+        var_binds = [(tuple(name), value) for name, value in var_binds]
+        # A SET is atomic: validate every var-bind before applying any of them
+        for index, (name, value) in enumerate(var_binds):
+            error = self.pdu.check_write(name, int(value))
+            if error == "notWritable":
+                raise smi_error.NotWritableError(idx=index, name=name)
+            if error is not None:
+                raise smi_error.WrongValueError(idx=index, name=name)
+        for name, value in var_binds:
+            self.pdu.write(name, int(value))
+        return var_binds
+
+
+async def start_simulators(count: int = 1, host: str = "127.0.0.1", port: int = 16100, outlets: int = 24,
+                           community: str = "public", latency: float = 0.0, jitter: float = 0.0,
+                           loss: float = 0.0, cycle_delay: float = 2.0, switch_delay: float = 0.0,
+                           seed: int = 0, v3_user: Optional[V3User] = None) -> List[Tuple[Any, SimulatorProtocol]]:
+    """Bind count simulated PDUs on consecutive ports; returns (transport, protocol) pairs"""
+    loop = asyncio.get_running_loop()
+    endpoints = []
+    for index in range(count):
+        pdu = SimulatedPDU(outlets, cycle_delay=cycle_delay, switch_delay=switch_delay, seed=seed + index)
+        protocol = SimulatorProtocol(pdu, community, latency, jitter, loss, v3_user)
+        transport, _ = await loop.create_datagram_endpoint(lambda: protocol, local_addr=(host, port + index))
+        endpoints.append((transport, protocol))
+    return endpoints
+
+
+def fleet_file_data(count: int, host: str, port: int, outlets: int, community: str,
+                    v3_user: Optional[V3User] = None) -> Dict[str, Any]:
+    """Fleet configuration (see fleet.py) describing the simulated PDUs"""
+    defaults = {"community": community, "version": "2c", "model": "PX3", "outlets": outlets}
+    if v3_user is not None:
+        defaults["version"] = "3"
+        defaults["v3"] = {
+            "user": v3_user.user, "authProtocol": v3_user.auth_protocol, "authKey": v3_user.auth_key,
+            "privProtocol": v3_user.priv_protocol, "privKey": v3_user.priv_key, "context": v3_user.context
+        }
+    return {
+        "defaults": defaults,
+        "devices": [
+            {"id": f"sim-{index + 1}", "host": host, "port": port + index, "name": f"Simulated PDU {index + 1}"}
+            for index in range(count)
+        ]
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Simulate Raritan PX3 PDUs over SNMP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=16100, help="UDP port of the first PDU")
+    parser.add_argument("--pdus", type=int, default=1, help="Number of PDUs (consecutive ports)")
+    parser.add_argument("--outlets", type=int, default=24)
+    parser.add_argument("--community", default="public")
+    parser.add_argument("--latency", type=float, default=0.0, help="Response latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter (+/-) in ms")
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of requests dropped (0-1)")
+    parser.add_argument("--cycle-delay", type=float, default=2.0, help="Seconds an outlet stays off when cycled")
+    parser.add_argument("--switch-delay", type=float, default=0.0, help="Seconds before a switch takes effect")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fleet-file", help="Write a fleet configuration for the simulated PDUs")
+    parser.add_argument("--v3-user", help="Also answer SNMPv3 requests from this USM user")
+    parser.add_argument("--v3-auth-protocol", default="sha", choices=sorted(AUTH_PROTOCOLS))
+    parser.add_argument("--v3-auth-key")
+    parser.add_argument("--v3-priv-protocol", default="aes", choices=sorted(PRIV_PROTOCOLS))
+    parser.add_argument("--v3-priv-key")
+    parser.add_argument("--v3-context", default="")
+    args = parser.parse_args()
+
+    v3_user = None
+    if args.v3_user:
+        v3_user = V3User(args.v3_user, args.v3_auth_protocol, args.v3_auth_key,
+                         args.v3_priv_protocol, args.v3_priv_key, args.v3_context)
+
+    if args.fleet_file:
+        with open(args.fleet_file, "w") as f:
+            json.dump(fleet_file_data(args.pdus, args.host, args.port, args.outlets, args.community, v3_user),
+                      f, indent=2)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    endpoints = loop.run_until_complete(start_simulators(
+        args.pdus, args.host, args.port, args.outlets, args.community,
+        latency=args.latency / 1000.0, jitter=args.jitter / 1000.0, loss=args.loss,
+        cycle_delay=args.cycle_delay, switch_delay=args.switch_delay, seed=args.seed, v3_user=v3_user
+    ))
+    # The benchmark suite waits for this line before it starts measuring
+    print(f"Simulating {args.pdus} PDU(s) with {args.outlets} outlets on {args.host}:{args.port}"
+          f"-{args.port + args.pdus - 1}", flush=True)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for transport, _ in endpoints:
+            transport.close()
+        loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
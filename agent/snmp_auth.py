@@ -0,0 +1,196 @@
+"""SNMP credentials: v1/v2c communities and SNMPv3 USM users.
+
+SNMPv3 has two per-device costs that v2c does not: discovering the agent's
+engine ID, boots and time (an extra round trip, twice for authenticated users)
+and deriving keys from the pass phrases. Turning a pass phrase into a master
+key hashes a megabyte of data; localizing the master key to one engine ID is a
+single hash. Both are paid once here:
+
+  * master keys are computed once per (protocol, pass phrase) in the process
+    and handed to pysnmp as usmKeyTypeMaster, so neither a new session nor a
+    fleet of PDUs sharing a user repeats the expensive step;
+  * the session keeps its SnmpEngine for its whole life, and pysnmp keeps the
+    discovered engine ID, the boots/time timeline and the key localized to
+    each engine in that engine's USM tables.
+
+EngineDiscovery watches an engine's discovery reports so the cached engine ID
+and the number of discoveries per PDU can be inspected.
+"""
+import time
+from typing import Dict, Any, Optional, Tuple
+from pysnmp.entity import config as engine_config
+from pysnmp.hlapi import (
+    CommunityData, ContextData, UsmUserData, usmKeyTypeMaster,
+    usmNoAuthProtocol, usmHMACMD5AuthProtocol, usmHMACSHAAuthProtocol, usmHMAC128SHA224AuthProtocol,
+    usmHMAC192SHA256AuthProtocol, usmHMAC256SHA384AuthProtocol, usmHMAC384SHA512AuthProtocol,
+    usmNoPrivProtocol, usmDESPrivProtocol, usm3DESEDEPrivProtocol, usmAesCfb128Protocol,
+    usmAesBlumenthalCfb192Protocol, usmAesBlumenthalCfb256Protocol
+)
+
+AUTH_PROTOCOLS = {
+    "none": usmNoAuthProtocol,
+    "md5": usmHMACMD5AuthProtocol,
+    "sha": usmHMACSHAAuthProtocol,
+    "sha224": usmHMAC128SHA224AuthProtocol,
+    "sha256": usmHMAC192SHA256AuthProtocol,
+    "sha384": usmHMAC256SHA384AuthProtocol,
+    "sha512": usmHMAC384SHA512AuthProtocol
+}
+
+PRIV_PROTOCOLS = {
+    "none": usmNoPrivProtocol,
+    "des": usmDESPrivProtocol,
+    "3des": usm3DESEDEPrivProtocol,
+    "aes": usmAesCfb128Protocol,
+    # AES-192/256 with the key extension net-snmp uses
+    "aes192": usmAesBlumenthalCfb192Protocol,
+    "aes256": usmAesBlumenthalCfb256Protocol
+}
+
+# RFC 3414 11.2: pass phrases must be at least 8 characters
+MIN_PASSPHRASE_LENGTH = 8
+
+# (protocol, pass phrase) -> master key, shared by every session in the process
+_master_keys: Dict[Tuple[Any, ...], Any] = {}
+
+
+class V3User:
+    """An SNMPv3 USM user: name, auth/priv protocols and pass phrases, and context"""
+
+    def __init__(self, user: str, auth_protocol: str = "sha", auth_key: Optional[str] = None,
+                 priv_protocol: str = "aes", priv_key: Optional[str] = None, context: str = ""):
+        self.user = user
+        self.auth_protocol = (auth_protocol or "none").lower()
+        self.auth_key = auth_key or None
+        self.priv_protocol = (priv_protocol or "none").lower()
+        self.priv_key = priv_key or None
+        self.context = context or ""
+
+        if not user:
+            raise ValueError("SNMPv3 needs a user name")
+        if self.auth_protocol not in AUTH_PROTOCOLS:
+            raise ValueError(f"Unknown SNMPv3 auth protocol {auth_protocol!r} (one of {', '.join(AUTH_PROTOCOLS)})")
+        if self.priv_protocol not in PRIV_PROTOCOLS:
+            raise ValueError(f"Unknown SNMPv3 privacy protocol {priv_protocol!r} (one of {', '.join(PRIV_PROTOCOLS)})")
+        if self.auth_protocol == "none":
+            # No authentication: nothing to encrypt with either
+            self.auth_key = None
+            self.priv_protocol = "none"
+        if self.priv_protocol == "none":
+            self.priv_key = None
+        for name, key, protocol in (("auth", self.auth_key, self.auth_protocol),
+                                    ("priv", self.priv_key, self.priv_protocol)):
+            if protocol != "none" and (key is None or len(key) < MIN_PASSPHRASE_LENGTH):
+                raise ValueError(f"SNMPv3 {name} key for {user} must be at least {MIN_PASSPHRASE_LENGTH} characters")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "V3User":
+        """From a fleet file "v3" entry: {"user", "authProtocol", "authKey", "privProtocol", "privKey", "context"}"""
+        return cls(
+            user=data.get("user", ""),
+            auth_protocol=data.get("authProtocol", "sha"),
+            auth_key=data.get("authKey"),
+            priv_protocol=data.get("privProtocol", "aes"),
+            priv_key=data.get("privKey"),
+            context=data.get("context", "")
+        )
+
+    @property
+    def security_level(self) -> str:
+        if self.auth_protocol == "none":
+            return "noAuthNoPriv"
+        return "authNoPriv" if self.priv_protocol == "none" else "authPriv"
+
+    def credentials(self) -> Tuple[Any, ...]:
+        """Everything pysnmp keys its user table on; engines can be shared while these match per user"""
+        return (self.user, self.auth_protocol, self.auth_key, self.priv_protocol, self.priv_key)
+
+    def auth_data(self) -> UsmUserData:
+        auth_protocol = AUTH_PROTOCOLS[self.auth_protocol]
+        priv_protocol = PRIV_PROTOCOLS[self.priv_protocol]
+        if self.auth_key is None:
+            return UsmUserData(self.user)
+        auth_key = master_key(auth_protocol, self.auth_key)
+        if self.priv_key is None:
+            return UsmUserData(self.user, auth_key, authProtocol=auth_protocol, authKeyType=usmKeyTypeMaster)
+        return UsmUserData(
+            self.user, auth_key, master_key(auth_protocol, self.priv_key, priv_protocol),
+            authProtocol=auth_protocol, privProtocol=priv_protocol,
+            authKeyType=usmKeyTypeMaster, privKeyType=usmKeyTypeMaster
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public description (without keys)"""
+        return {
+            "user": self.user,
+            "securityLevel": self.security_level,
+            "authProtocol": self.auth_protocol,
+            "privProtocol": self.priv_protocol,
+            "context": self.context
+        }
+
+
+def master_key(auth_protocol, passphrase: str, priv_protocol=None):
+    """Pass phrase to master key (RFC 3414 A.2), computed once per process"""
+    key = (auth_protocol, priv_protocol, passphrase)
+    master = _master_keys.get(key)
+    if master is None:
+        if priv_protocol is None:
+            master = engine_config.authServices[auth_protocol].hashPassphrase(passphrase)
+        else:
+            master = engine_config.privServices[priv_protocol].hashPassphrase(auth_protocol, passphrase)
+        _master_keys[key] = master
+    return master
+
+
+def auth_data(version: str, community: str, v3_user: Optional[V3User] = None):
+    """Credentials for a session: a USM user for v3, the community otherwise"""
+    if str(version) == "3":
+        if v3_user is None:
+            raise ValueError("SNMP version 3 needs a V3 user (SNMP_V3_USER or a fleet \"v3\" entry)")
+        return v3_user.auth_data()
+    # SNMPv1 uses message processing model 0, v2c uses model 1
+    return CommunityData(community, mpModel=0 if str(version) == "1" else 1)
+
+
+def context_data(v3_user: Optional[V3User] = None) -> ContextData:
+    if v3_user is not None and v3_user.context:
+        return ContextData(contextName=v3_user.context)
+    return ContextData()
+
+
+class EngineDiscovery:
+    """Engine IDs of the SNMPv3 agents one SnmpEngine talks to.
+
+    pysnmp answers engine ID and time discovery internally; this records the
+    Report PDUs those exchanges produce, per agent address, so a cached engine
+    (one discovery per PDU, not per request) can be verified.
+    """
+
+    def __init__(self, engine):
+        self.agents: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        engine.observer.registerObserver(self._on_report, "rfc3412.prepareDataElements:internal")
+
+    @classmethod
+    def of(cls, engine) -> "EngineDiscovery":
+        """The (one) observer of an engine"""
+        discovery = engine.getUserContext("engine_discovery")
+        if discovery is None:
+            discovery = cls(engine)
+            engine.setUserContext(engine_discovery=discovery)
+        return discovery
+
+    def _on_report(self, snmp_engine, exec_point, variables, cb_ctx) -> None:
+        address = tuple(variables["transportAddress"])[:2]
+        agent = self.agents.setdefault(address, {"engineId": None, "reports": 0, "lastReport": None})
+        engine_id = variables.get("securityEngineId")
+        if engine_id:
+            agent["engineId"] = engine_id.prettyPrint() if hasattr(engine_id, "prettyPrint") else str(engine_id)
+        agent["reports"] += 1
+        agent["lastReport"] = time.time()
+
+    def stats(self, address: Tuple[str, int]) -> Dict[str, Any]:
+        agent = self.agents.get(tuple(address)[:2])
+        if agent is None:
+            return {"engineId": None, "reports": 0, "lastReport": None}
+        return dict(agent)
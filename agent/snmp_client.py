@@ -1,19 +1,55 @@
 from pysnmp.hlapi import *
-import os
 import time
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 import config
+from snmp_session import SNMPSession
+from snmp_auth import V3User
+from oid_table import OutletOidTable
+from snmp_types import to_native
+from sensor_metadata import SensorMetadata, OUTLET_READINGS
+from topology import (Topology, INLET_COUNT, OUTLET_COUNT, TOPOLOGY_COLUMNS, SENSOR_COLUMNS)
+from poll_schedule import GROUPS, VOLTAGE, CONFIG, STATE, CURRENT
 
-class SNMPClient:
-    def __init__(self):
-        # Load configuration from config.py
-        self.pdu_ip = config.SNMP_HOST
-        self.community = config.SNMP_COMMUNITY
-        self.port = config.SNMP_PORT
-        self.snmp_version = config.SNMP_VERSION
-        self.pdu_model = config.PDU_MODEL
-        self.num_outlets = config.PDU_OUTLETS
+
+def v3_user_from_config() -> Optional[V3User]:
+    """The SNMPv3 user configured in .env (None unless SNMP_VERSION is 3)"""
+    if str(config.SNMP_VERSION) != "3":
+        return None
+    return V3User(
+        user=config.SNMP_V3_USER,
+        auth_protocol=config.SNMP_V3_AUTH_PROTOCOL,
+        auth_key=config.SNMP_V3_AUTH_KEY,
+        priv_protocol=config.SNMP_V3_PRIV_PROTOCOL,
+        priv_key=config.SNMP_V3_PRIV_KEY,
+        context=config.SNMP_V3_CONTEXT
+    )
+
+
+class BaseSNMPClient:
+    """PX3 OIDs, state values and response building shared by the sync and async clients"""
+    
+    def __init__(self, device=None):
+        if device is None:
+            # Load configuration from config.py
+            self.device_id = config.DEVICE_ID
+            self.pdu_ip = config.SNMP_HOST
+            self.community = config.SNMP_COMMUNITY
+            self.port = config.SNMP_PORT
+            self.snmp_version = config.SNMP_VERSION
+            self.v3_user = v3_user_from_config()
+            self.pdu_model = config.PDU_MODEL
+            self.num_outlets = config.PDU_OUTLETS
+        else:
+            # Per-device settings from the fleet configuration
+            self.device_id = device.id
+            self.pdu_ip = device.host
+            self.community = device.community
+            self.port = device.port
+            self.snmp_version = device.version
+            self.v3_user = device.v3
+            self.pdu_model = device.model
+            self.num_outlets = device.outlets
         
         # Raritan PDU OIDs for PX3 model
         # Reference: Raritan PX3 MIB documentation
@@ -21,82 +57,272 @@ class SNMPClient:
             "outlet_state": ".1.3.6.1.4.1.13742.6.4.1.2.1.3",  # + .pdu.outlet
             "outlet_control": ".1.3.6.1.4.1.13742.6.4.1.2.1.2",  # + .pdu.outlet
             "inlet_voltage": ".1.3.6.1.4.1.13742.6.5.2.3.1.4",  # + .pdu.inlet.sensor
-            "outlet_current": ".1.3.6.1.4.1.13742.6.5.2.3.1.4"  # + .pdu.outlet.sensor
+            "outlet_current": ".1.3.6.1.4.1.13742.6.5.4.3.1.4"  # + .pdu.outlet.sensor
         }
         
-        # State values for Raritan PDUs
+        # Values written to outletSwitchingOperation (PDU2-MIB: off(0), on(1), cycle(2))
         self.states = {
-            "on": 1,  # Note: 7 is also considered 'on' in get_outlet_state
+            "on": 1,
             "off": 0,
             "cycle": 2  # Power cycle operation
         }
         
-        # Sensor types
+        # Values read from outletSwitchingState (PDU2-MIB: on(7), off(8))
+        self.switching_states = {
+            7: "on",
+            8: "off"
+        }
+        
+        # Sensor types (PDU2-MIB SensorTypeEnumeration): inlet voltage, then the outlet readings
         self.sensor_types = {
-            "voltage": 4,  # RMS Voltage
-            "current": 5   # RMS Current
+            "voltage": 4,        # rmsVoltage
+            "current": 1,        # rmsCurrent
+            "power": 5,          # activePower
+            "apparentPower": 6   # apparentPower
         }
         
+        # Every OID this client uses, formatted once
+        self.oid_table = OutletOidTable(self.oids, self.sensor_types, self.num_outlets)
+        
+        # Decimal digits, units and availability of the sensors read above
+        self.sensors = SensorMetadata(self.sensor_types["voltage"], self.sensor_types, config.SENSOR_METADATA_TTL)
+        
+        # Inlets, outlets and sensor types found on the PDU (None until discovered)
+        self.topology: Optional[Topology] = None
+        
+    def _decode_state(self, value) -> Optional[str]:
+        """"on"/"off" for an outletSwitchingState value, None for any other value"""
+        return self.switching_states.get(to_native(value))
+    
+    def _build_outlet(self, outlet_id: str, state_value, voltage_value,
+                      readings: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the outlet dictionary returned by the API from raw SNMP values.
+        
+        readings maps outlet readings (current A, power W, apparentPower VA) to
+        their raw values; readings not read or not reported are None.
+        """
+        outlet_num = int(outlet_id)
+        outlet = {
+            "id": outlet_id,
+            "name": self.topology.outlet_name(outlet_num) if self.topology else f"Outlet {outlet_id}",
+            "state": self._decode_state(state_value) or "unknown",
+            # None when the PDU did not report the reading
+            "voltage": self.sensors.voltage(voltage_value)
+        }
+        for field in OUTLET_READINGS:
+            outlet[field] = self.sensors.reading(outlet_num, field, readings.get(field))
+        outlet["lastUpdated"] = datetime.now().isoformat()
+        return outlet
+    
+    def _metadata_outlets(self, outlet_nums: List[int]) -> List[int]:
+        """Outlets to load sensor metadata for: the requested and all known ones"""
+        if self.topology is not None and self.topology.outlets:
+            return sorted(set(outlet_nums) | set(self.topology.outlets))
+        return sorted(set(outlet_nums) | set(self.oid_table.readings))
+    
+    def _set_topology(self, topology: Topology) -> None:
+        self.topology = topology
+        for outlet_num in topology.outlet_nums():
+            self.oid_table.state_oid(outlet_num)
+        # Outlets may have been added or removed
+        self.sensors.invalidate()
+        print(f"Discovered {self.pdu_ip}: {len(topology.inlets)} inlet(s), {len(topology.outlets)} outlet(s), "
+              f"{len(topology.outlet_sensors)} outlet sensor type(s)")
+    
+    def _outlet_fields(self) -> List[str]:
+        """The outlet readings whose sensors the PDU's outlets have (all of them if it does not say)"""
+        fields = self.oid_table.outlet_fields
+        if self.topology is None or not self.topology.outlet_sensors:
+            return fields
+        return [field for field in fields if self.sensor_types[field] in self.topology.outlet_sensors]
+    
+    def _outlets_from_poll(self, outlet_nums: List[int], values: List[Optional[Any]],
+                           fields: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Outlets from a poll_oids() response; None if the PDU's outlet count changed"""
+        voltage_value, outlet_count = values[0], values[1]
+        if self.topology.changed(outlet_count):
+            return None
+        step = 1 + len(fields)
+        outlets = []
+        for position, outlet_num in enumerate(outlet_nums):
+            start = 2 + position * step
+            readings = dict(zip(fields, values[start + 1:start + step]))
+            outlets.append(self._build_outlet(str(outlet_num), values[start], voltage_value, readings))
+        return outlets
+    
+    def _outlets_from_readings(self, outlet_nums: List[int], states: Dict[Tuple[int, ...], Any],
+                               values: List[Optional[Any]], fields: List[str]) -> List[Dict[str, Any]]:
+        """Outlets from walked states and a readings_oids() response"""
+        voltage_value = values[0]
+        outlets = []
+        for position, outlet_num in enumerate(outlet_nums):
+            start = 1 + position * len(fields)
+            readings = dict(zip(fields, values[start:start + len(fields)]))
+            outlets.append(self._build_outlet(str(outlet_num), states.get((outlet_num,)), voltage_value, readings))
+        return outlets
+    
+    def _poll_groups(self, groups: List[str]) -> List[str]:
+        """The due groups this PDU can answer, in GROUPS order"""
+        return [group for group in GROUPS if group in groups and (group != CURRENT or self._outlet_fields())]
+    
+    def _outlets_from_groups(self, groups: List[str], outlet_nums: List[int],
+                             values: List[Optional[Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Partial outlets (id and the fields the groups provide) from a group_oids() response.
+        
+        Values that could not be read are left out, so the last known ones are
+        kept. None if the PDU's outlet count changed.
+        """
+        now = datetime.now().isoformat()
+        outlets = {num: {"id": str(num), "lastUpdated": now} for num in outlet_nums}
+        position = 0
+        for group in groups:
+            if group == VOLTAGE:
+                voltage = self.sensors.voltage(values[position])
+                if voltage is not None:
+                    for outlet in outlets.values():
+                        outlet["voltage"] = voltage
+                position += 1
+            elif group == CONFIG:
+                if self.topology.changed(values[position]):
+                    return None
+                for num, value in zip(outlet_nums, values[position + 1:]):
+                    entry = self.topology.outlets.get(num)
+                    if entry is not None and value is not None:
+                        entry["name"] = to_native(value) or ""
+                    outlets[num]["name"] = self.topology.outlet_name(num)
+                position += 1 + len(outlet_nums)
+            elif group == STATE:
+                for num, value in zip(outlet_nums, values[position:]):
+                    if value is not None:
+                        outlets[num]["state"] = self._decode_state(value) or "unknown"
+                position += len(outlet_nums)
+            elif group == CURRENT:
+                fields = self._outlet_fields()
+                for num in outlet_nums:
+                    for field, value in zip(fields, values[position:position + len(fields)]):
+                        reading = self.sensors.reading(num, field, value)
+                        if reading is not None:
+                            outlets[num][field] = reading
+                    position += len(fields)
+        return list(outlets.values())
+    
+    def _state_oid(self, outlet_num: int) -> str:
+        return self.oid_table.state_oid(outlet_num)
+    
+    def _inlet_voltage_oid(self) -> str:
+        return self.oid_table.inlet_voltage
+    
+    def _current_oid(self, outlet_num: int) -> str:
+        return self.oid_table.current_oid(outlet_num)
+    
+    def _control_oid(self, outlet_num: int) -> str:
+        return self.oid_table.control_oid(outlet_num)
+
+
+class SNMPClient(BaseSNMPClient):
+    """Blocking SNMP client for scripts and the command line.
+
+    Every call waits for the PDU, and toggle_outlet/cycle_outlet sleep with
+    time.sleep while the outlet switches. Do not call it from the event loop;
+    the agent uses AsyncSNMPClient.
+    """
+
+    def __init__(self, device=None):
+        super().__init__(device)
+        
+        # One long-lived session (engine, credentials, transport) per PDU
+        self.session = SNMPSession(
+            host=self.pdu_ip,
+            port=self.port,
+            community=self.community,
+            version=self.snmp_version,
+            timeout=config.SNMP_TIMEOUT,
+            retries=config.SNMP_RETRIES,
+            name=self.device_id,
+            v3_user=self.v3_user
+        )
+        self.session.var_binds.precompile(self.oid_table.read_oids())
+        
     def get_outlet_state(self, outlet_id: str) -> Dict[str, Any]:
-        """Get the state of an outlet"""
+        """Get the state of an outlet (raises if it cannot be read)"""
         try:
             # Convert outlet_id to integer for OID
             outlet_num = int(outlet_id)
+            self.refresh_sensor_metadata([outlet_num])
             
-            # Get outlet state
-            state_oid = f"{self.oids['outlet_state']}.1.{outlet_num}"
-            state_value = self._snmp_get(state_oid)
-            
-            # Get voltage (from inlet)
-            voltage_oid = f"{self.oids['inlet_voltage']}.1.1.{self.sensor_types['voltage']}"
-            voltage_value = self._snmp_get(voltage_oid)
-            
-            # Get current for this outlet
-            current_oid = f"{self.oids['outlet_current']}.1.{outlet_num}.{self.sensor_types['current']}"
-            current_value = self._snmp_get(current_oid)
+            # State, inlet voltage and the outlet readings in a single multi-varbind GET
+            fields = self._outlet_fields()
+            state_value, voltage_value, *values = self.session.get_chunked([
+                self._state_oid(outlet_num),
+                self._inlet_voltage_oid()
+            ] + self.oid_table.reading_oids(outlet_num, fields), config.SNMP_MAX_VARBINDS)
             
-            # Map numeric state to string
-            state_str = "on" if state_value == self.states["on"] else "off"
-            
-            return {
-                "id": outlet_id,
-                "name": f"Outlet {outlet_id}",
-                "state": state_str,
-                "voltage": voltage_value or 120,  # Default if not available
-                "current": current_value or 0,    # Default if not available
-                "lastUpdated": datetime.now().isoformat()
-            }
+            return self._build_outlet(outlet_id, state_value, voltage_value, dict(zip(fields, values)))
         except Exception as e:
+            # Never answer with made-up readings
             print(f"Error getting outlet state: {e}")
-            # Fallback to placeholder data
-            return {
-                "id": outlet_id,
-                "name": f"Outlet {outlet_id}",
-                "state": "unknown",
-                "voltage": 120,
-                "current": 0,
-                "lastUpdated": datetime.now().isoformat(),
-                "error": str(e)
-            }
+            raise
     
     def get_all_outlets(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Get all outlets"""
+        """Get all outlets of the discovered topology in multi-varbind reads (raises if they cannot be read)"""
         try:
-            print(f"Getting all outlets (1-{self.num_outlets})")
-            outlets = []
-            for outlet_num in range(1, self.num_outlets + 1):
-                print(f"Fetching outlet {outlet_num} of {self.num_outlets}")
-                outlet = self.get_outlet_state(str(outlet_num))
-                outlets.append(outlet)
-            return {"outlets": outlets}
+            print(f"Getting all outlets from {self.pdu_ip}")
+            
+            outlets = None
+            for attempt in range(2):
+                if self.topology is None:
+                    self.discover()
+                if not self.topology.outlets:
+                    # No configuration tables: find the outlets by walking their states
+                    outlets = self._walk_outlets()
+                    break
+                outlets = self._poll_outlets()
+                if outlets is not None:
+                    break
+                print(f"Outlet count of {self.pdu_ip} changed, rediscovering")
+                self.topology = None
+            return {"outlets": outlets or []}
         except Exception as e:
+            # Never answer with made-up readings
             print(f"Error getting all outlets: {e}")
-            # Fallback to placeholder data
-            return {"outlets": [
-                {"id": "1", "name": "Outlet 1", "state": "on", "voltage": 120, "current": 5},
-                {"id": "2", "name": "Outlet 2", "state": "off", "voltage": 120, "current": 0},
-                {"id": "3", "name": "Outlet 3", "state": "on", "voltage": 120, "current": 3},
-            ]}
+            raise
+    
+    def discover(self) -> Topology:
+        """Walk the PDU's configuration tables once and cache its topology"""
+        counts = self.session.get_chunked([INLET_COUNT, OUTLET_COUNT], config.SNMP_MAX_VARBINDS)
+        tables = self.session.bulk_walk(TOPOLOGY_COLUMNS, config.SNMP_MAX_REPETITIONS)
+        sensors = self.session.bulk_walk(SENSOR_COLUMNS, config.SNMP_MAX_REPETITIONS)
+        topology = Topology.from_snmp(counts, tables, sensors)
+        self._set_topology(topology)
+        return topology
+    
+    def _poll_outlets(self) -> Optional[List[Dict[str, Any]]]:
+        """Read every known outlet (and the outlet count) in as few PDUs as possible"""
+        outlet_nums = self.topology.outlet_nums()
+        fields = self._outlet_fields()
+        self.refresh_sensor_metadata(outlet_nums)
+        values = self.session.get_chunked(self.oid_table.poll_oids(outlet_nums, fields), config.SNMP_MAX_VARBINDS)
+        return self._outlets_from_poll(outlet_nums, values, fields)
+    
+    def _walk_outlets(self) -> List[Dict[str, Any]]:
+        """Walk the outletSwitchingState column, then read voltage and the outlet readings"""
+        state_column = self.oid_table.state_column
+        states = self.session.bulk_walk([state_column], config.SNMP_MAX_REPETITIONS)[state_column]
+        outlet_nums = sorted(index[0] for index in states) or list(range(1, self.num_outlets + 1))
+        self.refresh_sensor_metadata(outlet_nums)
+        
+        # Inlet voltage once per poll, then every outlet's readings, packed into as few PDUs as possible
+        fields = self._outlet_fields()
+        values = self.session.get_chunked(self.oid_table.readings_oids(outlet_nums, fields), config.SNMP_MAX_VARBINDS)
+        return self._outlets_from_readings(outlet_nums, states, values, fields)
+    
+    def refresh_sensor_metadata(self, outlet_nums: List[int], force: bool = False) -> None:
+        """Load sensor digits/units/availability when the cache is empty, expired or incomplete"""
+        if not force and not self.sensors.needs_refresh(outlet_nums):
+            return
+        outlet_nums = self._metadata_outlets(outlet_nums)
+        values = self.session.get_chunked(self.sensors.request_oids(outlet_nums), config.SNMP_MAX_VARBINDS)
+        self.sensors.update(outlet_nums, values)
     
     def toggle_outlet(self, outlet_id: str) -> Dict[str, Any]:
         """Toggle an outlet (on->off or off->on)"""
@@ -104,6 +330,10 @@ class SNMPClient:
             # Get current state
             outlet_info = self.get_outlet_state(outlet_id)
             current_state = outlet_info["state"]
+            if current_state not in ("on", "off"):
+                # Without a known state there is no opposite to switch to
+                return dict(outlet_info, message="Failed to toggle outlet",
+                            error=outlet_info.get("error", "Could not read current outlet state"))
             
             # Determine new state (opposite of current)
             new_state = "off" if current_state == "on" else "on"
@@ -112,7 +342,7 @@ class SNMPClient:
             outlet_num = int(outlet_id)
             
             # Set the new state
-            control_oid = f"{self.oids['outlet_control']}.1.{outlet_num}"
+            control_oid = self._control_oid(outlet_num)
             success = self._snmp_set(control_oid, Integer, self.states[new_state])
             
             if success:
@@ -148,7 +378,7 @@ class SNMPClient:
             
             # Send cycle command using the correct OID format for Raritan PDU
             # Format: .1.3.6.1.4.1.13742.6.4.1.2.1.2.1.<outlet_number>
-            control_oid = f"{self.oids['outlet_control']}.1.{outlet_num}"
+            control_oid = self._control_oid(outlet_num)
             print(f"Cycling outlet {outlet_id} using OID: {control_oid}")
             success = self._snmp_set(control_oid, Integer, self.states["cycle"])
             
@@ -180,27 +410,7 @@ class SNMPClient:
     def _snmp_get(self, oid: str) -> Optional[Any]:
         """Perform an SNMP GET operation"""
         try:
-            error_indication, error_status, error_index, var_binds = next(
-                getCmd(
-                    SnmpEngine(),
-                    CommunityData(self.community),
-                    UdpTransportTarget((self.pdu_ip, self.port)),
-                    ContextData(),
-                    ObjectType(ObjectIdentity(oid))
-                )
-            )
-            
-            if error_indication:
-                print(f"SNMP GET Error: {error_indication}")
-                return None
-            elif error_status:
-                print(f"SNMP GET Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
-                return None
-            else:
-                # Extract the value from the response
-                for var_bind in var_binds:
-                    return var_bind[1]
-            return None
+            return self.session.get(oid)
         except Exception as e:
             print(f"Error in SNMP GET: {e}")
             return None
@@ -208,24 +418,12 @@ class SNMPClient:
     def _snmp_set(self, oid: str, value_type, value) -> bool:
         """Perform an SNMP SET operation"""
         try:
-            error_indication, error_status, error_index, var_binds = next(
-                setCmd(
-                    SnmpEngine(),
-                    CommunityData(self.community),
-                    UdpTransportTarget((self.pdu_ip, self.port)),
-                    ContextData(),
-                    ObjectType(ObjectIdentity(oid), value_type(value))
-                )
-            )
-            
-            if error_indication:
-                print(f"SNMP SET Error: {error_indication}")
-                return False
-            elif error_status:
-                print(f"SNMP SET Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
-                return False
-            else:
-                return True
+            return self.session.set(oid, value_type(value))
         except Exception as e:
             print(f"Error in SNMP SET: {e}")
             return False
+    
+    def close(self) -> None:
+        """Close the underlying SNMP session"""
+        self.session.close()
+
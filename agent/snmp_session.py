@@ -0,0 +1,222 @@
+from pysnmp.hlapi import *
+from pysnmp.proto import errind
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import time
+import metrics
+from oid_table import VarBindCache
+from resilience import DeviceUnreachable
+from snmp_auth import V3User, EngineDiscovery, auth_data, context_data
+
+
+class SNMPSession:
+    """Long-lived SNMP session for a single PDU.
+
+    Owns one SnmpEngine, one set of credentials and one pre-resolved transport
+    target so that repeated GET/SET requests only pay for the wire round trip.
+    Reads that get no answer after the transport's retries raise
+    DeviceUnreachable, like the asyncio session.
+    """
+
+    def __init__(self, host: str, port: int = 161, community: str = "public",
+                 version: str = "2c", timeout: float = 1.0, retries: int = 3,
+                 name: Optional[str] = None, v3_user: Optional[V3User] = None):
+        self.host = host
+        # Device label used for metrics
+        self.name = name or host
+        self.port = port
+        self.community = community
+        self.version = version
+        self.timeout = timeout
+        self.retries = retries
+
+        self.engine = SnmpEngine()
+        self.v3_user = v3_user if str(version) == "3" else None
+        self.auth_data = auth_data(version, community, self.v3_user)
+        # The transport target resolves the host name once, here
+        self.transport_target = UdpTransportTarget((host, port), timeout=timeout, retries=retries)
+        # SETs are never retransmitted: a lost response does not mean the PDU did not
+        # apply it, and a repeated cycle would cycle twice
+        self.set_target = copy.copy(self.transport_target)
+        self.set_target.retries = 0
+        self.context_data = context_data(self.v3_user)
+        # Resolved var-binds per OID, reused by every request
+        self.var_binds = VarBindCache(self.engine)
+        # SNMPv3 engine ID and time discovery is cached by the engine; watch it per PDU
+        self.discovery = EngineDiscovery.of(self.engine) if self.v3_user is not None else None
+        self._closed = False
+
+    def get(self, oid: str) -> Optional[Any]:
+        """Perform an SNMP GET for a single OID and return its value"""
+        var_binds = self.get_many([oid])
+        if not var_binds:
+            return None
+        return value_or_none(var_binds[0][1])
+
+    def get_many(self, oids: List[str]) -> List[Tuple[Any, Any]]:
+        """Perform an SNMP GET for several OIDs and return the var-binds"""
+        if self._closed:
+            raise RuntimeError(f"SNMP session for {self.host} is closed")
+
+        started = time.perf_counter()
+        error_indication, error_status, error_index, var_binds = next(
+            getCmd(
+                self.engine,
+                self.auth_data,
+                self.transport_target,
+                self.context_data,
+                *self.var_binds.get(oids),
+                lookupMib=False
+            )
+        )
+        metrics.record_snmp(self.name, "get", oids, time.perf_counter() - started, error_indication, error_status)
+
+        if isinstance(error_indication, errind.RequestTimedOut):
+            raise DeviceUnreachable(self.host, f"no response after {self.retries + 1} attempt(s)")
+        if error_indication:
+            print(f"SNMP GET Error: {error_indication}")
+            return []
+        elif error_status:
+            print(f"SNMP GET Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
+            return []
+        return list(var_binds)
+
+    def get_chunked(self, oids: List[str], max_varbinds: int) -> List[Optional[Any]]:
+        """GET many OIDs using as few multi-varbind PDUs as the size limit allows.
+
+        Returns the values in the same order as the OIDs; missing instances and
+        failed chunks come back as None.
+        """
+        values: List[Optional[Any]] = []
+        for start in range(0, len(oids), max_varbinds):
+            chunk = oids[start:start + max_varbinds]
+            var_binds = self.get_many(chunk)
+            if not var_binds:
+                values.extend([None] * len(chunk))
+                continue
+            values.extend(value_or_none(value) for _, value in var_binds)
+        return values
+
+    def bulk_walk(self, columns: List[str], max_repetitions: int = 25) -> Dict[str, Dict[Tuple[int, ...], Any]]:
+        """Walk one or more table columns with GETBULK.
+
+        All columns are requested in the same PDUs. The result maps each column
+        OID to {index suffix: value} for the rows that belong to that column.
+        """
+        if self._closed:
+            raise RuntimeError(f"SNMP session for {self.host} is closed")
+
+        results: Dict[str, Dict[Tuple[int, ...], Any]] = {column: {} for column in columns}
+        # Numeric prefixes used to match returned OIDs back to their column
+        prefix_tuples = [tuple(int(part) for part in column.strip(".").split(".")) for column in columns]
+        next_oids: List[Any] = [self.var_binds.identity(column) for column in columns]
+        active = list(range(len(columns)))
+
+        while active:
+            # The sync bulkCmd generator yields one row per iteration and sends
+            # the next GETBULK once a response's rows are used up. maxCalls=1
+            # stops it after one response, so each pass is exactly one PDU and
+            # its metrics are recorded once; the walk continues from the last
+            # row of each column.
+            started = time.perf_counter()
+            error_indication, error_status, error_index = None, 0, 0
+            rows = []
+            for error_indication, error_status, error_index, var_binds in bulkCmd(
+                    self.engine,
+                    self.auth_data,
+                    self.transport_target,
+                    self.context_data,
+                    0, max_repetitions,
+                    *[ObjectType(next_oids[col]) for col in active],
+                    lexicographicMode=True,
+                    maxCalls=1,
+                    lookupMib=False):
+                if error_indication or error_status:
+                    break
+                rows.append(var_binds)
+            metrics.record_snmp(self.name, "getbulk", [columns[col] for col in active],
+                                time.perf_counter() - started, error_indication, error_status)
+
+            if isinstance(error_indication, errind.RequestTimedOut):
+                raise DeviceUnreachable(self.host, f"no response after {self.retries + 1} attempt(s)")
+            if error_indication:
+                print(f"SNMP GETBULK Error: {error_indication}")
+                break
+            elif error_status:
+                print(f"SNMP GETBULK Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
+                break
+            if not rows:
+                break
+
+            finished = set()
+            last_names: Dict[int, Any] = {}
+            for row in rows:
+                for col, (name, value) in zip(active, row):
+                    if col in finished:
+                        continue
+                    oid = tuple(name)
+                    prefix = prefix_tuples[col]
+                    # Columns of different length: stop at the end of this column
+                    if oid[:len(prefix)] != prefix or value_or_none(value) is None:
+                        finished.add(col)
+                        continue
+                    results[columns[col]][oid[len(prefix):]] = value
+                    last_names[col] = name
+            for col, name in last_names.items():
+                next_oids[col] = ObjectIdentity(name)
+            active = [col for col in active if col not in finished]
+
+        return results
+
+    def set(self, oid: str, value: Any) -> bool:
+        """Perform an SNMP SET for a single OID with an already typed value"""
+        if self._closed:
+            raise RuntimeError(f"SNMP session for {self.host} is closed")
+
+        started = time.perf_counter()
+        error_indication, error_status, error_index, var_binds = next(
+            setCmd(
+                self.engine,
+                self.auth_data,
+                self.set_target,
+                self.context_data,
+                ObjectType(self.var_binds.identity(oid), value),
+                lookupMib=False
+            )
+        )
+        metrics.record_snmp(self.name, "set", [oid], time.perf_counter() - started, error_indication, error_status)
+
+        if error_indication:
+            print(f"SNMP SET Error: {error_indication}")
+            return False
+        elif error_status:
+            print(f"SNMP SET Error: {error_status.prettyPrint()} at {var_binds[int(error_index) - 1][0] if error_index else '?'}")
+            return False
+        return True
+
+    def usm_stats(self) -> Optional[Dict[str, Any]]:
+        """SNMPv3 user and the engine discovered for this PDU (None for v1/v2c)"""
+        if self.discovery is None:
+            return None
+        stats = self.v3_user.to_dict()
+        stats.update(self.discovery.stats(self.transport_target.transportAddr))
+        return stats
+
+    def close(self) -> None:
+        """Release the transport sockets held by the engine"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.engine.transportDispatcher.closeDispatcher()
+        except Exception:
+            # The dispatcher is only created on first use
+            pass
+
+
+def value_or_none(value: Any) -> Optional[Any]:
+    """Map the SNMPv2 exception values (noSuchInstance etc.) to None"""
+    if isinstance(value, (NoSuchInstance, NoSuchObject, EndOfMibView)):
+        return None
+    return value
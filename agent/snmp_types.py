@@ -0,0 +1,84 @@
+"""Conversion of pysnmp values to native Python types for JSON serialization.
+
+The converter for a value is chosen once per concrete class (a walk of its
+MRO against a small dispatch table) and cached, so converting a response is
+one dict lookup and one int()/str() call per value.
+"""
+from typing import Any, Callable, Dict, Optional
+from pyasn1.type import univ
+from pysnmp.proto import rfc1902
+
+
+def _none(value: Any) -> None:
+    return None
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _pretty(value: Any) -> str:
+    return value.prettyPrint()
+
+
+# Checked along each class's MRO, most specific entries first
+_BASE_CONVERTERS = (
+    # Null also covers noSuchObject, noSuchInstance and endOfMibView
+    (univ.Null, _none),
+    (rfc1902.IpAddress, _pretty),
+    (rfc1902.Bits, _pretty),
+    (rfc1902.Opaque, _pretty),
+    (univ.Integer, int),
+    (univ.OctetString, str),
+    (univ.ObjectIdentifier, str),
+)
+
+_converters: Dict[type, Callable[[Any], Any]] = {
+    int: _identity,
+    float: _identity,
+    str: _identity,
+    bool: _identity,
+    type(None): _identity,
+}
+
+
+def _converter_for(cls: type) -> Callable[[Any], Any]:
+    converter = _converters.get(cls)
+    if converter is None:
+        converter = _identity
+        for base in cls.__mro__:
+            match = next((func for asn1_type, func in _BASE_CONVERTERS if base is asn1_type), None)
+            if match is not None:
+                converter = match
+                break
+        _converters[cls] = converter
+    return converter
+
+
+def to_native(value: Any) -> Any:
+    """A single SNMP value as int, str or None (native values pass through)"""
+    return _converter_for(value.__class__)(value)
+
+
+def scaled(value: Any, digits: int) -> Optional[float]:
+    """An integer sensor reading with `digits` implied decimal places as a float"""
+    value = to_native(value)
+    if value is None:
+        return None
+    if not digits:
+        return value
+    return round(value / 10 ** digits, digits)
+
+
+def convert_snmp_types(data: Any) -> Any:
+    """Convert SNMP-specific types to standard Python types for JSON serialization"""
+    cls = data.__class__
+    if cls is dict:
+        return {key: convert_snmp_types(value) for key, value in data.items()}
+    if cls is list:
+        return [convert_snmp_types(item) for item in data]
+    if isinstance(data, dict):
+        return {key: convert_snmp_types(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [convert_snmp_types(item) for item in data]
+    return _converter_for(cls)(data)
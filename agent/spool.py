@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class ReadingSpool:
+    """Durable, bounded on-disk FIFO for readings waiting to be written to Supabase.
+
+    Backed by a single SQLite table in WAL mode. Readings survive restarts and
+    are removed only after a successful upload. When more than max_rows are
+    queued, the oldest ones are dropped so disk usage stays bounded. Records
+    Supabase rejects outright are moved to a dead_letter table (bounded the
+    same way) instead of blocking the ones behind them.
+    """
+
+    def __init__(self, path: str, max_rows: int = 1000000):
+        self.path = path
+        self.max_rows = max_rows
+        self.dropped = 0
+        self.dead_lettered = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " reason TEXT)"
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def append(self, kind: str, payload: Dict[str, Any]) -> None:
+        """Persist one record; kind names the Supabase table it belongs to"""
+        self.extend(kind, [payload])
+
+    def extend(self, kind: str, payloads: List[Dict[str, Any]]) -> None:
+        """Persist several records of the same kind in one transaction"""
+        if not payloads:
+            return
+        now = time.time()
+        rows = [(now, kind, json.dumps(payload)) for payload in payloads]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO spool (created_at, kind, payload) VALUES (?, ?, ?)", rows)
+            self._count += len(rows)
+            overflow = self._count - self.max_rows
+            if overflow > 0:
+                # Drop the oldest records to keep the spool bounded
+                self._conn.execute(
+                    "DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)", (overflow,)
+                )
+                self._count -= overflow
+                self.dropped += overflow
+            self._conn.execute("COMMIT")
+
+    def peek(self, limit: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Return up to limit of the oldest records as (id, kind, payload)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, payload FROM spool ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row_id, kind, json.loads(payload)) for row_id, kind, payload in rows]
+
+    def ack(self, ids: List[int]) -> None:
+        """Remove records that were uploaded successfully"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id in ids])
+            self._conn.execute("COMMIT")
+            self._count = max(0, self._count - len(ids))
+
+    def dead_letter(self, records: List[Tuple[int, str, Dict[str, Any]]], reason: str) -> None:
+        """Move records that can never be uploaded out of the spool, keeping them for inspection"""
+        if not records:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id, _, _ in records])
+            self._conn.executemany(
+                "INSERT INTO dead_letter (created_at, kind, payload, reason) VALUES (?, ?, ?, ?)",
+                [(now, kind, json.dumps(payload), reason) for _, kind, payload in records]
+            )
+            self._conn.execute(
+                "DELETE FROM dead_letter WHERE id IN (SELECT id FROM dead_letter ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,)
+            )
+            self._conn.execute("COMMIT")
+            self._count = max(0, self._count - len(records))
+            self.dead_lettered += len(records)
+
+    def dead_letters(self, limit: int = 100) -> List[Tuple[str, Dict[str, Any], str]]:
+        """Return up to limit of the newest dead-lettered records as (kind, payload, reason)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, payload, reason FROM dead_letter ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [(kind, json.loads(payload), reason) for kind, payload, reason in rows]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def oldest_age(self) -> Optional[float]:
+        """Seconds since the oldest pending record was spooled (the upload lag)"""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(created_at) FROM spool").fetchone()
+        if row is None or row[0] is None:
+            return None
+        return time.time() - row[0]
+
+    def size_bytes(self) -> int:
+        """Size of the spool database and its WAL on disk"""
+        total = 0
+        for suffix in ("", "-wal"):
+            try:
+                total += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return total
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
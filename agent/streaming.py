@@ -0,0 +1,95 @@
+import asyncio
+import json
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+
+class OutletSubscriber:
+    """One connected stream client with a bounded queue of pending events"""
+
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # Set when the client fell behind; it gets a fresh full snapshot instead of the missed diffs
+        self.needs_resync = False
+        self.dropped = 0
+
+
+class OutletStream:
+    """Fans out per-outlet diffs of one poller to stream subscribers.
+
+    Each subscriber has a bounded queue. A client that cannot keep up does not
+    grow memory: its queue is cleared and it is resynchronised with a single
+    full snapshot once it catches up.
+    """
+
+    def __init__(self, poller, max_queue: int = 100, heartbeat: float = 15.0):
+        self.poller = poller
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.subscribers: List[OutletSubscriber] = []
+        poller.change_listeners.append(self._on_change)
+
+    def _on_change(self, snapshot, changed: List[Dict[str, Any]]) -> None:
+        self.publish("diff", {"version": snapshot.version, "outlets": changed})
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Queue an event for every subscriber"""
+        for subscriber in self.subscribers:
+            if subscriber.needs_resync:
+                continue
+            try:
+                subscriber.queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and resync it from the next snapshot
+                subscriber.dropped += subscriber.queue.qsize() + 1
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.needs_resync = True
+
+    def _snapshot_event(self) -> str:
+        snapshot = self.poller.snapshot
+        if snapshot is None:
+            return format_sse("snapshot", {"version": 0, "outlets": []})
+        return format_sse("snapshot", {"version": snapshot.version, "outlets": snapshot.outlets})
+
+    async def events(self, is_disconnected) -> AsyncIterator[str]:
+        """Yield SSE frames: one full snapshot on connect, then per-outlet diffs and operation updates"""
+        subscriber = OutletSubscriber(self.max_queue)
+        self.subscribers.append(subscriber)
+        try:
+            if self.poller.snapshot is None:
+                try:
+                    await self.poller.get_snapshot()
+                except Exception as e:
+                    print(f"Error reading initial snapshot for stream: {e}")
+            yield self._snapshot_event()
+
+            while not await is_disconnected():
+                if subscriber.needs_resync:
+                    subscriber.needs_resync = False
+                    yield self._snapshot_event()
+                    continue
+                try:
+                    event, data = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # SSE comment keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            self.subscribers.remove(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "dropped": sum(subscriber.dropped for subscriber in self.subscribers)
+        }
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Format one Server-Sent Events frame"""
+    if event_id is None and isinstance(data, dict) and "version" in data:
+        event_id = data["version"]
+    frame = f"event: {event}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -1,9 +1,20 @@
-import os
 import requests
-import json
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
 import config
+from spool import ReadingSpool
+from change_filter import ReadingFilter
+from energy import outlet_power
+import metrics
 from datetime import datetime
+from urllib.parse import quote
+import rollups
+
+# Rows per request when reading a time range (PostgREST's default max-rows is 1000)
+RANGE_PAGE_SIZE = 1000
+# 4xx statuses that are not about the rows themselves (auth, missing table, throttling): retried, never dead-lettered
+RETRYABLE_STATUSES = (401, 403, 404, 408, 429)
 
 class SupabaseClient:
     def __init__(self):
@@ -12,6 +23,37 @@ class SupabaseClient:
         self.supabase_key = config.SUPABASE_SERVICE_KEY
         self._connected = False
         
+        # One pooled keep-alive session for every REST call
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=config.SUPABASE_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "apikey": self.supabase_key or "",
+            "Authorization": f"Bearer {self.supabase_key}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation"
+        })
+        
+        # agent_id / device_id never change while we run, resolve them once
+        self._id_lock = threading.Lock()
+        self._agent_id: Optional[str] = None
+        self._device_ids: Dict[str, str] = {}
+        
+        # Every record goes to the on-disk spool first and is drained in bulk by a background thread
+        self.spool = ReadingSpool(config.SPOOL_PATH, max_rows=config.SPOOL_MAX_ROWS)
+        # Only changed readings (beyond the deadbands) and heartbeat keyframes are written
+        self.readings = ReadingFilter(
+            {"voltage": config.READING_DEADBAND_VOLTAGE, "current": config.READING_DEADBAND_CURRENT},
+            config.READING_HEARTBEAT
+        )
+        self._backoff = 0.0
+        self._last_flush: Optional[str] = None
+        self._last_error: Optional[str] = None
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._writer_thread: Optional[threading.Thread] = None
+        
         # Check if we have the required configuration
         if self.supabase_url and self.supabase_key:
             self._connected = self._test_connection()
@@ -30,28 +72,83 @@ class SupabaseClient:
             print(f"Supabase connection test failed: {e}")
             return False
     
-    def _request(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None) -> requests.Response:
-        """Make a request to the Supabase REST API"""
+    def _request(self, method: str, endpoint: str, data: Optional[Any] = None,
+                 headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Make a request to the Supabase REST API over the pooled session"""
+        if method not in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        
         url = f"{self.supabase_url}/rest/v1/{endpoint}"
-        headers = {
-            "apikey": self.supabase_key,
-            "Authorization": f"Bearer {self.supabase_key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation"
+        table = endpoint.split("?", 1)[0]
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, url,
+                json=data if method not in ("GET", "DELETE") else None,
+                headers=headers,
+                timeout=config.SUPABASE_TIMEOUT
+            )
+        except requests.RequestException:
+            metrics.supabase_errors.labels(method, table).inc()
+            raise
+        finally:
+            metrics.supabase_request_duration.labels(method, table).observe(time.perf_counter() - started)
+        if response.status_code >= 400:
+            metrics.supabase_errors.labels(method, table).inc()
+        return response
+    
+    def _get_agent_id(self) -> Optional[str]:
+        """Look up (once) the id of this agent's row"""
+        with self._id_lock:
+            if self._agent_id is None:
+                response = self._request("GET", f"agents?host=eq.{config.API_HOST}&port=eq.{config.API_PORT}&limit=1")
+                if response.status_code == 200 and len(response.json()) > 0:
+                    self._agent_id = response.json()[0]["id"]
+            return self._agent_id
+    
+    def _device_info(self, device=None) -> Dict[str, Any]:
+        """The device fields needed to find or create its row (default: config.py PDU)"""
+        if isinstance(device, dict):
+            return device
+        return {
+            "host": device.host if device else config.SNMP_HOST,
+            "name": device.name if device else f"{config.PDU_MODEL} PDU",
+            "community": device.community if device else config.SNMP_COMMUNITY,
+            "version": device.version if device else config.SNMP_VERSION
         }
+    
+    def _get_device_id(self, device=None, create: bool = True) -> Optional[str]:
+        """Look up (once) the id of a PDU's device row, creating it if needed"""
+        device = self._device_info(device)
+        host = device["host"]
+        with self._id_lock:
+            if host in self._device_ids:
+                return self._device_ids[host]
         
-        if method == "GET":
-            return requests.get(url, headers=headers)
-        elif method == "POST":
-            return requests.post(url, headers=headers, json=data)
-        elif method == "PUT":
-            return requests.put(url, headers=headers, json=data)
-        elif method == "PATCH":
-            return requests.patch(url, headers=headers, json=data)
-        elif method == "DELETE":
-            return requests.delete(url, headers=headers)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
+        agent_id = self._get_agent_id()
+        if agent_id is None:
+            return None
+        
+        with self._id_lock:
+            if host in self._device_ids:
+                return self._device_ids[host]
+            
+            device_response = self._request("GET", f"devices?agent_id=eq.{agent_id}&host=eq.{host}&limit=1")
+            if device_response.status_code == 200 and len(device_response.json()) > 0:
+                self._device_ids[host] = device_response.json()[0]["id"]
+            elif create:
+                # Create device if it doesn't exist
+                device_data = {
+                    "name": device["name"],
+                    "host": host,
+                    "snmp_community": device["community"],
+                    "snmp_version": device["version"],
+                    "agent_id": agent_id
+                }
+                device_create_response = self._request("POST", "devices", device_data)
+                if device_create_response.status_code == 201:
+                    self._device_ids[host] = device_create_response.json()[0]["id"]
+            return self._device_ids.get(host)
     
     def update_agent_status(self, status: str = "connected") -> Dict[str, Any]:
         """Update the agent status in the database"""
@@ -60,11 +157,10 @@ class SupabaseClient:
         
         try:
             # Check if agent exists
-            response = self._request("GET", f"agents?host=eq.{config.API_HOST}&port=eq.{config.API_PORT}&limit=1")
+            agent_id = self._get_agent_id()
             
-            if response.status_code == 200 and len(response.json()) > 0:
+            if agent_id is not None:
                 # Update existing agent
-                agent_id = response.json()[0]["id"]
                 update_data = {
                     "status": status,
                     "updated_at": datetime.now().isoformat()
@@ -80,85 +176,240 @@ class SupabaseClient:
                     "status": status
                 }
                 create_response = self._request("POST", "agents", agent_data)
+                if create_response.status_code == 201:
+                    with self._id_lock:
+                        self._agent_id = create_response.json()[0]["id"]
                 return {"success": create_response.status_code == 201, "message": "Agent created"}
         except Exception as e:
             print(f"Error updating agent status: {e}")
             return {"success": False, "message": str(e)}
     
-    def log_outlet_state(self, outlet_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Log outlet state to the database"""
+    def _device_key(self, device=None) -> str:
+        """Key of a PDU in the reading filter: its fleet id, else its host"""
+        device_id = getattr(device, "id", None)
+        if device_id is not None:
+            return str(device_id)
+        return config.DEVICE_ID if device is None else self._device_info(device)["host"]
+    
+    def _filter_reading(self, outlet_data: Dict[str, Any], device=None) -> bool:
+        """Whether a reading is worth writing; a state transition is spooled to outlet_events"""
+        write, new_state = self.readings.check(self._device_key(device), outlet_data)
+        if new_state is not None:
+            self.queue_outlet_event(outlet_data["id"], "state_change", new_state, device)
+        return write
+    
+    def _reading_row(self, outlet_data: Dict[str, Any], device_id: Optional[str]) -> Dict[str, Any]:
+        power = outlet_power(outlet_data, config.ENERGY_POWER_FACTOR)
+        return {
+            "device_id": device_id,
+            "outlet_number": int(outlet_data["id"]),
+            "state": outlet_data["state"],
+            "voltage": outlet_data["voltage"],
+            "current": outlet_data["current"],
+            "power": round(power[0], 2) if power is not None else None,
+            # The outlet's energy counter, when the reading comes from a metered device
+            "energy_kwh": outlet_data.get("energyKwh")
+        }
+    
+    def log_outlet_state(self, outlet_data: Dict[str, Any], device=None) -> Dict[str, Any]:
+        """Log outlet state to the database immediately (for the given fleet device, default: config.py PDU)"""
         if not self._connected:
             return {"success": False, "message": "Supabase connection not available"}
         
         try:
-            # Get agent ID
-            agent_response = self._request("GET", f"agents?host=eq.{config.API_HOST}&port=eq.{config.API_PORT}&limit=1")
-            
-            if agent_response.status_code != 200 or len(agent_response.json()) == 0:
+            if self._get_agent_id() is None:
                 return {"success": False, "message": "Agent not found in database"}
             
-            agent_id = agent_response.json()[0]["id"]
-            
-            # Get device ID (PDU)
-            device_response = self._request("GET", f"devices?agent_id=eq.{agent_id}&host=eq.{config.SNMP_HOST}&limit=1")
+            device_id = self._get_device_id(device)
+            if device_id is None:
+                return {"success": False, "message": "Failed to create device"}
             
-            device_id = None
-            if device_response.status_code == 200 and len(device_response.json()) > 0:
-                device_id = device_response.json()[0]["id"]
-            else:
-                # Create device if it doesn't exist
-                device_data = {
-                    "name": f"{config.PDU_MODEL} PDU",
-                    "host": config.SNMP_HOST,
-                    "snmp_community": config.SNMP_COMMUNITY,
-                    "snmp_version": config.SNMP_VERSION,
-                    "agent_id": agent_id
-                }
-                device_create_response = self._request("POST", "devices", device_data)
-                if device_create_response.status_code == 201:
-                    device_id = device_create_response.json()[0]["id"]
-                else:
-                    return {"success": False, "message": "Failed to create device"}
+            if not self._filter_reading(outlet_data, device):
+                return {"success": True, "message": "Outlet state unchanged"}
             
-            # Log outlet reading
-            reading_data = {
-                "device_id": device_id,
-                "outlet_number": int(outlet_data["id"]),
-                "state": outlet_data["state"],
-                "voltage": outlet_data["voltage"],
-                "current": outlet_data["current"]
-            }
-            
-            reading_response = self._request("POST", "outlet_readings", reading_data)
+            reading_response = self._request("POST", "outlet_readings", self._reading_row(outlet_data, device_id),
+                                             headers={"Prefer": "return=minimal"})
             return {"success": reading_response.status_code == 201, "message": "Outlet state logged"}
         except Exception as e:
             print(f"Error logging outlet state: {e}")
             return {"success": False, "message": str(e)}
     
-    def get_outlet_history(self, outlet_id: str, limit: int = 100) -> Dict[str, Any]:
-        """Get outlet history from the database"""
+    def is_configured(self) -> bool:
+        """Check if Supabase credentials are set (it may still be unreachable)"""
+        return bool(self.supabase_url and self.supabase_key)
+    
+    def queue_outlet_state(self, outlet_data: Dict[str, Any], device=None) -> None:
+        """Spool an outlet reading to disk for the background drainer; never blocks on the network"""
+        if not self.is_configured() or not self._filter_reading(outlet_data, device):
+            return
+        
+        reading = self._reading_row(outlet_data, None)
+        del reading["device_id"]
+        self.spool.append("outlet_readings", {"device": self._device_info(device), "row": reading})
+        self._ensure_writer()
+        if len(self.spool) >= config.SUPABASE_BATCH_SIZE:
+            self._flush_event.set()
+    
+    def queue_outlet_event(self, outlet_id: str, event_type: str, new_state: Optional[str] = None,
+                           device=None, user_initiated: bool = False) -> None:
+        """Spool an outlet_events row (e.g. a state change reported by a trap)"""
+        if not self.is_configured():
+            return
+        
+        self.readings.note_state(self._device_key(device), outlet_id, new_state)
+        # outlet_id references the outlets table; agent events are keyed by device and outlet number
+        event = {
+            "outlet_number": int(outlet_id),
+            "event_type": event_type,
+            "new_state": new_state,
+            "user_initiated": user_initiated
+        }
+        self.spool.append("outlet_events", {"device": self._device_info(device), "row": event})
+        self._ensure_writer()
+    
+    def queue_depth(self) -> int:
+        """Number of records waiting in the spool"""
+        return len(self.spool)
+    
+    def spool_status(self) -> Dict[str, Any]:
+        """Size and lag of the local write-ahead spool"""
+        return {
+            "pending": len(self.spool),
+            "bytes": self.spool.size_bytes(),
+            "maxRows": self.spool.max_rows,
+            "dropped": self.spool.dropped,
+            "deadLettered": self.spool.dead_lettered,
+            "lagSeconds": self.spool.oldest_age(),
+            "backoffSeconds": self._backoff,
+            "lastFlush": self._last_flush,
+            "lastError": self._last_error,
+            "readings": self.readings.stats()
+        }
+    
+    def start(self) -> None:
+        """Start the drainer; anything left in the spool from a previous run is replayed"""
+        if self.is_configured():
+            self._ensure_writer()
+    
+    def _ensure_writer(self) -> None:
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            self._stop_event.clear()
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="supabase-writer", daemon=True)
+            self._writer_thread.start()
+    
+    def _writer_loop(self) -> None:
+        """Drain the spool by size (event) or time threshold, backing off while Supabase fails"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self._backoff or config.SUPABASE_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            if self._stop_event.is_set():
+                break
+            self.flush()
+        # One last attempt on shutdown; whatever fails stays spooled for the next start
+        self.flush()
+    
+    def flush(self) -> Dict[str, Any]:
+        """Ship spooled records to Supabase in bulk array POSTs, oldest first"""
+        shipped = 0
+        try:
+            while True:
+                batch = self.spool.peek(config.SUPABASE_BATCH_SIZE)
+                if not batch:
+                    break
+                
+                # One bulk POST per table, in spool order
+                tables: Dict[str, List[Tuple[int, str, Dict[str, Any]]]] = {}
+                for record in batch:
+                    _, kind, payload = record
+                    device_id = self._get_device_id(payload.get("device"))
+                    if device_id is None:
+                        raise RuntimeError("Agent or device not found in database")
+                    payload["row"]["device_id"] = device_id
+                    if kind == "outlet_events":
+                        # Events spooled by an older version carry the outlet number as outlet_id
+                        payload["row"].pop("outlet_id", None)
+                    tables.setdefault(kind, []).append(record)
+                
+                # A bulk insert needs the same keys in every row; rows spooled by an older version may lack some
+                for records in tables.values():
+                    keys = set().union(*(payload["row"] for _, _, payload in records))
+                    for _, _, payload in records:
+                        for key in keys - payload["row"].keys():
+                            payload["row"][key] = None
+                
+                for table, records in tables.items():
+                    self._insert_records(table, records)
+                
+                shipped += len(batch)
+                if len(batch) < config.SUPABASE_BATCH_SIZE:
+                    break
+            
+            self._connected = True
+            self._backoff = 0.0
+            self._last_flush = datetime.now().isoformat()
+            self._last_error = None
+            return {"success": True, "message": f"{shipped} spooled records processed"}
+        except Exception as e:
+            print(f"Error flushing spooled records: {e}")
+            # Exponential backoff; the records stay in the spool
+            self._backoff = min(config.SUPABASE_MAX_BACKOFF, max(config.SUPABASE_FLUSH_INTERVAL, self._backoff * 2))
+            self._last_error = str(e)
+            return {"success": False, "message": str(e)}
+    
+    def _insert_records(self, table: str, records: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        """Bulk insert spooled records into a table, acking each chunk that is written.
+
+        Server errors, throttling, auth errors and network failures raise, so the
+        records stay spooled and are retried with backoff. Any other 4xx means
+        the rows themselves were refused (a bad value, a constraint): the batch
+        is split in halves until the offending rows are isolated, and those are
+        dead-lettered so they do not block the rest of the spool.
+        """
+        response = self._request("POST", table, [payload["row"] for _, _, payload in records],
+                                 headers={"Prefer": "return=minimal"})
+        if response.status_code == 201:
+            self.spool.ack([row_id for row_id, _, _ in records])
+            return
+        if response.status_code < 400 or response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+            raise RuntimeError(f"Bulk insert into {table} failed with HTTP {response.status_code}: {response.text}")
+        
+        if len(records) > 1:
+            middle = len(records) // 2
+            self._insert_records(table, records[:middle])
+            self._insert_records(table, records[middle:])
+            return
+        
+        reason = f"HTTP {response.status_code}: {response.text}"
+        print(f"Supabase rejected a {table} row, moved to the dead-letter table: {reason}")
+        self.spool.dead_letter(records, reason)
+        metrics.supabase_rejected_rows.labels(table).inc()
+    
+    def close(self) -> None:
+        """Stop the drainer after a final flush and close pooled connections"""
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            self._stop_event.set()
+            self._flush_event.set()
+            self._writer_thread.join(timeout=config.SUPABASE_TIMEOUT * 2)
+        self.session.close()
+        self.spool.close()
+    
+    def get_outlet_history(self, outlet_id: str, limit: int = 100, device=None) -> Dict[str, Any]:
+        """Get the latest raw readings of an outlet from the database"""
         if not self._connected:
             return {"success": False, "message": "Supabase connection not available"}
         
         try:
-            # Get device ID for the current PDU
-            agent_response = self._request("GET", f"agents?host=eq.{config.API_HOST}&port=eq.{config.API_PORT}&limit=1")
-            
-            if agent_response.status_code != 200 or len(agent_response.json()) == 0:
+            # Get device ID for the PDU (cached after the first lookup)
+            if self._get_agent_id() is None:
                 return {"success": False, "message": "Agent not found in database"}
             
-            agent_id = agent_response.json()[0]["id"]
-            
-            device_response = self._request("GET", f"devices?agent_id=eq.{agent_id}&host=eq.{config.SNMP_HOST}&limit=1")
-            
-            if device_response.status_code != 200 or len(device_response.json()) == 0:
+            device_id = self._get_device_id(device, create=False)
+            if device_id is None:
                 return {"success": False, "message": "Device not found in database"}
             
-            device_id = device_response.json()[0]["id"]
-            
             # Get outlet readings
             readings_response = self._request(
-                "GET", 
+                "GET",
                 f"outlet_readings?device_id=eq.{device_id}&outlet_number=eq.{outlet_id}&order=created_at.desc&limit={limit}"
             )
             
@@ -169,6 +420,40 @@ class SupabaseClient:
         except Exception as e:
             print(f"Error getting outlet history: {e}")
             return {"success": False, "message": str(e)}
+    
+    def get_outlet_range(self, outlet_id: str, table: str, start: str, end: str, device=None) -> Dict[str, Any]:
+        """Get an outlet's rows in [start, end) from outlet_readings or one of its rollup tables"""
+        if not self._connected:
+            return {"success": False, "message": "Supabase connection not available"}
+        
+        try:
+            if self._get_agent_id() is None:
+                return {"success": False, "message": "Agent not found in database"}
+            
+            device_id = self._get_device_id(device, create=False)
+            if device_id is None:
+                return {"success": False, "message": "Device not found in database"}
+            
+            column = rollups.time_column(table)
+            endpoint = (
+                f"{table}?select={rollups.columns(table)}&device_id=eq.{device_id}&outlet_number=eq.{outlet_id}"
+                f"&{column}=gte.{quote(start)}&{column}=lt.{quote(end)}&order={column}.asc"
+            )
+            # PostgREST caps responses (max-rows), so page through the range
+            rows: List[Dict[str, Any]] = []
+            while True:
+                response = self._request("GET", f"{endpoint}&limit={RANGE_PAGE_SIZE}&offset={len(rows)}")
+                if response.status_code != 200:
+                    return {"success": False, "message": f"Failed to fetch {table}"}
+                page = response.json()
+                rows.extend(page)
+                if len(page) < RANGE_PAGE_SIZE:
+                    break
+            
+            return {"success": True, "data": rows}
+        except Exception as e:
+            print(f"Error getting outlet range: {e}")
+            return {"success": False, "message": str(e)}
 
 # Create a singleton instance
 supabase_client = SupabaseClient()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Tests import the agent's flat modules; keep their files out of the agent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_state_dir = tempfile.mkdtemp(prefix="pdu-agent-tests-")
+os.environ.setdefault("SPOOL_PATH", os.path.join(_state_dir, "spool.db"))
+os.environ.setdefault("ENERGY_CHECKPOINT_PATH", os.path.join(_state_dir, "energy.json"))
+os.environ.setdefault("SUPABASE_URL", "")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "")
@@ -0,0 +1,56 @@
+from change_filter import ReadingFilter
+
+
+def _outlet(state="on", voltage=230.0, current=1.0):
+    return {"id": "1", "state": state, "voltage": voltage, "current": current}
+
+
+def test_deadbands_compare_against_the_last_written_value():
+    readings = ReadingFilter({"voltage": 0.5, "current": 0.05}, heartbeat=300)
+    assert readings.check("pdu", _outlet(), now=0) == (True, None)
+    assert readings.check("pdu", _outlet(voltage=230.4, current=1.04), now=1) == (False, None)
+    # Drift adds up against the written 230.0, not the suppressed 230.4
+    assert readings.check("pdu", _outlet(voltage=230.8), now=2) == (True, None)
+    assert readings.check("pdu", _outlet(voltage=230.8, current=1.1), now=3) == (True, None)
+    assert readings.stats() == {"written": 3, "keyframes": 0, "suppressed": 1, "transitions": 0, "outlets": 1}
+
+
+def test_heartbeat_writes_a_keyframe():
+    readings = ReadingFilter({"voltage": 0.5, "current": 0.05}, heartbeat=300)
+    readings.check("pdu", _outlet(), now=0)
+    assert readings.check("pdu", _outlet(), now=299) == (False, None)
+    assert readings.check("pdu", _outlet(), now=300) == (True, None)
+    assert readings.counts["keyframes"] == 1
+    # The keyframe restarts the interval
+    assert readings.check("pdu", _outlet(), now=301) == (False, None)
+
+
+def test_state_changes_are_one_transition():
+    readings = ReadingFilter({"voltage": 0.5, "current": 0.05}, heartbeat=300)
+    readings.check("pdu", _outlet(), now=0)
+    assert readings.check("pdu", _outlet(state="off", current=0.0), now=1) == (True, "off")
+    assert readings.check("pdu", _outlet(state="off", current=0.0), now=2) == (False, None)
+    # A failed read is written but is no transition, and neither is the state it recovers to
+    assert readings.check("pdu", _outlet(state="unknown", voltage=None, current=None), now=3) == (True, None)
+    assert readings.check("pdu", _outlet(state="off", current=0.0), now=4) == (True, None)
+    # Outlets of other devices are tracked apart
+    assert readings.check("other", _outlet(state="off"), now=5) == (True, None)
+    assert readings.counts["transitions"] == 1
+
+
+def test_state_reported_with_an_event_is_not_a_transition_again():
+    readings = ReadingFilter({"voltage": 0.5, "current": 0.05}, heartbeat=300)
+    readings.check("pdu", _outlet(), now=0)
+    readings.note_state("pdu", "1", "off")
+    # Still written (the state differs from the last written reading), but no second event
+    assert readings.check("pdu", _outlet(state="off"), now=1) == (True, None)
+    readings.note_state("pdu", "1", "unknown")
+    assert readings.check("pdu", _outlet(state="on"), now=2) == (True, "on")
+
+
+def test_missing_values_count_as_a_change():
+    readings = ReadingFilter({"voltage": 0.5, "current": 0.05}, heartbeat=300)
+    readings.check("pdu", _outlet(), now=0)
+    assert readings.check("pdu", _outlet(current=None), now=1) == (True, None)
+    assert readings.check("pdu", _outlet(current=None), now=2) == (False, None)
+    assert readings.check("pdu", _outlet(current=1.0), now=3) == (True, None)
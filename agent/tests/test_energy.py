@@ -0,0 +1,117 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from async_snmp_client import AsyncSNMPClient
+from energy import EnergyCheckpoints, EnergyMeter, outlet_power
+from simulator import SENSOR_ACTIVE_POWER, SENSOR_APPARENT_POWER, SENSOR_CURRENT, start_simulators
+
+
+def _outlet(outlet_id="1", state="on", **readings):
+    return dict({"id": outlet_id, "state": state, "voltage": 230.0, "current": 2.0}, **readings)
+
+
+def test_measured_power_is_used_and_estimated_only_without_it():
+    assert outlet_power(_outlet(power=400.0, apparentPower=450.0), 0.5) == (400.0, 450.0)
+    # No power sensors: V x I, times the power factor for the active power
+    assert outlet_power(_outlet(), 0.5) == (230.0, 460.0)
+    assert outlet_power(_outlet(power=400.0, voltage=None)) == (400.0, None)
+    assert outlet_power(_outlet(current=None)) is None
+
+
+def test_energy_integrates_the_previous_power_until_each_sample():
+    meter = EnergyMeter(max_gap=300)
+    meter.record([_outlet("1", power=100.0), _outlet("2", power=50.0)], timestamp=1000)
+    meter.record([_outlet("1", power=200.0), _outlet("2", power=50.0)], timestamp=1036)
+    meter.record([_outlet("1", power=200.0), _outlet("2", power=50.0)], timestamp=1072)
+    # 100 W then 200 W for 36 s each: 3 Wh; 50 W for 72 s: 1 Wh
+    assert meter.outlets["1"].energy == pytest.approx(3.0)
+    assert meter.outlets["2"].energy == pytest.approx(1.0)
+    assert meter.inlet.energy == pytest.approx(4.0)
+    assert meter.inlet.power == 250.0
+
+    # A gap longer than max_gap is not integrated
+    meter.record([_outlet("1", power=200.0), _outlet("2", power=50.0)], timestamp=2000)
+    assert meter.outlets["1"].energy == pytest.approx(3.0)
+
+    # Outlets without readings are skipped, the others still count
+    meter.record([_outlet("1", state="unknown"), _outlet("2", power=50.0)], timestamp=2036)
+    assert meter.outlets["1"].energy == pytest.approx(3.0)
+    assert meter.outlets["2"].energy == pytest.approx(1.5)
+
+
+def test_rolling_window_average_and_peak():
+    meter = EnergyMeter(max_gap=300)
+    for offset, power in ((0, 100.0), (10, 300.0), (20, 100.0)):
+        meter.record([_outlet(power=power)], timestamp=1200 + offset)
+    window = meter.to_dict(now=1220)["outlets"]["1"]["windows"]["1m"]
+    assert window == {"avg": 200.0, "peak": 300.0, "seconds": 20.0}
+
+
+def test_checkpoint_restores_energy_totals(tmp_path):
+    path = str(tmp_path / "energy.json")
+    meter = EnergyMeter()
+    meter.record([_outlet(power=360.0)], timestamp=1000)
+    meter.record([_outlet(power=360.0)], timestamp=1010)
+    checkpoints = EnergyCheckpoints(path)
+    checkpoints.meters["pdu"] = meter
+    checkpoints.save()
+
+    restored = EnergyMeter()
+    checkpoints = EnergyCheckpoints(path)
+    checkpoints.meters["pdu"] = restored
+    checkpoints.load()
+    assert restored.energy_kwh("1") == pytest.approx(0.001)
+    assert restored.inlet.energy == pytest.approx(1.0)
+    assert restored.outlets["1"].since == meter.outlets["1"].since
+    # The power before the checkpoint is unknown: counting resumes with the next two samples
+    restored.record([_outlet(power=720.0)], timestamp=5000)
+    restored.record([_outlet(power=720.0)], timestamp=5010)
+    assert restored.energy_kwh("1") == pytest.approx(0.003)
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_units_from_simulator_to_energy_meter():
+    port = _free_port()
+    device = SimpleNamespace(id="sim", host="127.0.0.1", community="public", port=port, version="2c", v3=None,
+                             model="PX3", outlets=4)
+
+    async def poll():
+        endpoints = await start_simulators(port=port, outlets=4)
+        pdu = endpoints[0][1].pdu
+        client = AsyncSNMPClient(device)
+        try:
+            outlets = (await client.get_all_outlets())["outlets"]
+        finally:
+            client.session.close()
+            for transport, _ in endpoints:
+                transport.close()
+        return pdu, client, outlets
+
+    pdu, client, outlets = asyncio.run(poll())
+    sensors = client.sensors.to_dict()
+    assert sensors["inletVoltage"]["units"] == "volt"
+    assert sensors["outletCurrent"]["1"]["units"] == "amp"
+    assert sensors["outletPower"]["1"]["units"] == "watt"
+    assert sensors["outletApparentPower"]["1"]["units"] == "voltamp"
+
+    meter = EnergyMeter(power_factor=1.0, max_gap=3600)
+    meter.record(outlets, timestamp=0)
+    meter.record(outlets, timestamp=3600)
+    for outlet in outlets:
+        num = int(outlet["id"])
+        # Raw mA scaled to A; W and VA as the PDU reports them
+        assert outlet["current"] == pdu.outlet_reading(num, SENSOR_CURRENT) / 1000
+        assert outlet["power"] == pdu.outlet_reading(num, SENSOR_ACTIVE_POWER)
+        assert outlet["apparentPower"] == pdu.outlet_reading(num, SENSOR_APPARENT_POWER)
+        assert outlet["apparentPower"] == pytest.approx(outlet["voltage"] * outlet["current"], abs=0.5)
+        assert outlet["power"] <= outlet["apparentPower"]
+        # One hour at the measured active power, not V x I
+        assert meter.energy_kwh(outlet["id"]) == pytest.approx(outlet["power"] / 1000)
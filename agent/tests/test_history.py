@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from fleet import Device
+from poller import OutletPoller
+from rollups import parse_timestamp
+from timeseries import OutletHistory
+
+
+def test_parse_timestamp_accepts_utc_designator():
+    expected = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+    assert parse_timestamp("2024-06-01T12:00:00Z") == expected
+    assert parse_timestamp("2024-06-01T12:00:00.5Z") == expected + 0.5
+    assert parse_timestamp("2024-06-01T14:00:00+02:00") == expected
+
+
+def test_history_time_parameters_accept_z():
+    pytest.importorskip("fastapi")
+    from fastapi import HTTPException
+    from main import _parse_time
+
+    expected = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+    assert _parse_time("2024-06-01T12:00:00Z", 0.0) == expected
+    assert _parse_time(str(expected), 0.0) == expected
+    with pytest.raises(HTTPException):
+        _parse_time("yesterday", 0.0)
+
+
+class _Client:
+    device_id = "pdu"
+    pdu_ip = "127.0.0.1"
+
+    def __init__(self):
+        self.outlets = [
+            {"id": "1", "name": "Outlet 1", "state": "on", "voltage": 230.0, "current": 1.0},
+            {"id": "2", "name": "Outlet 2", "state": "on", "voltage": 230.0, "current": 2.0},
+        ]
+
+    async def get_all_outlets(self):
+        return {"outlets": [dict(outlet) for outlet in self.outlets]}
+
+
+def test_each_poll_and_update_is_recorded_once():
+    client = _Client()
+    poller = OutletPoller(client)
+    history = OutletHistory(16)
+    Device(SimpleNamespace(id="pdu"), client, poller, history=history)
+
+    async def run():
+        await poller.refresh()
+        # A changed outlet is reported to the change listeners as well as the poll listeners
+        client.outlets[0]["current"] = 1.5
+        await poller.refresh()
+        # A partial update in between polls (e.g. a trap)
+        poller.update_outlets([{"id": "2", "state": "off"}])
+
+    asyncio.run(run())
+    assert history.series["1"].size == 2
+    assert history.series["2"].size == 3
@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+from operations import SUCCEEDED, OperationManager
+
+
+class _Client:
+    topology = None
+
+    def __init__(self, read_error=None):
+        self.state = "off"
+        self.read_error = read_error
+
+    async def get_switching_state(self, outlet_id):
+        return self.state
+
+    async def set_outlet(self, outlet_id, action):
+        self.state = action
+        return True
+
+    async def get_outlet_state(self, outlet_id):
+        if self.read_error:
+            raise self.read_error
+        return {"id": outlet_id, "state": self.state, "voltage": 120.0, "current": 0.5}
+
+
+def _run(client):
+    updates = []
+    device = SimpleNamespace(id="pdu", client=client, poller=SimpleNamespace(update_outlet=updates.append))
+    manager = OperationManager(timeout=1.0, poll_interval=0.01)
+
+    async def run():
+        return await manager.submit(device, "1", "on").wait()
+
+    return asyncio.run(run()), updates
+
+
+def test_converged_operation_returns_the_outlet_read_back():
+    operation, updates = _run(_Client())
+    assert operation.status == SUCCEEDED
+    assert operation.result["state"] == "on"
+    assert updates == [operation.result]
+    assert operation.to_dict()["readError"] is None
+
+
+def test_failed_read_after_convergence_keeps_the_operation_succeeded():
+    operation, updates = _run(_Client(read_error=RuntimeError("PDU unreachable")))
+    assert operation.status == SUCCEEDED
+    assert operation.observed_state == "on"
+    assert operation.result is None
+    assert operation.error is None
+    assert operation.to_dict()["readError"] == "PDU unreachable"
+    assert updates == []
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from poller import OutletPoller
+from sensor_metadata import SensorMetadata
+
+
+def _outlets(**states):
+    return [{"id": outlet_id, "name": f"Outlet {outlet_id}", "state": state, "voltage": 230.0, "current": 1.0}
+            for outlet_id, state in states.items()]
+
+
+def _poller():
+    client = SimpleNamespace(device_id="test", pdu_ip="127.0.0.1", sensors=SensorMetadata(4, {"current": 1}))
+    return OutletPoller(client)
+
+
+def test_version_only_moves_when_outlet_data_changes():
+    poller = _poller()
+    first = poller._publish(_outlets(**{"1": "on", "2": "on"}), poll=True)
+    same = poller._publish(_outlets(**{"1": "on", "2": "on"}), poll=True)
+    assert same.version == first.version
+    assert same.modified == first.modified
+
+    changed = poller._publish(_outlets(**{"1": "on", "2": "off"}), poll=True)
+    assert changed.version == first.version + 1
+    # The unchanged outlet keeps its dict
+    assert changed.by_id["1"] is first.by_id["1"]
+    assert [outlet["id"] for outlet in changed.changed_since(first.version)] == ["2"]
+    assert changed.changed_since(changed.version) == []
+
+
+def test_delta_needs_a_version_within_the_outlet_set():
+    poller = _poller()
+    first = poller._publish(_outlets(**{"1": "on"}), poll=True)
+    grown = poller._publish(_outlets(**{"1": "on", "2": "on"}), poll=True)
+    assert grown.reset_version == grown.version
+    # Outlets were added since: no delta can be built from before that
+    assert grown.changed_since(first.version) is None
+    # Nor from a version this agent never issued
+    assert grown.changed_since(grown.version + 1) is None
+
+    later = poller._publish(_outlets(**{"1": "off", "2": "on"}), poll=True)
+    assert later.reset_version == grown.version
+    assert [outlet["id"] for outlet in later.changed_since(grown.version)] == ["1"]
+
+
+def test_get_outlets_with_since_returns_only_changes():
+    poller = _poller()
+    first = poller._publish(_outlets(**{"1": "on", "2": "on"}), poll=True)
+    poller._publish(_outlets(**{"1": "on", "2": "off"}), poll=True)
+
+    delta = asyncio.run(poller.get_outlets(since=first.version))
+    assert delta["delta"] is True and delta["since"] == first.version
+    assert [outlet["id"] for outlet in delta["outlets"]] == ["2"]
+
+    full = asyncio.run(poller.get_outlets(since=first.version - 1))
+    assert full["delta"] is False
+    assert len(full["outlets"]) == 2
+    assert "since" not in full
+
+
+def test_etag_comparison_is_weak():
+    pytest.importorskip("fastapi")
+    from main import _etag_matches
+
+    assert _etag_matches('W/"5"', 'W/"5"')
+    assert _etag_matches('"5"', 'W/"5"')
+    assert _etag_matches('W/"4", W/"5"', 'W/"5"')
+    assert _etag_matches("*", 'W/"5"')
+    assert not _etag_matches('W/"5"', 'W/"5-stale"')
+    assert not _etag_matches(None, 'W/"5"')
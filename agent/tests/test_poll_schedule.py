@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from poll_schedule import CONFIG, CURRENT, STATE, VOLTAGE, PollSchedule
+from poller import OutletPoller
+
+
+def _schedule():
+    return PollSchedule({STATE: (5.0, 0.0), CURRENT: (30.0, 0.0), VOLTAGE: (60.0, 0.0), CONFIG: (300.0, 0.0)})
+
+
+def test_groups_are_due_at_their_own_intervals():
+    schedule = _schedule()
+    assert schedule.due(0.0) == [VOLTAGE, CONFIG, STATE, CURRENT]
+    schedule.done(schedule.groups, 0.0)
+
+    assert schedule.due(1.0) == []
+    assert schedule.wait(1.0) == 4.0
+    assert schedule.due(5.0) == [STATE]
+    schedule.done([STATE], 5.0)
+    # Current is due at 30; the tick at 28 is within half a state interval, so it rides along
+    assert schedule.due(28.0) == [STATE, CURRENT]
+    assert schedule.due(61.0) == [VOLTAGE, STATE, CURRENT]
+    assert schedule.reads[STATE] == 2
+
+
+def test_jitter_stays_within_its_fraction():
+    schedule = PollSchedule({STATE: (10.0, 0.2)})
+    for _ in range(100):
+        schedule.done([STATE], 0.0)
+        assert 8.0 <= schedule.next_due[STATE] <= 12.0
+
+
+def test_unknown_group_is_rejected():
+    with pytest.raises(ValueError):
+        PollSchedule({"temperature": (10.0, 0.0)})
+
+
+class _Client:
+    device_id = "pdu"
+    pdu_ip = "127.0.0.1"
+
+    def __init__(self):
+        self.requested = []
+
+    async def get_all_outlets(self):
+        return {"outlets": [{"id": "1", "name": "Outlet 1", "state": "on", "voltage": 230.0, "current": 1.0}]}
+
+    async def poll_groups(self, groups):
+        self.requested.append(groups)
+        outlet = {"id": "1"}
+        if STATE in groups:
+            outlet["state"] = "off"
+        if CURRENT in groups:
+            outlet["current"] = 0.0
+        return [outlet]
+
+
+def test_tick_reads_only_due_groups_and_keeps_the_rest():
+    client = _Client()
+    schedule = _schedule()
+    poller = OutletPoller(client, schedule=schedule)
+    polls = []
+    poller.poll_listeners.append(polls.append)
+
+    async def run():
+        # Nothing known yet: the first tick is a full poll
+        await poller.tick()
+        schedule.next_due[STATE] = 0.0
+        return await poller.tick()
+
+    snapshot = asyncio.run(run())
+    assert client.requested == [[STATE]]
+    outlet = snapshot.by_id["1"]
+    assert outlet["state"] == "off"
+    # Fields of groups that were not read keep their last value
+    assert outlet["current"] == 1.0 and outlet["voltage"] == 230.0 and outlet["name"] == "Outlet 1"
+    # A tick that reads the states counts as a poll
+    assert len(polls) == 2
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from pysnmp.proto import errind
+
+from async_snmp_client import AsyncSNMPSession
+from resilience import CircuitBreaker, DeviceUnreachable, CLOSED, HALF_OPEN, OPEN
+
+
+async def _unanswered(*args, **kwargs):
+    await asyncio.sleep(3600)
+
+
+async def _answered(*args, **kwargs):
+    return None, 0, 0, []
+
+
+def test_cancelled_half_open_probe_is_released():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    session = AsyncSNMPSession("127.0.0.1", breaker=breaker)
+
+    async def run():
+        # The probe is cancelled by the poll timeout before the PDU answers
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(session._request(_unanswered, "get", [], []), 0.05)
+        assert breaker.state == HALF_OPEN
+        # The next request is let through as a new probe and closes the breaker
+        await session._request(_answered, "get", [], [])
+
+    try:
+        asyncio.run(run())
+    finally:
+        session.close()
+    assert breaker.state == CLOSED
+
+
+def test_breaker_rejects_while_probe_in_flight():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    session = AsyncSNMPSession("127.0.0.1", breaker=breaker)
+
+    async def run():
+        probe = asyncio.ensure_future(session._request(_unanswered, "get", [], []))
+        await asyncio.sleep(0)
+        with pytest.raises(DeviceUnreachable):
+            await session._request(_answered, "get", [], [])
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    try:
+        asyncio.run(run())
+    finally:
+        session.close()
+    assert breaker.allow()
+
+
+def test_timed_out_set_is_not_retransmitted():
+    session = AsyncSNMPSession("127.0.0.1", retries=3, breaker=CircuitBreaker(failure_threshold=10))
+    sent = []
+
+    async def _timed_out(*args, **kwargs):
+        sent.append(args)
+        return errind.requestTimedOut, 0, 0, []
+
+    async def run():
+        with pytest.raises(DeviceUnreachable):
+            await session._request(_timed_out, "set", [], [])
+        assert len(sent) == 1
+        # Reads are still retried
+        with pytest.raises(DeviceUnreachable):
+            await session._request(_timed_out, "get", [], [])
+        assert len(sent) == 1 + 4
+
+    try:
+        asyncio.run(run())
+    finally:
+        session.close()
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+
+import rollups
+
+
+def _iso(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def test_pick_table_uses_the_coarsest_retained_table_finer_than_the_step():
+    now = 1_000_000_000.0
+    assert rollups.pick_table(now - 3600, 60, now) == ("outlet_readings_1m", 60)
+    assert rollups.pick_table(now - 86400, 7200, now) == ("outlet_readings_1h", 3600)
+    assert rollups.pick_table(now - 600, 10, now) == ("outlet_readings", 0)
+    # Raw readings are pruned after 7 days: the finest table that still covers the range
+    assert rollups.pick_table(now - 30 * 86400, 10, now) == ("outlet_readings_1m", 60)
+    assert rollups.pick_table(now - 365 * 86400, 60, now) == ("outlet_readings_1h", 3600)
+
+
+def test_rollup_rows_merge_into_requested_buckets():
+    start = 1_700_000_400.0
+    rows = [
+        {"bucket": _iso(start), "samples": 2, "on_samples": 2,
+         "voltage_min": 229, "voltage_max": 231, "voltage_sum": 460,
+         "current_min": 1.0, "current_max": 3.0, "current_sum": 4.0},
+        {"bucket": _iso(start + 60), "samples": 2, "on_samples": 0,
+         "voltage_min": 228, "voltage_max": 232, "voltage_sum": 460,
+         "current_min": 0.0, "current_max": 0.0, "current_sum": 0.0},
+        # Outside the range
+        {"bucket": _iso(start + 600), "samples": 1, "on_samples": 1,
+         "voltage_min": 1, "voltage_max": 1, "voltage_sum": 1,
+         "current_min": 1, "current_max": 1, "current_sum": 1},
+    ]
+    [bucket] = rollups.buckets("outlet_readings_1m", rows, start, start + 300, 300)
+    assert bucket["count"] == 4
+    assert bucket["voltage"] == {"min": 228.0, "avg": 230.0, "max": 232.0}
+    assert bucket["current"] == {"min": 0.0, "avg": 1.0, "max": 3.0}
+    assert bucket["onRatio"] == 0.5
+
+
+def test_averages_are_weighted_by_how_long_readings_held():
+    start = 1_700_000_400.0
+    rows = [
+        # 230 V held for 50 s, 240 V for 10 s, on for 50 of 60 s
+        {"bucket": _iso(start), "samples": 2, "on_samples": 1,
+         "voltage_min": 230, "voltage_max": 240, "voltage_sum": 470,
+         "current_min": None, "current_max": None, "current_sum": None,
+         "held_seconds": 60, "on_seconds": 50, "voltage_seconds": 60, "voltage_weighted": 230 * 50 + 240 * 10,
+         "current_seconds": 0, "current_weighted": None},
+        # No new reading in this minute, only the hold of the previous one
+        {"bucket": _iso(start + 60), "samples": 0, "on_samples": 0,
+         "voltage_min": None, "voltage_max": None, "voltage_sum": None,
+         "current_min": None, "current_max": None, "current_sum": None,
+         "held_seconds": 60, "on_seconds": 0, "voltage_seconds": 60, "voltage_weighted": 240 * 60,
+         "current_seconds": 0, "current_weighted": None},
+    ]
+    [bucket] = rollups.buckets("outlet_readings_1m", rows, start, start + 120, 120)
+    assert bucket["count"] == 2
+    assert bucket["voltage"] == {"min": 230.0, "avg": round((230 * 50 + 240 * 70) / 120, 3), "max": 240.0}
+    assert bucket["current"] == {"min": None, "avg": None, "max": None}
+    assert bucket["onRatio"] == round(50 / 120, 3)
+
+
+def test_raw_readings_hold_until_the_next_reading():
+    start = 1_700_000_400.0
+    rows = [
+        {"created_at": _iso(start + 1), "state": "on", "voltage": 230, "current": 2.0},
+        {"created_at": _iso(start + 11), "state": "off", "voltage": 232, "current": None},
+        {"created_at": _iso(start + 70), "state": "off", "voltage": 231, "current": 0.0},
+    ]
+    first, second = rollups.buckets("outlet_readings", rows, start, start + 120, 60)
+    assert first["count"] == 2
+    # 230 V for 10 s, 232 V for 59 s; current known for 10 s only
+    assert first["voltage"] == {"min": 230.0, "avg": round((230 * 10 + 232 * 59) / 69, 3), "max": 232.0}
+    assert first["current"] == {"min": 2.0, "avg": 2.0, "max": 2.0}
+    assert first["onRatio"] == round(10 / 69, 3)
+    # The last reading holds until the end of the range
+    assert second["count"] == 1 and second["onRatio"] == 0.0
+    assert second["voltage"]["avg"] == 231.0
+
+
+def test_holds_are_capped(monkeypatch):
+    monkeypatch.setattr(rollups.config, "READING_MAX_HOLD", 60)
+    start = 1_700_000_400.0
+    rows = [
+        {"created_at": _iso(start), "state": "on", "voltage": 100, "current": 1.0},
+        # After a gap longer than READING_MAX_HOLD
+        {"created_at": _iso(start + 3000), "state": "on", "voltage": 200, "current": 1.0},
+    ]
+    [bucket] = rollups.buckets("outlet_readings", rows, start, start + 3060, 3600)
+    assert bucket["voltage"]["avg"] == 150.0
+
+
+def test_rollups_without_holds_fall_back_to_per_row_averages():
+    start = 1_700_000_400.0
+    rows = [
+        {"bucket": _iso(start), "samples": 2, "on_samples": 1,
+         "voltage_min": 230, "voltage_max": 240, "voltage_sum": 470,
+         "current_min": 1.0, "current_max": 1.0, "current_sum": 2.0,
+         "held_seconds": 0, "on_seconds": 0, "voltage_seconds": 0, "voltage_weighted": None,
+         "current_seconds": 0, "current_weighted": None},
+    ]
+    [bucket] = rollups.buckets("outlet_readings_1m", rows, start, start + 60, 60)
+    assert bucket["voltage"]["avg"] == 235.0
+    assert bucket["onRatio"] == 0.5
@@ -0,0 +1,29 @@
+from snmp_client import BaseSNMPClient
+
+
+def test_switching_state_is_decoded_apart_from_operation_values():
+    client = BaseSNMPClient()
+    # outletSwitchingState: on(7), off(8)
+    assert client._decode_state(7) == "on"
+    assert client._decode_state(8) == "off"
+    # switchingOperation values are written, never read back as states
+    assert client._decode_state(1) is None
+    assert client._decode_state(0) is None
+    assert client._build_outlet("1", 8, 120, {"current": 0})["state"] == "off"
+    assert client._build_outlet("1", 2, 120, {"current": 0})["state"] == "unknown"
+    assert client.states == {"on": 1, "off": 0, "cycle": 2}
+
+
+def test_missing_readings_are_none_not_placeholders():
+    client = BaseSNMPClient()
+    outlet = client._build_outlet("1", 7, None, {})
+    assert outlet["state"] == "on"
+    assert outlet["voltage"] is None
+    assert outlet["current"] is None
+    assert outlet["power"] is None
+    assert outlet["apparentPower"] is None
+    # rmsCurrent(1), activePower(5), apparentPower(6): the OIDs and the scaling digits use them
+    assert client.sensor_types == {"voltage": 4, "current": 1, "power": 5, "apparentPower": 6}
+    assert client.oid_table.current_oid(3).endswith(".1.3.1")
+    assert client.oid_table.reading_oids(3, ["power", "apparentPower"])[0].endswith(".1.3.5")
+    assert client.sensors.outlet_sensor_types == {"current": 1, "power": 5, "apparentPower": 6}
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import config
+import metrics
+from spool import ReadingSpool
+from supabase_client import SupabaseClient
+
+
+def test_spool_is_fifo_bounded_and_survives_reopen(tmp_path):
+    path = str(tmp_path / "spool.db")
+    spool = ReadingSpool(path, max_rows=3)
+    spool.extend("outlet_readings", [{"n": n} for n in range(5)])
+    # The two oldest records were dropped to stay within max_rows
+    assert len(spool) == 3
+    assert spool.dropped == 2
+    records = spool.peek(2)
+    assert [payload["n"] for _, _, payload in records] == [2, 3]
+    spool.ack([row_id for row_id, _, _ in records])
+    spool.close()
+
+    spool = ReadingSpool(path, max_rows=3)
+    assert len(spool) == 1
+    assert [payload["n"] for _, _, payload in spool.peek(10)] == [4]
+    spool.close()
+
+
+def test_dead_letter_moves_records_out_of_the_spool(tmp_path):
+    spool = ReadingSpool(str(tmp_path / "spool.db"))
+    spool.extend("outlet_events", [{"n": 1}, {"n": 2}])
+    spool.dead_letter(spool.peek(1), "HTTP 400: bad")
+    assert len(spool) == 1
+    assert spool.dead_lettered == 1
+    assert spool.dead_letters() == [("outlet_events", {"n": 1}, "HTTP 400: bad")]
+    spool.close()
+
+
+def _client(tmp_path, monkeypatch, respond):
+    monkeypatch.setattr(config, "SUPABASE_URL", "http://supabase.invalid")
+    monkeypatch.setattr(config, "SUPABASE_SERVICE_KEY", "test")
+    monkeypatch.setattr(config, "SPOOL_PATH", str(tmp_path / "spool.db"))
+    monkeypatch.setattr(config, "SUPABASE_BATCH_SIZE", 8)
+    monkeypatch.setattr(SupabaseClient, "_test_connection", lambda self: True)
+    client = SupabaseClient()
+    posted = []
+
+    def request(method, endpoint, data=None, headers=None):
+        posted.append([row["n"] for row in data])
+        return respond(data)
+
+    client._request = request
+    client._get_device_id = lambda device=None, create=True: "device"
+    return client, posted
+
+
+def test_flush_dead_letters_rejected_rows_and_writes_the_rest(tmp_path, monkeypatch):
+    def respond(rows):
+        if any(row["n"] == 5 for row in rows):
+            return SimpleNamespace(status_code=400, text="invalid input syntax")
+        return SimpleNamespace(status_code=201, text="")
+
+    client, posted = _client(tmp_path, monkeypatch, respond)
+    rejected = metrics.supabase_rejected_rows.labels("outlet_readings")
+    before = rejected.value
+    try:
+        client.spool.extend("outlet_readings", [{"device": {}, "row": {"n": n}} for n in range(8)])
+        assert client.flush()["success"]
+
+        # The batch is bisected down to the bad row; every other row is written once
+        assert posted == [list(range(8)), [0, 1, 2, 3], [4, 5, 6, 7], [4, 5], [4], [5], [6, 7]]
+        assert len(client.spool) == 0
+        assert [payload["row"]["n"] for _, payload, _ in client.spool.dead_letters()] == [5]
+        assert rejected.value == before + 1
+        assert client.spool_status()["deadLettered"] == 1
+    finally:
+        client.close()
+
+
+def test_flush_keeps_rows_spooled_on_server_errors(tmp_path, monkeypatch):
+    client, posted = _client(tmp_path, monkeypatch, lambda rows: SimpleNamespace(status_code=503, text="unavailable"))
+    try:
+        client.spool.extend("outlet_readings", [{"device": {}, "row": {"n": n}} for n in range(4)])
+        assert not client.flush()["success"]
+        # No bisecting and nothing dead-lettered: the batch is retried later with backoff
+        assert posted == [[0, 1, 2, 3]]
+        assert len(client.spool) == 4
+        assert client.spool.dead_letters() == []
+        assert client._backoff > 0
+    finally:
+        client.close()
@@ -0,0 +1,17 @@
+from timeseries import OutletHistory
+
+
+def test_missing_readings_are_left_out_of_bucket_statistics():
+    history = OutletHistory(16)
+    history.record([{"id": "1", "state": "on", "voltage": 230.0, "current": 2.0}], timestamp=100.0)
+    history.record([{"id": "1", "state": "on", "voltage": None, "current": None}], timestamp=101.0)
+    history.record([{"id": "1", "state": "off", "voltage": 234.0, "current": None}], timestamp=102.0)
+
+    [bucket] = history.query("1", 100.0, 110.0, 10.0)
+    assert bucket["count"] == 3
+    assert bucket["voltage"] == {"min": 230.0, "avg": 232.0, "max": 234.0}
+    assert bucket["current"] == {"min": 2.0, "avg": 2.0, "max": 2.0}
+
+    history.record([{"id": "2", "state": "on", "voltage": None, "current": None}], timestamp=100.0)
+    [bucket] = history.query("2", 100.0, 110.0, 10.0)
+    assert bucket["current"] == {"min": None, "avg": None, "max": None}
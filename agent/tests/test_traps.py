@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import config
+from poller import OutletPoller
+from sensor_metadata import SensorMetadata
+from supabase_client import SupabaseClient
+from traps import (OUTLET_SENSOR_VALUE, OUTLET_SWITCHING_STATE, OutletTrapHandler, parse_outlet_updates,
+                   send_synthetic_trap, start_trap_receiver)
+
+
+def test_switching_state_decodes_mib_values():
+    updates, _ = parse_outlet_updates([
+        (OUTLET_SWITCHING_STATE + (1, 1), 7),
+        (OUTLET_SWITCHING_STATE + (1, 2), 8),
+        # Not an outletSwitchingState value (a switchingOperation one)
+        (OUTLET_SWITCHING_STATE + (1, 3), 1),
+    ])
+    assert updates == {"1": {"state": "on"}, "2": {"state": "off"}}
+
+
+def test_outlet_sensor_values_map_to_their_fields():
+    updates, _ = parse_outlet_updates([
+        (OUTLET_SENSOR_VALUE + (1, 4, 1), 1652),  # rmsCurrent
+        (OUTLET_SENSOR_VALUE + (1, 4, 5), 174),   # activePower
+        (OUTLET_SENSOR_VALUE + (1, 4, 6), 198),   # apparentPower
+        (OUTLET_SENSOR_VALUE + (1, 4, 7), 88),    # powerFactor is not read
+    ])
+    assert updates == {"4": {"current": 1652, "power": 174, "apparentPower": 198}}
+
+
+def test_trap_over_localhost_updates_snapshot_and_spools_event(tmp_path, monkeypatch):
+    # Configured but unreachable Supabase: events stay in the spool
+    monkeypatch.setattr(config, "SUPABASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setattr(config, "SUPABASE_SERVICE_KEY", "test")
+    monkeypatch.setattr(config, "SPOOL_PATH", str(tmp_path / "spool.db"))
+    monkeypatch.setattr(config, "SUPABASE_FLUSH_INTERVAL", 3600)
+    supabase = SupabaseClient()
+
+    client = SimpleNamespace(device_id="test", pdu_ip="127.0.0.1", sensors=SensorMetadata(4, {"current": 1}))
+    poller = OutletPoller(client)
+    poller._publish([
+        {"id": "1", "name": "Outlet 1", "state": "on", "voltage": 120, "current": 1.0},
+        {"id": "2", "name": "Outlet 2", "state": "on", "voltage": 120, "current": 2.0},
+    ])
+    device_config = SimpleNamespace(host="127.0.0.1", name="Test PDU", community="public", version="2c")
+    device = SimpleNamespace(id="test", config=device_config, client=client, poller=poller)
+    handler = OutletTrapHandler(
+        SimpleNamespace(devices={"test": device}),
+        event_sink=lambda device, outlet_id, event_type, new_state: supabase.queue_outlet_event(
+            outlet_id, event_type, new_state, device.config
+        ),
+        communities=["public"]
+    )
+
+    async def receive():
+        transport = await start_trap_receiver(handler, "127.0.0.1", 0)
+        try:
+            port = transport.get_extra_info("sockname")[1]
+            send_synthetic_trap("127.0.0.1", port, "public", 2, "off")
+            for _ in range(100):
+                if handler.received:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            transport.close()
+
+    try:
+        asyncio.run(receive())
+
+        assert handler.stats() == {"received": 1, "applied": 1, "ignored": 0}
+        assert poller.snapshot.by_id["2"]["state"] == "off"
+        assert poller.snapshot.by_id["1"]["state"] == "on"
+
+        records = supabase.spool.peek(10)
+        assert [kind for _, kind, _ in records] == ["outlet_events"]
+        row = records[0][2]["row"]
+        assert row["outlet_number"] == 2
+        assert "outlet_id" not in row
+        assert row["event_type"] == "state_change"
+        assert row["new_state"] == "off"
+        assert records[0][2]["device"]["host"] == "127.0.0.1"
+    finally:
+        supabase.close()
@@ -0,0 +1,168 @@
+"""In-memory history of outlet readings.
+
+Every outlet gets a fixed-capacity ring buffer backed by typed arrays
+(timestamp, voltage, current, on/off: 17 bytes per sample), so memory is
+bounded by HISTORY_SAMPLES regardless of how long the agent runs. Queries
+aggregate a time range into min/avg/max buckets: bucket boundaries are found
+by bisecting the timestamp array and each bucket is reduced with min()/max()/
+sum() over array slices, so the per-sample work runs in C. A reading the PDU
+did not report is stored as NaN and left out of that bucket's statistics.
+"""
+import math
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+# Upper bound on buckets returned by one query
+MAX_BUCKETS = 2000
+
+
+class OutletSeries:
+    """Ring buffer of one outlet's (time, voltage, current, on) samples in time order"""
+    __slots__ = ("capacity", "times", "voltage", "current", "state", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # Allocated once; the oldest sample is overwritten when full
+        self.times = array("d", bytes(8 * capacity))
+        self.voltage = array("f", bytes(4 * capacity))
+        self.current = array("f", bytes(4 * capacity))
+        self.state = array("b", bytes(capacity))
+        self.head = 0
+        self.size = 0
+
+    def newest(self) -> Optional[float]:
+        return self.times[self.head - 1] if self.size else None
+
+    def oldest(self) -> Optional[float]:
+        if not self.size:
+            return None
+        return self.times[self.head if self.size == self.capacity else 0]
+
+    def append(self, timestamp: float, voltage: Any, current: Any, on: bool) -> bool:
+        """Add a sample; samples older than the newest one are dropped"""
+        if self.size and timestamp < self.times[self.head - 1]:
+            return False
+        index = self.head
+        self.times[index] = timestamp
+        self.voltage[index] = _stored(voltage)
+        self.current[index] = _stored(current)
+        self.state[index] = 1 if on else 0
+        self.head = (index + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return True
+
+    def _segments(self) -> List[Tuple[int, int]]:
+        """Physical index ranges holding the samples, oldest range first"""
+        if self.size < self.capacity:
+            return [(0, self.size)]
+        if self.head == 0:
+            return [(0, self.capacity)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def query(self, start: float, end: float, step: float) -> List[Dict[str, Any]]:
+        """min/avg/max of voltage and current per step-second bucket in [start, end)"""
+        buckets = int(math.ceil((end - start) / step))
+        edges = [start + step * index for index in range(buckets)] + [end]
+        # Per segment, the first sample index at or after every bucket edge
+        bounds = [[bisect_left(self.times, edge, lo, hi) for edge in edges] for lo, hi in self._segments()]
+
+        result = []
+        for index in range(buckets):
+            slices = [(positions[index], positions[index + 1]) for positions in bounds
+                      if positions[index] < positions[index + 1]]
+            if not slices:
+                continue
+            if len(slices) == 1:
+                lo, hi = slices[0]
+                voltage, current, state = self.voltage[lo:hi], self.current[lo:hi], self.state[lo:hi]
+            else:
+                # The bucket spans the wrap-around point of the ring
+                voltage, current, state = array("f"), array("f"), array("b")
+                for lo, hi in slices:
+                    voltage += self.voltage[lo:hi]
+                    current += self.current[lo:hi]
+                    state += self.state[lo:hi]
+            count = len(voltage)
+            result.append({
+                "start": datetime.fromtimestamp(edges[index]).isoformat(),
+                "count": count,
+                "voltage": _stats(voltage, count),
+                "current": _stats(current, count),
+                # Share of samples in which the outlet was on
+                "onRatio": round(sum(state) / count, 3)
+            })
+        return result
+
+
+def _stored(value: Any) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _stats(values: array, count: int) -> Dict[str, Optional[float]]:
+    total = sum(values)
+    if math.isnan(total):
+        # Some samples have no reading: only the others count
+        values = [value for value in values if not math.isnan(value)]
+        if not values:
+            return {"min": None, "avg": None, "max": None}
+        total, count = sum(values), len(values)
+    return {
+        "min": round(min(values), 3),
+        "avg": round(total / count, 3),
+        "max": round(max(values), 3)
+    }
+
+
+def check_range(start: float, end: float, step: float) -> None:
+    """Reject empty ranges, non-positive resolutions and queries with too many buckets"""
+    if step <= 0 or end <= start:
+        raise ValueError("History range must be non-empty and resolution positive")
+    if (end - start) / step > MAX_BUCKETS:
+        raise ValueError(f"History query would return more than {MAX_BUCKETS} buckets")
+
+
+class OutletHistory:
+    """Recent readings of every outlet of one PDU, fed from the poller"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.series: Dict[str, OutletSeries] = {}
+
+    def record(self, outlets: List[Dict[str, Any]], timestamp: Optional[float] = None) -> None:
+        """Append one sample per outlet (outlets without readings are skipped)"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        for outlet in outlets:
+            if outlet.get("state") not in ("on", "off"):
+                continue
+            series = self.series.get(outlet["id"])
+            if series is None:
+                series = self.series[outlet["id"]] = OutletSeries(self.capacity)
+            series.append(timestamp, outlet.get("voltage"), outlet.get("current"), outlet["state"] == "on")
+
+    def covers(self, outlet_id: str, start: float) -> bool:
+        """Whether local samples reach back to start"""
+        series = self.series.get(outlet_id)
+        if series is None or not series.size:
+            return False
+        return series.oldest() <= start
+
+    def query(self, outlet_id: str, start: float, end: float, step: float) -> List[Dict[str, Any]]:
+        check_range(start, end, step)
+        series = self.series.get(outlet_id)
+        if series is None:
+            return []
+        return series.query(start, end, step)
+
+    def stats(self) -> Dict[str, Any]:
+        series = list(self.series.values())
+        return {
+            "outlets": len(series),
+            "capacity": self.capacity,
+            "samples": sum(entry.size for entry in series),
+            "bytes": len(series) * self.capacity * 17,
+            "oldest": min((entry.oldest() for entry in series if entry.size), default=None)
+        }
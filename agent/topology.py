@@ -0,0 +1,102 @@
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+from snmp_types import to_native
+
+# PDU2-MIB unitConfigurationTable (.pdu), for PDU 1
+INLET_COUNT = ".1.3.6.1.4.1.13742.6.3.2.2.1.2.1"
+OUTLET_COUNT = ".1.3.6.1.4.1.13742.6.3.2.2.1.4.1"
+
+# Label and name columns of the inlet/outlet configuration tables (.pdu.inlet|outlet)
+INLET_LABEL = ".1.3.6.1.4.1.13742.6.3.3.3.1.2.1"
+INLET_NAME = ".1.3.6.1.4.1.13742.6.3.3.3.1.3.1"
+OUTLET_LABEL = ".1.3.6.1.4.1.13742.6.3.5.3.1.2.1"
+OUTLET_NAME = ".1.3.6.1.4.1.13742.6.3.5.3.1.3.1"
+TOPOLOGY_COLUMNS = [INLET_LABEL, INLET_NAME, OUTLET_LABEL, OUTLET_NAME]
+
+# measurements*SensorIsAvailable (.pdu.inlet|outlet.sensorType) of inlet 1 and outlet 1
+INLET_SENSORS = ".1.3.6.1.4.1.13742.6.5.2.3.1.2.1.1"
+OUTLET_SENSORS = ".1.3.6.1.4.1.13742.6.5.4.3.1.2.1.1"
+SENSOR_COLUMNS = [INLET_SENSORS, OUTLET_SENSORS]
+TRUTH_TRUE = 1
+
+# SensorTypeEnumeration
+SENSOR_TYPES = {
+    1: "rmsCurrent", 2: "peakCurrent", 3: "unbalancedCurrent", 4: "rmsVoltage", 5: "activePower",
+    6: "apparentPower", 7: "powerFactor", 8: "activeEnergy", 9: "apparentEnergy", 14: "onOff",
+    15: "trip", 23: "frequency", 24: "phaseAngle", 25: "residualCurrent"
+}
+
+
+class Topology:
+    """What one PDU has: its inlets and outlets (with names) and the sensor types they report.
+
+    Discovered once per device by walking the configuration tables, then kept
+    until the PDU reports a different outlet count (the count is read along
+    with every poll) or a rediscovery is requested.
+    """
+
+    def __init__(self, inlet_count: Optional[int], outlet_count: Optional[int],
+                 inlets: Dict[int, Dict[str, str]], outlets: Dict[int, Dict[str, str]],
+                 inlet_sensors: List[int], outlet_sensors: List[int]):
+        self.inlet_count = inlet_count
+        self.outlet_count = outlet_count
+        self.inlets = inlets
+        self.outlets = outlets
+        self.inlet_sensors = inlet_sensors
+        self.outlet_sensors = outlet_sensors
+        self.discovered_at = datetime.now().isoformat()
+
+    @classmethod
+    def from_snmp(cls, counts: List[Optional[Any]], tables: Dict[str, Dict[Tuple[int, ...], Any]],
+                  sensors: Dict[str, Dict[Tuple[int, ...], Any]]) -> "Topology":
+        """Build from the GET of (INLET_COUNT, OUTLET_COUNT) and the walks of the columns above"""
+        inlet_count, outlet_count = (to_native(value) for value in counts)
+        return cls(
+            inlet_count=inlet_count,
+            outlet_count=outlet_count,
+            inlets=cls._entries(tables[INLET_LABEL], tables[INLET_NAME], inlet_count),
+            outlets=cls._entries(tables[OUTLET_LABEL], tables[OUTLET_NAME], outlet_count),
+            inlet_sensors=cls._available(sensors[INLET_SENSORS]),
+            outlet_sensors=cls._available(sensors[OUTLET_SENSORS])
+        )
+
+    @staticmethod
+    def _entries(labels: Dict[Tuple[int, ...], Any], names: Dict[Tuple[int, ...], Any],
+                 count: Optional[int]) -> Dict[int, Dict[str, str]]:
+        numbers = {index[0] for index in labels} | {index[0] for index in names}
+        if not numbers and count:
+            numbers = set(range(1, count + 1))
+        entries = {}
+        for num in sorted(numbers):
+            label = to_native(labels.get((num,))) or str(num)
+            entries[num] = {"label": label, "name": to_native(names.get((num,))) or ""}
+        return entries
+
+    @staticmethod
+    def _available(rows: Dict[Tuple[int, ...], Any]) -> List[int]:
+        return sorted(index[0] for index, value in rows.items() if to_native(value) == TRUTH_TRUE)
+
+    def outlet_nums(self) -> List[int]:
+        return list(self.outlets)
+
+    def outlet_name(self, outlet_num: int) -> str:
+        entry = self.outlets.get(outlet_num)
+        if entry is None:
+            return f"Outlet {outlet_num}"
+        return entry["name"] or f"Outlet {entry['label']}"
+
+    def changed(self, outlet_count: Any) -> bool:
+        """Whether an outlet count read during a poll differs from the discovered one"""
+        outlet_count = to_native(outlet_count)
+        return outlet_count is not None and outlet_count != self.outlet_count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "inletCount": self.inlet_count,
+            "outletCount": self.outlet_count,
+            "inlets": [dict(entry, id=str(num)) for num, entry in self.inlets.items()],
+            "outlets": [dict(entry, id=str(num)) for num, entry in self.outlets.items()],
+            "inletSensors": [SENSOR_TYPES.get(sensor, str(sensor)) for sensor in self.inlet_sensors],
+            "outletSensors": [SENSOR_TYPES.get(sensor, str(sensor)) for sensor in self.outlet_sensors],
+            "discoveredAt": self.discovered_at
+        }
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""SNMP trap receiver for event-driven outlet state updates.
+
+Listens for Raritan PDU2-MIB notifications on UDP, decodes them and applies
+outlet switching state / sensor values to the poller snapshot of the PDU that
+sent them. State transitions are also recorded as outlet_events rows.
+
+Run as a script to send a synthetic trap, e.g. to test a running agent:
+
+    python traps.py --host 127.0.0.1 --port 1162 --outlet 3 --state off
+"""
+import argparse
+import asyncio
+import socket
+import sys
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+
+# SNMPv2-MIB objects carried by every v2c notification
+SYS_UPTIME_OID = (1, 3, 6, 1, 2, 1, 1, 3, 0)
+SNMP_TRAP_OID = (1, 3, 6, 1, 6, 3, 1, 1, 4, 1, 0)
+
+# PDU2-MIB notifications (pdu2.0.N)
+PDU2_TRAPS = (1, 3, 6, 1, 4, 1, 13742, 6, 0)
+TRAP_NAMES = {
+    PDU2_TRAPS + (23,): "powerControl",
+    PDU2_TRAPS + (61,): "inletSensorStateChange",
+    PDU2_TRAPS + (63,): "outletSensorStateChange",
+}
+
+# PDU2-MIB columns that may appear in the var-binds of those notifications
+OUTLET_SWITCHING_STATE = (1, 3, 6, 1, 4, 1, 13742, 6, 4, 1, 2, 1, 3)  # .pdu.outlet
+OUTLET_SENSOR_STATE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 4, 3, 1, 3)     # .pdu.outlet.sensorType
+OUTLET_SENSOR_VALUE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 4, 3, 1, 4)     # .pdu.outlet.sensorType
+INLET_SENSOR_VALUE = (1, 3, 6, 1, 4, 1, 13742, 6, 5, 2, 3, 1, 4)      # .pdu.inlet.sensorType
+
+# Sensor types and onOff sensor states
+SENSOR_VOLTAGE = 4  # rmsVoltage
+SENSOR_CURRENT = 1  # rmsCurrent
+SENSOR_ACTIVE_POWER = 5
+SENSOR_APPARENT_POWER = 6
+SENSOR_ON_OFF = 14
+SENSOR_STATE_ON = 7
+SENSOR_STATE_OFF = 8
+# outletSwitchingState uses the same on(7)/off(8) values
+SWITCHING_STATES = {SENSOR_STATE_ON: "on", SENSOR_STATE_OFF: "off"}
+# Outlet sensors carried as readings, by outlet field
+OUTLET_SENSOR_FIELDS = {SENSOR_CURRENT: "current", SENSOR_ACTIVE_POWER: "power", SENSOR_APPARENT_POWER: "apparentPower"}
+
+
+def decode_trap(data: bytes) -> Optional[Tuple[str, Tuple[int, ...], List[Tuple[Tuple[int, ...], Any]]]]:
+    """Decode an SNMPv1/v2c trap into (community, trap OID, var-binds); None if it is not a trap"""
+    version = int(api.decodeMessageVersion(data))
+    if version not in api.protoModules:
+        return None
+    proto = api.protoModules[version]
+
+    message, _ = decoder.decode(data, asn1Spec=proto.Message())
+    pdu = proto.apiMessage.getPDU(message)
+    if not pdu.isSameTypeWith(proto.TrapPDU()):
+        return None
+    community = str(proto.apiMessage.getCommunity(message))
+
+    if version == api.protoVersion1:
+        # RFC 3584: a v1 enterprise-specific trap maps to enterprise.0.specificTrap
+        enterprise = tuple(proto.apiTrapPDU.getEnterprise(pdu))
+        trap_oid = enterprise + (0, int(proto.apiTrapPDU.getSpecificTrap(pdu)))
+        var_binds = [(tuple(name), value) for name, value in proto.apiTrapPDU.getVarBinds(pdu)]
+    else:
+        var_binds = [(tuple(name), value) for name, value in proto.apiPDU.getVarBinds(pdu)]
+        trap_oid = ()
+        for name, value in var_binds:
+            if name == SNMP_TRAP_OID:
+                trap_oid = tuple(value)
+                break
+    return community, trap_oid, var_binds
+
+
+def encode_trap(community: str, trap_oid: Tuple[int, ...], var_binds: List[Tuple[Tuple[int, ...], Any]]) -> bytes:
+    """Encode an SNMPv2c trap; used for synthetic traps"""
+    proto = api.protoModules[api.protoVersion2c]
+    pdu = proto.TrapPDU()
+    proto.apiTrapPDU.setDefaults(pdu)
+    proto.apiTrapPDU.setVarBinds(pdu, [
+        (SYS_UPTIME_OID, proto.TimeTicks(0)),
+        (SNMP_TRAP_OID, proto.ObjectIdentifier(trap_oid)),
+    ] + list(var_binds))
+
+    message = proto.Message()
+    proto.apiMessage.setDefaults(message)
+    proto.apiMessage.setCommunity(message, community)
+    proto.apiMessage.setPDU(message, pdu)
+    return encoder.encode(message)
+
+
+def parse_outlet_updates(var_binds: List[Tuple[Tuple[int, ...], Any]]) -> Tuple[Dict[str, Dict[str, Any]], Optional[Any]]:
+    """Extract per-outlet field updates and the inlet voltage (if present) from trap var-binds"""
+    outlets: Dict[str, Dict[str, Any]] = {}
+    voltage = None
+
+    for name, value in var_binds:
+        if name[:len(OUTLET_SWITCHING_STATE)] == OUTLET_SWITCHING_STATE and len(name) == len(OUTLET_SWITCHING_STATE) + 2:
+            if int(value) in SWITCHING_STATES:
+                outlets.setdefault(str(name[-1]), {})["state"] = SWITCHING_STATES[int(value)]
+        elif name[:len(OUTLET_SENSOR_STATE)] == OUTLET_SENSOR_STATE and len(name) == len(OUTLET_SENSOR_STATE) + 3:
+            outlet_num, sensor_type = name[-2], name[-1]
+            if sensor_type == SENSOR_ON_OFF and int(value) in SWITCHING_STATES:
+                outlets.setdefault(str(outlet_num), {})["state"] = SWITCHING_STATES[int(value)]
+        elif name[:len(OUTLET_SENSOR_VALUE)] == OUTLET_SENSOR_VALUE and len(name) == len(OUTLET_SENSOR_VALUE) + 3:
+            outlet_num, sensor_type = name[-2], name[-1]
+            if sensor_type in OUTLET_SENSOR_FIELDS:
+                outlets.setdefault(str(outlet_num), {})[OUTLET_SENSOR_FIELDS[sensor_type]] = int(value)
+        elif name[:len(INLET_SENSOR_VALUE)] == INLET_SENSOR_VALUE and len(name) == len(INLET_SENSOR_VALUE) + 3:
+            inlet_num, sensor_type = name[-2], name[-1]
+            if inlet_num == 1 and sensor_type == SENSOR_VOLTAGE:
+                voltage = int(value)
+
+    return outlets, voltage
+
+
+class OutletTrapHandler:
+    """Applies decoded PDU2-MIB traps to the fleet's outlet snapshots"""
+
+    def __init__(self, fleet, event_sink=None, communities: Optional[List[str]] = None):
+        self.fleet = fleet
+        # Called as event_sink(device, outlet_id, event_type, new_state) for state transitions
+        self.event_sink = event_sink
+        self.communities = set(communities) if communities else None
+        self.received = 0
+        self.applied = 0
+        self.ignored = 0
+
+        # Traps arrive from an IP address; map it back to the fleet device
+        self.devices_by_address: Dict[str, Any] = {}
+        for device in fleet.devices.values():
+            try:
+                self.devices_by_address[socket.gethostbyname(device.config.host)] = device
+            except OSError as e:
+                print(f"Cannot resolve {device.config.host} for trap matching: {e}")
+
+    def handle(self, address: str, data: bytes) -> None:
+        self.received += 1
+        try:
+            decoded = decode_trap(data)
+        except Exception as e:
+            print(f"Error decoding trap from {address}: {e}")
+            self.ignored += 1
+            return
+        if decoded is None:
+            self.ignored += 1
+            return
+
+        community, trap_oid, var_binds = decoded
+        device = self.devices_by_address.get(address)
+        if device is None or (self.communities is not None and community not in self.communities):
+            self.ignored += 1
+            return
+
+        updates, voltage = parse_outlet_updates(var_binds)
+        if not updates and voltage is None:
+            self.ignored += 1
+            return
+
+        # Trap var-binds carry raw readings; apply the PDU's cached decimal digits
+        sensors = device.client.sensors
+        for outlet_id, fields in updates.items():
+            for field in OUTLET_SENSOR_FIELDS.values():
+                if field in fields:
+                    fields[field] = sensors.reading(int(outlet_id), field, fields[field])
+        if voltage is not None:
+            voltage = sensors.voltage(voltage)
+
+        snapshot = device.poller.snapshot
+        previous = snapshot.by_id if snapshot else {}
+        now = datetime.now().isoformat()
+
+        changed = []
+        for outlet_id, fields in updates.items():
+            fields["id"] = outlet_id
+            fields["lastUpdated"] = now
+            changed.append(fields)
+            new_state = fields.get("state")
+            old_state = previous.get(outlet_id, {}).get("state")
+            if new_state is not None and new_state != old_state and self.event_sink is not None:
+                self.event_sink(device, outlet_id, "state_change", new_state)
+        if voltage is not None:
+            for outlet_id in previous:
+                if outlet_id not in updates:
+                    changed.append({"id": outlet_id, "voltage": voltage, "lastUpdated": now})
+            for fields in changed:
+                fields.setdefault("voltage", voltage)
+
+        device.poller.update_outlets(changed)
+        self.applied += 1
+        print(f"Applied {TRAP_NAMES.get(trap_oid, trap_oid)} trap from {address} to {len(changed)} outlet(s)")
+
+    def stats(self) -> Dict[str, int]:
+        return {"received": self.received, "applied": self.applied, "ignored": self.ignored}
+
+
+class TrapProtocol(asyncio.DatagramProtocol):
+    """asyncio UDP endpoint feeding datagrams to an OutletTrapHandler"""
+
+    def __init__(self, handler: OutletTrapHandler):
+        self.handler = handler
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.handler.handle(addr[0], data)
+
+
+async def start_trap_receiver(handler: OutletTrapHandler, host: str, port: int):
+    """Bind the trap listener on the running loop and return its transport"""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: TrapProtocol(handler), local_addr=(host, port))
+    return transport
+
+
+def send_synthetic_trap(host: str, port: int, community: str, outlet: int, state: str,
+                        current: Optional[int] = None) -> None:
+    """Send a PDU2-MIB powerControl trap for one outlet over UDP"""
+    value = SENSOR_STATE_ON if state == "on" else SENSOR_STATE_OFF
+    var_binds = [(OUTLET_SWITCHING_STATE + (1, outlet), api.protoModules[api.protoVersion2c].Integer(value))]
+    if current is not None:
+        var_binds.append((OUTLET_SENSOR_VALUE + (1, outlet, SENSOR_CURRENT),
+                          api.protoModules[api.protoVersion2c].Gauge32(current)))
+    data = encode_trap(community, PDU2_TRAPS + (23,), var_binds)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(data, (host, port))
+    finally:
+        sock.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Send a synthetic PDU2-MIB outlet trap")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=162)
+    parser.add_argument("--community", default="public")
+    parser.add_argument("--outlet", type=int, required=True)
+    parser.add_argument("--state", choices=["on", "off"], required=True)
+    parser.add_argument("--current", type=int)
+    args = parser.parse_args()
+
+    send_synthetic_trap(args.host, args.port, args.community, args.outlet, args.state, args.current)
+    print(f"Sent powerControl trap for outlet {args.outlet} ({args.state}) to {args.host}:{args.port}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,8 +10,8 @@ interface OutletProps {
     id: string;
     name: string;
     state: string;
-    voltage?: number;
-    current?: number;
+    voltage?: number | null;
+    current?: number | null;
     lastUpdated?: string;
   };
 }
@@ -22,6 +22,31 @@ export default function OutletControl({ outlet }: OutletProps) {
   const agentApiUrl =
     process.env.NEXT_PUBLIC_AGENT_API_URL || "https://pdu.beardsys.com:5000";
 
+  // Control requests return 202 with an operation; poll it until the PDU confirms
+  const waitForOperation = async (response: Response) => {
+    let operation = await response.json();
+    if (response.status !== 202) {
+      return operation;
+    }
+    while (operation.status === "pending" || operation.status === "running") {
+      await new Promise((resolve) => setTimeout(resolve, 500));
+      const statusResponse = await fetch(
+        `${agentApiUrl}/operations/${operation.id}`,
+        { mode: "cors", cache: "no-cache" },
+      );
+      if (!statusResponse.ok) {
+        throw new Error(
+          `Failed to read operation status: ${statusResponse.statusText}`,
+        );
+      }
+      operation = await statusResponse.json();
+    }
+    if (operation.status === "failed") {
+      throw new Error(operation.error || "Operation failed");
+    }
+    return operation.result || {};
+  };
+
   const toggleOutlet = async () => {
     setIsLoading(true);
     try {
@@ -44,7 +69,7 @@ export default function OutletControl({ outlet }: OutletProps) {
         throw new Error(`Failed to toggle outlet: ${response.statusText}`);
       }
 
-      const data = await response.json();
+      const data = await waitForOperation(response);
 
       toast({
         title: "Outlet toggled",
@@ -86,7 +111,7 @@ export default function OutletControl({ outlet }: OutletProps) {
         throw new Error(`Failed to cycle outlet: ${response.statusText}`);
       }
 
-      const data = await response.json();
+      await waitForOperation(response);
 
       toast({
         title: "Outlet cycled",
@@ -44,8 +44,10 @@ export default function OutletHistory({ outletId }: OutletHistoryProps) {
   const fetchHistory = async () => {
     setLoading(true);
     try {
+      // Last 24 hours in 15 minute min/avg/max buckets
+      const start = new Date(Date.now() - 24 * 60 * 60 * 1000).toISOString();
       const response = await fetch(
-        `${agentApiUrl}/outlets/${outletId}/history?limit=100`,
+        `${agentApiUrl}/outlets/${outletId}/history?start=${encodeURIComponent(start)}&resolution=900&limit=1000`,
       );
 
       if (!response.ok) {
@@ -54,14 +56,26 @@ export default function OutletHistory({ outletId }: OutletHistoryProps) {
 
       const data = await response.json();
 
-      // Transform data for the chart
-      const formattedData = data.map((reading: any) => ({
-        timestamp: new Date(reading.created_at).toLocaleString(),
-        voltage: reading.voltage || 0,
-        current: reading.current || 0,
-        power: (reading.voltage || 0) * (reading.current || 0),
-        state: reading.state,
-      }));
+      // Transform data for the chart: buckets from the agent's buffer, or raw Supabase readings
+      const formattedData = data.buckets
+        ? data.buckets.map((bucket: any) => ({
+            timestamp: new Date(bucket.start).toLocaleString(),
+            voltage: bucket.voltage.avg,
+            current: bucket.current.avg,
+            power: bucket.voltage.avg * bucket.current.avg,
+            state: bucket.onRatio >= 0.5 ? "on" : "off",
+          }))
+        : (data.readings || [])
+            .slice()
+            .reverse()
+            .map((reading: any) => ({
+              timestamp: new Date(reading.created_at).toLocaleString(),
+              voltage: reading.voltage || 0,
+              current: reading.current || 0,
+              // Stored active power when the PDU measures it, otherwise V x I
+              power: reading.power ?? (reading.voltage || 0) * (reading.current || 0),
+              state: reading.state,
+            }));
 
       setHistoryData(formattedData);
     } catch (error) {
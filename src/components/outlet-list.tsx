@@ -2,7 +2,6 @@
 
 import { useEffect, useState } from "react";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
-import { createClient } from "@supabase/supabase-js";
 import OutletControl from "@/components/outlet-control";
 import { useToast } from "@/components/ui/use-toast";
 
@@ -10,8 +9,9 @@ interface Outlet {
   id: string;
   name: string;
   state: string;
-  voltage: number;
-  current: number;
+  // null when the PDU did not report the reading
+  voltage: number | null;
+  current: number | null;
   lastUpdated: string;
 }
 
@@ -22,18 +22,28 @@ export default function OutletList() {
   const agentApiUrl =
     process.env.NEXT_PUBLIC_AGENT_API_URL || "https://pdu.beardsys.com:5000";
 
-  // Initialize Supabase client
-  const supabase = createClient(
-    process.env.NEXT_PUBLIC_SUPABASE_URL || "",
-    process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY || "",
-  );
-
   useEffect(() => {
+    // Snapshot version of the outlets shown; later polls only fetch what changed since
+    let version: number | null = null;
+    const mergeOutlets = (changed: Outlet[]) => {
+      const byId = new Map<string, Outlet>(
+        changed.map((outlet) => [outlet.id, outlet]),
+      );
+      setOutlets((current) =>
+        current.map((outlet) => ({ ...outlet, ...byId.get(outlet.id) })),
+      );
+    };
+
     // Fetch initial outlet data
     const fetchOutlets = async () => {
       try {
-        console.log(`Fetching outlets from: ${agentApiUrl}/outlets`);
-        const response = await fetch(`${agentApiUrl}/outlets`, {
+        const url =
+          version === null
+            ? `${agentApiUrl}/outlets`
+            : `${agentApiUrl}/outlets?since=${version}`;
+        console.log(`Fetching outlets from: ${url}`);
+        // no-cache revalidates with If-None-Match: unchanged outlets cost a 304
+        const response = await fetch(url, {
           method: "GET",
           headers: {
             "Content-Type": "application/json",
@@ -45,7 +55,12 @@ export default function OutletList() {
           throw new Error(`Failed to fetch outlets: ${response.statusText}`);
         }
         const data = await response.json();
-        setOutlets(data.outlets || []);
+        if (data.delta) {
+          mergeOutlets(data.outlets || []);
+        } else {
+          setOutlets(data.outlets || []);
+        }
+        version = data.version ?? null;
       } catch (error) {
         console.error("Error fetching outlets:", error);
         toast({
@@ -87,28 +102,48 @@ export default function OutletList() {
 
     fetchOutlets();
 
-    // Set up realtime subscription for outlet changes
-    const subscription = supabase
-      .channel("outlet_changes")
-      .on(
-        "postgres_changes",
-        { event: "UPDATE", schema: "public", table: "outlet_readings" },
-        (payload) => {
-          // Update the outlet data when changes occur
+    // Stream outlet changes from the agent: one snapshot, then per-outlet diffs
+    let pollingInterval: ReturnType<typeof setInterval> | null = null;
+    const startPolling = () => {
+      if (pollingInterval === null) {
+        pollingInterval = setInterval(() => {
           fetchOutlets();
-        },
-      )
-      .subscribe();
+        }, 30000); // Poll every 30 seconds
+      }
+    };
+    const stopPolling = () => {
+      if (pollingInterval !== null) {
+        clearInterval(pollingInterval);
+        pollingInterval = null;
+      }
+    };
 
-    // Set up polling as a fallback for realtime updates
-    const pollingInterval = setInterval(() => {
-      fetchOutlets();
-    }, 30000); // Poll every 30 seconds
+    let eventSource: EventSource | null = null;
+    if (typeof EventSource !== "undefined") {
+      eventSource = new EventSource(`${agentApiUrl}/outlets/stream`);
+      eventSource.onopen = () => stopPolling();
+      eventSource.addEventListener("snapshot", (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        setOutlets(data.outlets || []);
+        version = data.version || null;
+        setLoading(false);
+      });
+      eventSource.addEventListener("diff", (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        mergeOutlets(data.outlets || []);
+        version = data.version ?? version;
+      });
+      // EventSource reconnects by itself; poll in the meantime
+      eventSource.onerror = () => startPolling();
+    } else {
+      // Fall back to polling when streaming is not available
+      startPolling();
+    }
 
-    // Clean up subscription and polling on unmount
+    // Clean up stream and polling on unmount
     return () => {
-      subscription.unsubscribe();
-      clearInterval(pollingInterval);
+      eventSource?.close();
+      stopPolling();
     };
   }, [agentApiUrl, toast]);
 
@@ -141,14 +176,17 @@ export default function OutletList() {
                 </div>
 
                 <div className="text-muted-foreground">Voltage:</div>
-                <div className="font-medium">{outlet.voltage} V</div>
+                <div className="font-medium">{outlet.voltage ?? "–"} V</div>
 
                 <div className="text-muted-foreground">Current:</div>
-                <div className="font-medium">{outlet.current} A</div>
+                <div className="font-medium">{outlet.current ?? "–"} A</div>
 
                 <div className="text-muted-foreground">Power:</div>
                 <div className="font-medium">
-                  {(outlet.voltage * outlet.current).toFixed(1)} W
+                  {outlet.voltage !== null && outlet.current !== null
+                    ? (outlet.voltage * outlet.current).toFixed(1)
+                    : "–"}{" "}
+                  W
                 </div>
               </div>
 
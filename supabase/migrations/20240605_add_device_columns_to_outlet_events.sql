@@ -0,0 +1,8 @@
+-- Link outlet events to the PDU that reported them
+-- The agent records trap-driven state changes per device and outlet number
+
+ALTER TABLE outlet_events ADD COLUMN IF NOT EXISTS device_id UUID REFERENCES devices(id) ON DELETE CASCADE;
+ALTER TABLE outlet_events ADD COLUMN IF NOT EXISTS outlet_number INTEGER;
+
+CREATE INDEX IF NOT EXISTS outlet_events_device_outlet_created_idx
+  ON outlet_events (device_id, outlet_number, created_at DESC);
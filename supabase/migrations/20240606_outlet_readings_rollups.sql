@@ -0,0 +1,165 @@
+-- Indexes, rollups and retention for outlet_readings
+-- The agent writes readings per device and outlet number (in bulk, from its spool)
+-- and reads history by device, outlet and time range. Raw rows are rolled up into
+-- 1-minute and 1-hour aggregates as they are inserted and pruned after a while.
+
+ALTER TABLE outlet_readings ADD COLUMN IF NOT EXISTS device_id UUID REFERENCES devices(id) ON DELETE CASCADE;
+ALTER TABLE outlet_readings ADD COLUMN IF NOT EXISTS outlet_number INTEGER;
+ALTER TABLE outlet_readings ALTER COLUMN outlet_id DROP NOT NULL;
+
+-- History queries: one outlet of one device, newest first
+CREATE INDEX IF NOT EXISTS outlet_readings_device_outlet_created_idx
+  ON outlet_readings (device_id, outlet_number, created_at DESC);
+
+-- Retention deletes by age only; a BRIN index stays tiny on an append-only table
+CREATE INDEX IF NOT EXISTS outlet_readings_created_brin_idx
+  ON outlet_readings USING BRIN (created_at);
+
+-- Aggregates keep sums and counts (not averages) so they can be merged incrementally
+CREATE TABLE IF NOT EXISTS outlet_readings_1m (
+  device_id UUID NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+  outlet_number INTEGER NOT NULL,
+  bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+  samples INTEGER NOT NULL,
+  on_samples INTEGER NOT NULL,
+  voltage_min NUMERIC,
+  voltage_max NUMERIC,
+  voltage_sum NUMERIC,
+  current_min NUMERIC,
+  current_max NUMERIC,
+  current_sum NUMERIC,
+  PRIMARY KEY (device_id, outlet_number, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS outlet_readings_1h (
+  device_id UUID NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+  outlet_number INTEGER NOT NULL,
+  bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+  samples INTEGER NOT NULL,
+  on_samples INTEGER NOT NULL,
+  voltage_min NUMERIC,
+  voltage_max NUMERIC,
+  voltage_sum NUMERIC,
+  current_min NUMERIC,
+  current_max NUMERIC,
+  current_sum NUMERIC,
+  PRIMARY KEY (device_id, outlet_number, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS outlet_readings_1m_bucket_idx ON outlet_readings_1m (bucket);
+
+-- Fold a statement's new rows into both rollups: one upsert per bulk insert, not per row
+CREATE OR REPLACE FUNCTION public.rollup_outlet_readings()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO outlet_readings_1m AS r (device_id, outlet_number, bucket, samples, on_samples,
+                                       voltage_min, voltage_max, voltage_sum,
+                                       current_min, current_max, current_sum)
+  SELECT device_id, outlet_number, date_trunc('minute', created_at), count(*),
+         count(*) FILTER (WHERE state = 'on'),
+         min(voltage), max(voltage), sum(voltage),
+         min(current), max(current), sum(current)
+  FROM new_readings
+  WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+  GROUP BY 1, 2, 3
+  ON CONFLICT (device_id, outlet_number, bucket) DO UPDATE SET
+    samples = r.samples + EXCLUDED.samples,
+    on_samples = r.on_samples + EXCLUDED.on_samples,
+    voltage_min = LEAST(r.voltage_min, EXCLUDED.voltage_min),
+    voltage_max = GREATEST(r.voltage_max, EXCLUDED.voltage_max),
+    voltage_sum = COALESCE(r.voltage_sum, 0) + COALESCE(EXCLUDED.voltage_sum, 0),
+    current_min = LEAST(r.current_min, EXCLUDED.current_min),
+    current_max = GREATEST(r.current_max, EXCLUDED.current_max),
+    current_sum = COALESCE(r.current_sum, 0) + COALESCE(EXCLUDED.current_sum, 0);
+
+  INSERT INTO outlet_readings_1h AS r (device_id, outlet_number, bucket, samples, on_samples,
+                                       voltage_min, voltage_max, voltage_sum,
+                                       current_min, current_max, current_sum)
+  SELECT device_id, outlet_number, date_trunc('hour', created_at), count(*),
+         count(*) FILTER (WHERE state = 'on'),
+         min(voltage), max(voltage), sum(voltage),
+         min(current), max(current), sum(current)
+  FROM new_readings
+  WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+  GROUP BY 1, 2, 3
+  ON CONFLICT (device_id, outlet_number, bucket) DO UPDATE SET
+    samples = r.samples + EXCLUDED.samples,
+    on_samples = r.on_samples + EXCLUDED.on_samples,
+    voltage_min = LEAST(r.voltage_min, EXCLUDED.voltage_min),
+    voltage_max = GREATEST(r.voltage_max, EXCLUDED.voltage_max),
+    voltage_sum = COALESCE(r.voltage_sum, 0) + COALESCE(EXCLUDED.voltage_sum, 0),
+    current_min = LEAST(r.current_min, EXCLUDED.current_min),
+    current_max = GREATEST(r.current_max, EXCLUDED.current_max),
+    current_sum = COALESCE(r.current_sum, 0) + COALESCE(EXCLUDED.current_sum, 0);
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS outlet_readings_rollup ON outlet_readings;
+CREATE TRIGGER outlet_readings_rollup
+  AFTER INSERT ON outlet_readings
+  REFERENCING NEW TABLE AS new_readings
+  FOR EACH STATEMENT EXECUTE FUNCTION public.rollup_outlet_readings();
+
+-- Backfill the rollups from readings written before this migration
+TRUNCATE outlet_readings_1m, outlet_readings_1h;
+
+INSERT INTO outlet_readings_1m (device_id, outlet_number, bucket, samples, on_samples,
+                                voltage_min, voltage_max, voltage_sum,
+                                current_min, current_max, current_sum)
+SELECT device_id, outlet_number, date_trunc('minute', created_at), count(*),
+       count(*) FILTER (WHERE state = 'on'),
+       min(voltage), max(voltage), sum(voltage),
+       min(current), max(current), sum(current)
+FROM outlet_readings
+WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+GROUP BY 1, 2, 3;
+
+INSERT INTO outlet_readings_1h (device_id, outlet_number, bucket, samples, on_samples,
+                                voltage_min, voltage_max, voltage_sum,
+                                current_min, current_max, current_sum)
+SELECT device_id, outlet_number, date_trunc('hour', created_at), count(*),
+       count(*) FILTER (WHERE state = 'on'),
+       min(voltage), max(voltage), sum(voltage),
+       min(current), max(current), sum(current)
+FROM outlet_readings
+WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+GROUP BY 1, 2, 3;
+
+-- Retention: raw readings for 7 days, 1-minute rollups for 90 days, 1-hour rollups forever.
+-- Keep in sync with SUPABASE_RAW_RETENTION_DAYS / SUPABASE_ROLLUP_1M_RETENTION_DAYS in the agent
+CREATE OR REPLACE FUNCTION public.prune_outlet_readings(
+  raw_retention INTERVAL DEFAULT INTERVAL '7 days',
+  minute_retention INTERVAL DEFAULT INTERVAL '90 days'
+)
+RETURNS VOID AS $$
+BEGIN
+  DELETE FROM outlet_readings WHERE created_at < now() - raw_retention;
+  DELETE FROM outlet_readings_1m WHERE bucket < now() - minute_retention;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Run the retention job hourly where pg_cron is available; otherwise call
+-- prune_outlet_readings() from any scheduler
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('prune-outlet-readings', '17 * * * *', 'SELECT public.prune_outlet_readings()');
+  END IF;
+END
+$$;
+
+-- Same read access as outlet_readings
+ALTER TABLE outlet_readings_1m ENABLE ROW LEVEL SECURITY;
+ALTER TABLE outlet_readings_1h ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow authenticated users to read outlet rollups" ON outlet_readings_1m;
+CREATE POLICY "Allow authenticated users to read outlet rollups"
+  ON outlet_readings_1m FOR SELECT
+  USING (auth.role() = 'authenticated');
+
+DROP POLICY IF EXISTS "Allow authenticated users to read outlet rollups" ON outlet_readings_1h;
+CREATE POLICY "Allow authenticated users to read outlet rollups"
+  ON outlet_readings_1h FOR SELECT
+  USING (auth.role() = 'authenticated');
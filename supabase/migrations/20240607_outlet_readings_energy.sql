@@ -0,0 +1,8 @@
+-- Energy counters on outlet readings
+-- The agent integrates each outlet's power as it polls and writes the running
+-- total (kWh since the counter started) with every reading, along with the
+-- power (W) of the reading. The consumption of a period is the difference of
+-- the counter between its last and first readings, without rescanning history.
+
+ALTER TABLE outlet_readings ADD COLUMN IF NOT EXISTS power NUMERIC;
+ALTER TABLE outlet_readings ADD COLUMN IF NOT EXISTS energy_kwh NUMERIC;
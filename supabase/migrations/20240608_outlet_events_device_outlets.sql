@@ -0,0 +1,10 @@
+-- Outlet events written by the agent
+-- The agent identifies an outlet by its device and outlet number (20240605),
+-- not by a row of the outlets table, so outlet_id is left NULL on its events.
+-- Depending on which migration created outlet_events, outlet_id is either a
+-- nullable UUID referencing outlets or NOT NULL TEXT, and the columns the
+-- agent writes may be missing.
+
+ALTER TABLE outlet_events ALTER COLUMN outlet_id DROP NOT NULL;
+ALTER TABLE outlet_events ADD COLUMN IF NOT EXISTS new_state TEXT;
+ALTER TABLE outlet_events ADD COLUMN IF NOT EXISTS user_initiated BOOLEAN DEFAULT TRUE;
@@ -0,0 +1,186 @@
+-- Time-weighted rollups for outlet_readings
+-- The agent only writes readings that changed (plus a keyframe every heartbeat),
+-- so stored readings are a step function: each row holds until the next row of
+-- its outlet. Averaging rows would weight a reading that held for a second the
+-- same as one that held for five minutes. The rollups therefore also keep, per
+-- bucket, how long its readings held and the duration-weighted sums; averages
+-- and the on-ratio are taken over time.
+--
+-- A row's hold is only known once the next row of its outlet arrives, so each
+-- insert completes the hold of the outlet's previous row. The hold is credited
+-- to the bucket the row starts in and capped at max_hold seconds (the trigger
+-- argument): a longer gap means the agent was not writing, not that the value
+-- held. Keep it above READING_HEARTBEAT and in sync with READING_MAX_HOLD in
+-- the agent.
+
+ALTER TABLE outlet_readings_1m ADD COLUMN IF NOT EXISTS held_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1m ADD COLUMN IF NOT EXISTS on_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1m ADD COLUMN IF NOT EXISTS voltage_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1m ADD COLUMN IF NOT EXISTS voltage_weighted DOUBLE PRECISION;
+ALTER TABLE outlet_readings_1m ADD COLUMN IF NOT EXISTS current_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1m ADD COLUMN IF NOT EXISTS current_weighted DOUBLE PRECISION;
+
+ALTER TABLE outlet_readings_1h ADD COLUMN IF NOT EXISTS held_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1h ADD COLUMN IF NOT EXISTS on_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1h ADD COLUMN IF NOT EXISTS voltage_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1h ADD COLUMN IF NOT EXISTS voltage_weighted DOUBLE PRECISION;
+ALTER TABLE outlet_readings_1h ADD COLUMN IF NOT EXISTS current_seconds DOUBLE PRECISION NOT NULL DEFAULT 0;
+ALTER TABLE outlet_readings_1h ADD COLUMN IF NOT EXISTS current_weighted DOUBLE PRECISION;
+
+-- Fold a statement's new rows into both rollups. Besides the per-row counts,
+-- sums, minima and maxima of the new rows, every row whose successor is now
+-- known (the outlet's previous row and all new rows but the last) adds its hold.
+CREATE OR REPLACE FUNCTION public.rollup_outlet_readings()
+RETURNS TRIGGER AS $$
+DECLARE
+  max_hold DOUBLE PRECISION := COALESCE(TG_ARGV[0]::DOUBLE PRECISION, 600);
+BEGIN
+  CREATE TEMP TABLE held_readings ON COMMIT DROP AS
+  WITH incoming AS (
+    SELECT device_id, outlet_number, created_at, state, voltage, current, TRUE AS is_new
+    FROM new_readings
+    WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+  ), previous AS (
+    SELECT p.device_id, p.outlet_number, p.created_at, p.state, p.voltage, p.current, FALSE AS is_new
+    FROM (SELECT device_id, outlet_number, min(created_at) AS first_at FROM incoming GROUP BY 1, 2) f
+    CROSS JOIN LATERAL (
+      SELECT r.device_id, r.outlet_number, r.created_at, r.state, r.voltage, r.current
+      FROM outlet_readings r
+      WHERE r.device_id = f.device_id AND r.outlet_number = f.outlet_number AND r.created_at < f.first_at
+      ORDER BY r.created_at DESC
+      LIMIT 1
+    ) p
+  )
+  SELECT readings.*,
+         LEAST(EXTRACT(EPOCH FROM lead(created_at) OVER w - created_at)::DOUBLE PRECISION, max_hold) AS seconds
+  FROM (SELECT * FROM incoming UNION ALL SELECT * FROM previous) readings
+  WINDOW w AS (PARTITION BY device_id, outlet_number ORDER BY created_at);
+
+  INSERT INTO outlet_readings_1m AS r (device_id, outlet_number, bucket, samples, on_samples,
+                                       voltage_min, voltage_max, voltage_sum,
+                                       current_min, current_max, current_sum,
+                                       held_seconds, on_seconds, voltage_seconds, voltage_weighted,
+                                       current_seconds, current_weighted)
+  SELECT device_id, outlet_number, date_trunc('minute', created_at),
+         count(*) FILTER (WHERE is_new),
+         count(*) FILTER (WHERE is_new AND state = 'on'),
+         min(voltage) FILTER (WHERE is_new), max(voltage) FILTER (WHERE is_new), sum(voltage) FILTER (WHERE is_new),
+         min(current) FILTER (WHERE is_new), max(current) FILTER (WHERE is_new), sum(current) FILTER (WHERE is_new),
+         COALESCE(sum(seconds), 0),
+         COALESCE(sum(seconds) FILTER (WHERE state = 'on'), 0),
+         COALESCE(sum(seconds) FILTER (WHERE voltage IS NOT NULL), 0),
+         sum(voltage::DOUBLE PRECISION * seconds),
+         COALESCE(sum(seconds) FILTER (WHERE current IS NOT NULL), 0),
+         sum(current::DOUBLE PRECISION * seconds)
+  FROM held_readings
+  GROUP BY 1, 2, 3
+  ON CONFLICT (device_id, outlet_number, bucket) DO UPDATE SET
+    samples = r.samples + EXCLUDED.samples,
+    on_samples = r.on_samples + EXCLUDED.on_samples,
+    voltage_min = LEAST(r.voltage_min, EXCLUDED.voltage_min),
+    voltage_max = GREATEST(r.voltage_max, EXCLUDED.voltage_max),
+    voltage_sum = COALESCE(r.voltage_sum, 0) + COALESCE(EXCLUDED.voltage_sum, 0),
+    current_min = LEAST(r.current_min, EXCLUDED.current_min),
+    current_max = GREATEST(r.current_max, EXCLUDED.current_max),
+    current_sum = COALESCE(r.current_sum, 0) + COALESCE(EXCLUDED.current_sum, 0),
+    held_seconds = r.held_seconds + EXCLUDED.held_seconds,
+    on_seconds = r.on_seconds + EXCLUDED.on_seconds,
+    voltage_seconds = r.voltage_seconds + EXCLUDED.voltage_seconds,
+    voltage_weighted = COALESCE(r.voltage_weighted, 0) + COALESCE(EXCLUDED.voltage_weighted, 0),
+    current_seconds = r.current_seconds + EXCLUDED.current_seconds,
+    current_weighted = COALESCE(r.current_weighted, 0) + COALESCE(EXCLUDED.current_weighted, 0);
+
+  INSERT INTO outlet_readings_1h AS r (device_id, outlet_number, bucket, samples, on_samples,
+                                       voltage_min, voltage_max, voltage_sum,
+                                       current_min, current_max, current_sum,
+                                       held_seconds, on_seconds, voltage_seconds, voltage_weighted,
+                                       current_seconds, current_weighted)
+  SELECT device_id, outlet_number, date_trunc('hour', created_at),
+         count(*) FILTER (WHERE is_new),
+         count(*) FILTER (WHERE is_new AND state = 'on'),
+         min(voltage) FILTER (WHERE is_new), max(voltage) FILTER (WHERE is_new), sum(voltage) FILTER (WHERE is_new),
+         min(current) FILTER (WHERE is_new), max(current) FILTER (WHERE is_new), sum(current) FILTER (WHERE is_new),
+         COALESCE(sum(seconds), 0),
+         COALESCE(sum(seconds) FILTER (WHERE state = 'on'), 0),
+         COALESCE(sum(seconds) FILTER (WHERE voltage IS NOT NULL), 0),
+         sum(voltage::DOUBLE PRECISION * seconds),
+         COALESCE(sum(seconds) FILTER (WHERE current IS NOT NULL), 0),
+         sum(current::DOUBLE PRECISION * seconds)
+  FROM held_readings
+  GROUP BY 1, 2, 3
+  ON CONFLICT (device_id, outlet_number, bucket) DO UPDATE SET
+    samples = r.samples + EXCLUDED.samples,
+    on_samples = r.on_samples + EXCLUDED.on_samples,
+    voltage_min = LEAST(r.voltage_min, EXCLUDED.voltage_min),
+    voltage_max = GREATEST(r.voltage_max, EXCLUDED.voltage_max),
+    voltage_sum = COALESCE(r.voltage_sum, 0) + COALESCE(EXCLUDED.voltage_sum, 0),
+    current_min = LEAST(r.current_min, EXCLUDED.current_min),
+    current_max = GREATEST(r.current_max, EXCLUDED.current_max),
+    current_sum = COALESCE(r.current_sum, 0) + COALESCE(EXCLUDED.current_sum, 0),
+    held_seconds = r.held_seconds + EXCLUDED.held_seconds,
+    on_seconds = r.on_seconds + EXCLUDED.on_seconds,
+    voltage_seconds = r.voltage_seconds + EXCLUDED.voltage_seconds,
+    voltage_weighted = COALESCE(r.voltage_weighted, 0) + COALESCE(EXCLUDED.voltage_weighted, 0),
+    current_seconds = r.current_seconds + EXCLUDED.current_seconds,
+    current_weighted = COALESCE(r.current_weighted, 0) + COALESCE(EXCLUDED.current_weighted, 0);
+
+  DROP TABLE held_readings;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS outlet_readings_rollup ON outlet_readings;
+CREATE TRIGGER outlet_readings_rollup
+  AFTER INSERT ON outlet_readings
+  REFERENCING NEW TABLE AS new_readings
+  FOR EACH STATEMENT EXECUTE FUNCTION public.rollup_outlet_readings('600');
+
+-- Backfill the hold columns from the raw readings still kept; older buckets
+-- keep zero holds and fall back to per-row averages
+WITH held AS (
+  SELECT device_id, outlet_number, created_at, state, voltage, current,
+         LEAST(EXTRACT(EPOCH FROM lead(created_at) OVER w - created_at)::DOUBLE PRECISION, 600) AS seconds
+  FROM outlet_readings
+  WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+  WINDOW w AS (PARTITION BY device_id, outlet_number ORDER BY created_at)
+), minutes AS (
+  SELECT device_id, outlet_number, date_trunc('minute', created_at) AS bucket,
+         COALESCE(sum(seconds), 0) AS held_seconds,
+         COALESCE(sum(seconds) FILTER (WHERE state = 'on'), 0) AS on_seconds,
+         COALESCE(sum(seconds) FILTER (WHERE voltage IS NOT NULL), 0) AS voltage_seconds,
+         sum(voltage::DOUBLE PRECISION * seconds) AS voltage_weighted,
+         COALESCE(sum(seconds) FILTER (WHERE current IS NOT NULL), 0) AS current_seconds,
+         sum(current::DOUBLE PRECISION * seconds) AS current_weighted
+  FROM held
+  GROUP BY 1, 2, 3
+)
+UPDATE outlet_readings_1m r SET
+  held_seconds = m.held_seconds, on_seconds = m.on_seconds,
+  voltage_seconds = m.voltage_seconds, voltage_weighted = m.voltage_weighted,
+  current_seconds = m.current_seconds, current_weighted = m.current_weighted
+FROM minutes m
+WHERE r.device_id = m.device_id AND r.outlet_number = m.outlet_number AND r.bucket = m.bucket;
+
+WITH held AS (
+  SELECT device_id, outlet_number, created_at, state, voltage, current,
+         LEAST(EXTRACT(EPOCH FROM lead(created_at) OVER w - created_at)::DOUBLE PRECISION, 600) AS seconds
+  FROM outlet_readings
+  WHERE device_id IS NOT NULL AND outlet_number IS NOT NULL
+  WINDOW w AS (PARTITION BY device_id, outlet_number ORDER BY created_at)
+), hours AS (
+  SELECT device_id, outlet_number, date_trunc('hour', created_at) AS bucket,
+         COALESCE(sum(seconds), 0) AS held_seconds,
+         COALESCE(sum(seconds) FILTER (WHERE state = 'on'), 0) AS on_seconds,
+         COALESCE(sum(seconds) FILTER (WHERE voltage IS NOT NULL), 0) AS voltage_seconds,
+         sum(voltage::DOUBLE PRECISION * seconds) AS voltage_weighted,
+         COALESCE(sum(seconds) FILTER (WHERE current IS NOT NULL), 0) AS current_seconds,
+         sum(current::DOUBLE PRECISION * seconds) AS current_weighted
+  FROM held
+  GROUP BY 1, 2, 3
+)
+UPDATE outlet_readings_1h r SET
+  held_seconds = h.held_seconds, on_seconds = h.on_seconds,
+  voltage_seconds = h.voltage_seconds, voltage_weighted = h.voltage_weighted,
+  current_seconds = h.current_seconds, current_weighted = h.current_weighted
+FROM hours h
+WHERE r.device_id = h.device_id AND r.outlet_number = h.outlet_number AND r.bucket = h.bucket;